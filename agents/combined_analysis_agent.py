@@ -0,0 +1,74 @@
+import asyncio
+import json
+from typing import Optional
+from core.exceptions import LLMServiceError
+from core.chunking import count_tokens
+from core.logger import get_logger
+from agents.entity_extraction_agent import merge_entities
+from agents.summarization_agent import SummarizationAgent
+
+logger = get_logger(__name__)
+
+class CombinedAnalysisAgent(SummarizationAgent):
+    """
+    Summarizes a document and extracts its entities with one structured call
+    per chunk, so the text is sent to the model once instead of once per agent.
+    Chunk summaries are combined with the same reduce step as SummarizationAgent;
+    chunk entities are merged and deduplicated locally.
+    """
+
+    async def analyze(self, text: str, chunks: Optional[list[str]] = None) -> dict:
+        """
+        Generates a summary and the entities of the given text.
+
+        Args:
+            text: The full document text.
+            chunks: The text already split with `chunk_builder()`, e.g. while it
+                was being parsed. Computed from `text` when omitted.
+
+        Returns:
+            dict: {"summary": str, "entities": {"entities": [{"text", "type"}, ...]}}
+        """
+        logger.info("Analyzing document (summary and entities in one pass)...")
+
+        is_short = count_tokens(text) <= self.chunk_tokens if chunks is None else len(chunks) <= 1
+        if is_short:
+            result = await self.analyze_chunk(text)
+            return {"summary": result["summary"], "entities": {"entities": merge_entities([result["entities"]])}}
+
+        chunks = chunks or self._chunk_text(text)
+        logger.info(f"Text is long. Analyzing {len(chunks)} chunks.")
+        results = await asyncio.gather(*(self.analyze_chunk(chunk) for chunk in chunks))
+
+        # Only the chunk summaries go through the model again; entities are merged here
+        entities = merge_entities([r["entities"] for r in results])
+        summary_data = await self._reduce([r["summary"] for r in results])
+        return {"summary": summary_data.get("summary", ""), "entities": {"entities": entities}}
+
+    async def analyze_chunk(self, text: str) -> dict:
+        """Summarizes a single chunk and extracts its entities: {"summary": str, "entities": [...]}."""
+        try:
+            system_prompt = """
+            You are an expert document analysis agent. Analyze the provided text and do two things:
+            1. Create a concise and comprehensive summary that captures the key points and main ideas.
+            2. Extract key entities, such as people, organizations, locations, dates, and key concepts.
+            Return the result as a JSON object with the keys "summary" (a string) and "entities" (a list of objects,
+            each with "text" and "type" keys). Example:
+            {"summary": "...", "entities": [{"text": "OpenAI", "type": "Organization"}]}
+            """
+
+            async with self._semaphore:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    response_format={"type": "json_object"},
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": text}
+                    ]
+                )
+            result = json.loads(response.choices[0].message.content)
+            entities = result.get("entities")
+            return {"summary": result.get("summary", ""), "entities": entities if isinstance(entities, list) else []}
+        except Exception as e:
+            logger.error(f"Failed to analyze document part: {e}")
+            raise LLMServiceError(f"Failed to analyze document part: {e}") from e
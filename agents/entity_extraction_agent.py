@@ -1,15 +1,28 @@
 import json
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
+from core.exceptions import LLMServiceError
 from core.logger import get_logger
 
 logger = get_logger(__name__)
 
+def merge_entities(entity_lists: list[list]) -> list[dict]:
+    """Merges the entities found in each chunk, keeping the first spelling of each (text, type) pair."""
+    merged = {}
+    for entities in entity_lists:
+        for entity in entities:
+            if not isinstance(entity, dict) or not str(entity.get("text", "")).strip():
+                continue
+            text = " ".join(str(entity["text"]).split())
+            entity_type = " ".join(str(entity.get("type", "")).split())
+            merged.setdefault((text.casefold(), entity_type.casefold()), {"text": text, "type": entity_type})
+    return list(merged.values())
+
 class EntityExtractionAgent:
-    def __init__(self, client: AzureOpenAI, completion_model: str):
+    def __init__(self, client: AsyncAzureOpenAI, completion_model: str):
         self.client = client
         self.model = completion_model
 
-    def extract(self, text: str) -> dict:
+    async def extract(self, text: str) -> dict:
         """
         Extracts key entities from the given text.
         """
@@ -22,7 +35,7 @@ class EntityExtractionAgent:
             each with "text" and "type" keys. Example: {"entities": [{"text": "OpenAI", "type": "Organization"}]}
             """
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 response_format={"type": "json_object"},
                 messages=[
@@ -35,4 +48,9 @@ class EntityExtractionAgent:
             return entities_json
         except Exception as e:
             logger.error(f"Failed to extract entities: {e}")
-            return {"entities": [{"text": "Error", "type": "Could not extract entities."}]}
\ No newline at end of file
+            raise LLMServiceError(f"Failed to extract entities: {e}") from e
+
+    async def extract_chunk(self, text: str) -> list:
+        """Extracts the entities of a single chunk, as a list of {"text", "type"} objects."""
+        entities = (await self.extract(text)).get("entities")
+        return entities if isinstance(entities, list) else []
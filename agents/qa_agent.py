@@ -0,0 +1,72 @@
+import os
+from typing import AsyncIterator, Optional
+from openai import AsyncAzureOpenAI
+from core.exceptions import LLMServiceError
+from core.chunking import count_tokens
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+class QuestionAnsweringAgent:
+    """
+    Answers questions from retrieved document chunks. The prompt holds at most
+    `context_tokens` of chunk text, however long the documents are, and the
+    answer is streamed as it is generated.
+    """
+
+    def __init__(self, client: AsyncAzureOpenAI, completion_model: str, context_tokens: Optional[int] = None,
+                 answer_tokens: Optional[int] = None):
+        self.client = client
+        self.model = completion_model
+        self.context_tokens = context_tokens or int(os.getenv("QA_CONTEXT_TOKENS", "3000"))
+        self.answer_tokens = answer_tokens or int(os.getenv("QA_ANSWER_TOKENS", "500"))
+
+    def select_sources(self, chunks: list[dict]) -> list[dict]:
+        """
+        Returns the chunks, best match first, that fit in the context budget.
+        The best match is always kept, cut to the budget if it is too long.
+        """
+        selected, used = [], 0
+        for chunk in chunks:
+            tokens = count_tokens(chunk["content"])
+            if used + tokens > self.context_tokens:
+                if not selected:
+                    # Rough cut by characters; chunks are far smaller than the budget in practice
+                    ratio = self.context_tokens / tokens
+                    selected.append({**chunk, "content": chunk["content"][:int(len(chunk["content"]) * ratio)]})
+                break
+            selected.append(chunk)
+            used += tokens
+        return selected
+
+    def _messages(self, question: str, sources: list[dict]) -> list[dict]:
+        system_prompt = """
+        You are a document question answering assistant. Answer the question using only the numbered
+        excerpts provided. Cite the excerpts you used as [1], [2], etc. If the excerpts do not contain
+        the answer, say that the documents do not answer the question instead of guessing.
+        """
+        context = "\n\n".join(
+            f"[{i}] {source['filename']} (part {source['chunk_index'] + 1}):\n{source['content']}"
+            for i, source in enumerate(sources, start=1)
+        )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Excerpts:\n{context}\n\nQuestion: {question}"},
+        ]
+
+    async def stream_answer(self, question: str, sources: list[dict]) -> AsyncIterator[str]:
+        """Yields the answer to `question`, based on `sources` (see select_sources), piece by piece."""
+        logger.info(f"Answering a question from {len(sources)} excerpt(s)...")
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(question, sources),
+                max_tokens=self.answer_tokens,
+                stream=True,
+            )
+            async for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        except Exception as e:
+            logger.error(f"Failed to answer question: {e}")
+            raise LLMServiceError(f"Failed to answer question: {e}") from e
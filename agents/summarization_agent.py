@@ -1,39 +1,102 @@
+import asyncio
 import json
-from openai import AzureOpenAI
+import os
+from typing import Optional
+from openai import AsyncAzureOpenAI
+from core.exceptions import LLMServiceError
+from core.chunking import ChunkBuilder, content_defined_chunking_enabled, count_tokens, group_by_token_budget
 from core.logger import get_logger
 
 logger = get_logger(__name__)
 
 class SummarizationAgent:
-    def __init__(self, client: AzureOpenAI, completion_model: str):
+    def __init__(
+        self,
+        client: AsyncAzureOpenAI,
+        completion_model: str,
+        chunk_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        reduce_tokens: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ):
         self.client = client
         self.model = completion_model
+        self.chunk_tokens = chunk_tokens or int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else int(os.getenv("SUMMARY_CHUNK_OVERLAP_TOKENS", "200"))
+        self.reduce_tokens = reduce_tokens or int(os.getenv("SUMMARY_REDUCE_TOKENS", "6000"))
+        self._semaphore = asyncio.Semaphore(max_concurrency or int(os.getenv("SUMMARY_MAX_CONCURRENCY", "8")))
 
-    def _chunk_text(self, text: str, max_chars: int = 4000) -> list[str]:
-        """Simple text chunker based on character count."""
-        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+    def chunk_builder(self) -> ChunkBuilder:
+        """Returns a ChunkBuilder configured with this agent's chunk size and overlap."""
+        return ChunkBuilder(
+            max_tokens=self.chunk_tokens,
+            overlap_tokens=self.overlap_tokens,
+            content_defined=content_defined_chunking_enabled(),
+        )
 
-    def summarize(self, text: str) -> dict:
+    def _chunk_text(self, text: str) -> list[str]:
+        """Splits text into token-bounded chunks on paragraph/sentence boundaries."""
+        builder = self.chunk_builder()
+        return builder.add(text) + builder.finish()
+
+    async def summarize(self, text: str, chunks: Optional[list[str]] = None) -> dict:
         """
-        Generates a structured summary for the given text, using chunking for long documents.
+        Generates a structured summary for the given text, using hierarchical
+        map-reduce for documents that do not fit in a single call.
+
+        Args:
+            text: The full document text.
+            chunks: The text already split with `chunk_builder()`, e.g. while it
+                was being parsed. Computed from `text` when omitted.
         """
         logger.info("Generating summary...")
         
         # If text is short, summarize directly
-        if len(text) < 4500:
+        is_short = count_tokens(text) <= self.chunk_tokens if chunks is None else len(chunks) <= 1
+        if is_short:
             logger.info("Text is short. Performing direct summarization.")
-            return self._summarize_text(text)
+            return await self._summarize_text(text)
+
+        # If text is long, summarize all chunks concurrently (map) ...
+        chunks = chunks or self._chunk_text(text)
+        logger.info(f"Text is long. Using map-reduce summarization over {len(chunks)} chunks.")
+        summaries = await asyncio.gather(*(self.summarize_chunk(chunk) for chunk in chunks))
+
+        # ... then collapse the summaries level by level until they fit in one call (reduce)
+        return await self._reduce(summaries)
+
+    async def summarize_chunk(self, text: str) -> str:
+        """Summarizes a single chunk (the map step)."""
+        summary_data = await self._summarize_text(text)
+        return summary_data.get("summary", "")
+
+    async def combine(self, summaries: list[str]) -> str:
+        """Combines chunk summaries, in document order, into the document summary (the reduce step)."""
+        if len(summaries) == 1:
+            return summaries[0]
+        summary_data = await self._reduce(summaries)
+        return summary_data.get("summary", "")
+
+    async def _reduce(self, summaries: list[str]) -> dict:
+        """Recursively combines section summaries until a single final call can synthesize them."""
+        level = 1
+        while count_tokens("\n".join(summaries)) > self.reduce_tokens:
+            groups = group_by_token_budget(summaries, self.reduce_tokens)
+            if len(groups) == len(summaries) and level > 1:
+                # Every summary already fills the budget on its own; stop shrinking
+                # and let the final call work with what we have.
+                break
+            logger.info(f"Reduce level {level}: combining {len(summaries)} summaries into {len(groups)}.")
+            partials = await asyncio.gather(
+                *(self._summarize_text("\n".join(group), is_final_summary=True) for group in groups)
+            )
+            summaries = [p.get("summary", "") for p in partials]
+            level += 1
 
-        # If text is long, use map-reduce strategy
-        logger.info("Text is long. Using map-reduce summarization strategy.")
-        chunks = self._chunk_text(text)
-        chunk_summaries = [self._summarize_text(chunk).get("summary", "") for chunk in chunks]
-        
-        combined_summaries = "\n".join(chunk_summaries)
         logger.info("Generating final summary from chunk summaries.")
-        return self._summarize_text(combined_summaries, is_final_summary=True)
+        return await self._summarize_text("\n".join(summaries), is_final_summary=True)
 
-    def _summarize_text(self, text_to_summarize: str, is_final_summary: bool = False) -> dict:
+    async def _summarize_text(self, text_to_summarize: str, is_final_summary: bool = False) -> dict:
         """Helper function to call the OpenAI API for summarization."""
         try:
             if is_final_summary:
@@ -49,16 +112,17 @@ class SummarizationAgent:
                 Return the result as a JSON object with a single key: "summary".
                 """
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text_to_summarize}
-                ]
-            )
+            async with self._semaphore:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    response_format={"type": "json_object"},
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": text_to_summarize}
+                    ]
+                )
             summary_json = json.loads(response.choices[0].message.content)
             return summary_json
         except Exception as e:
             logger.error(f"Failed to generate summary part: {e}")
-            return {"summary": f"Error: Could not generate summary part. Details: {e}"}
\ No newline at end of file
+            raise LLMServiceError(f"Failed to generate summary part: {e}") from e
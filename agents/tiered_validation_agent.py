@@ -0,0 +1,187 @@
+import asyncio
+import math
+import operator
+import os
+import re
+from typing import Optional
+from core.chunking import count_tokens, split_into_chunks
+from core.logger import get_logger
+from agents.validation_agent import ValidationAgent
+
+logger = get_logger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+# Runs of capitalized words, e.g. "Acme Corp" or "New York"
+_NAME_RE = re.compile(r"\b[A-Z][\w&'-]*(?:\s+[A-Z][\w&'-]*)*")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by for from has have in into is it its of on or that the their this to was "
+    "were which will with document text summary also these those they than then there such".split()
+)
+
+
+def _normalize_number(number: str) -> str:
+    return number.replace(",", "")
+
+
+def _content_words(text: str) -> list[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS and len(w) > 2]
+
+
+def _unit(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(map(operator.mul, vector, vector)))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+def _best_sections(sentence_embeddings: list, section_embeddings: list) -> tuple[list[int], list[float]]:
+    """
+    Returns the index and cosine similarity of the closest section of every
+    sentence. Vectors are normalized once, so each pair costs one dot product.
+    CPU-bound; run it in a thread.
+    """
+    sections = [_unit(embedding) for embedding in section_embeddings]
+    best_sections, similarities = [], []
+    for sentence_embedding in sentence_embeddings:
+        sentence = _unit(sentence_embedding)
+        scores = [sum(map(operator.mul, sentence, section)) for section in sections]
+        best = max(range(len(scores)), key=scores.__getitem__)
+        best_sections.append(best)
+        similarities.append(scores[best])
+    return best_sections, similarities
+
+
+def _lexical_signals(original_text: str, summary: str) -> dict:
+    """
+    Scores how well the summary's numbers, names and wording are backed by the
+    source, each as the fraction found in it (1.0 when the summary has none).
+    """
+    source_lower = original_text.lower()
+
+    numbers = {_normalize_number(n) for n in _NUMBER_RE.findall(summary)}
+    source_numbers = {_normalize_number(n) for n in _NUMBER_RE.findall(original_text)}
+    number_overlap = len(numbers & source_numbers) / len(numbers) if numbers else 1.0
+
+    # Sentence-initial words are capitalized too; they are found in the source all the same
+    names = {name.lower() for name in _NAME_RE.findall(summary) if name.lower() not in _STOPWORDS}
+    entity_overlap = sum(1 for name in names if name in source_lower) / len(names) if names else 1.0
+
+    words = _content_words(summary)
+    source_words = _content_words(original_text)
+    ngrams = set(words) | set(zip(words, words[1:]))
+    source_ngrams = set(source_words) | set(zip(source_words, source_words[1:]))
+    ngram_coverage = len(ngrams & source_ngrams) / len(ngrams) if ngrams else 1.0
+
+    return {"numbers": number_overlap, "entities": entity_overlap, "ngrams": ngram_coverage}
+
+
+class TieredValidationAgent:
+    """
+    Validates summaries with cheap local checks first and only asks the LLM
+    ValidationAgent about borderline cases.
+
+    The local tier scores the summary by the overlap of its numbers and names
+    with the source, its word and bigram coverage, and the embedding similarity
+    of each summary sentence to its closest section of the source. Summaries
+    scoring at least `accept_threshold` (with no signal below `reject_threshold`)
+    are accepted, those scoring below `reject_threshold` are rejected. The rest
+    go to the LLM with only the sections that best match the summary.
+    """
+
+    def __init__(
+        self,
+        validator: ValidationAgent,
+        embedder,
+        accept_threshold: Optional[float] = None,
+        reject_threshold: Optional[float] = None,
+        similarity_target: Optional[float] = None,
+        section_tokens: Optional[int] = None,
+        llm_tokens: Optional[int] = None,
+    ):
+        self.validator = validator
+        self.embedder = embedder
+        # 0 is a valid threshold (accept everything / reject nothing), so only None means unset
+        self.accept_threshold = (
+            accept_threshold if accept_threshold is not None else float(os.getenv("VALIDATION_ACCEPT_THRESHOLD", "0.85"))
+        )
+        self.reject_threshold = (
+            reject_threshold if reject_threshold is not None else float(os.getenv("VALIDATION_REJECT_THRESHOLD", "0.4"))
+        )
+        # Sentence-to-section cosine similarity that counts as fully supported;
+        # depends on the embedding backend
+        self.similarity_target = (
+            similarity_target if similarity_target is not None else float(os.getenv("VALIDATION_SIMILARITY_TARGET", "0.75"))
+        )
+        self.section_tokens = section_tokens or int(os.getenv("VALIDATION_SECTION_TOKENS", "512"))
+        self.llm_tokens = llm_tokens or int(os.getenv("VALIDATION_LLM_TOKENS", "3000"))
+        self.stats = {"local_accepted": 0, "local_rejected": 0, "llm_accepted": 0, "llm_rejected": 0}
+
+    async def validate_summary(self, original_text: str, summary: str, sections: Optional[list[str]] = None,
+                               section_embeddings: Optional[list] = None) -> bool:
+        """
+        Validates if the summary accurately reflects the original text.
+
+        Args:
+            sections: The text split into sections whose embeddings are known,
+                e.g. the retrieval chunks computed during ingestion, with their
+                `section_embeddings`. Otherwise the text is split and embedded here.
+
+        Returns:
+            bool: True if the summary is valid, False otherwise.
+        """
+        if not summary.strip():
+            self.stats["local_rejected"] += 1
+            return False
+
+        signals = await asyncio.to_thread(_lexical_signals, original_text, summary)
+        sentences = [s for s in _SENTENCE_RE.split(summary.strip()) if s.strip()]
+        if sections and section_embeddings is not None and len(section_embeddings) == len(sections):
+            sentence_embeddings = await self.embedder.embed(sentences)
+            if any(len(embedding) != len(sentence_embeddings[0]) for embedding in section_embeddings):
+                # Computed with another embedding model; comparing them would be meaningless
+                logger.warning("Section embeddings don't match the embedding model; embedding the sections again.")
+                section_embeddings = await self.embedder.embed(sections)
+        else:
+            sections = await asyncio.to_thread(split_into_chunks, original_text, self.section_tokens, 0)
+            embeddings = await self.embedder.embed(sentences + sections)
+            sentence_embeddings, section_embeddings = embeddings[:len(sentences)], embeddings[len(sentences):]
+
+        # Best-matching section of every summary sentence
+        best_sections, similarities = await asyncio.to_thread(_best_sections, sentence_embeddings, section_embeddings)
+        signals["similarity"] = min(1.0, max(0.0, sum(similarities) / len(similarities) / self.similarity_target))
+
+        score = sum(signals.values()) / len(signals)
+        details = ", ".join(f"{name}={value:.2f}" for name, value in signals.items())
+        if score >= self.accept_threshold and min(signals.values()) >= self.reject_threshold:
+            self.stats["local_accepted"] += 1
+            logger.info(f"Summary accepted locally (score {score:.2f}: {details}).")
+            return True
+        if score < self.reject_threshold:
+            self.stats["local_rejected"] += 1
+            logger.info(f"Summary rejected locally (score {score:.2f}: {details}).")
+            return False
+
+        logger.info(f"Summary is borderline (score {score:.2f}: {details}); asking the validation agent.")
+        selected = self._select_sections(sections, best_sections)
+        excerpts = "\n...\n".join(sections[i] for i in selected)
+        is_valid = await self.validator.validate_summary(excerpts, summary, excerpts=len(selected) < len(sections))
+        self.stats["llm_accepted" if is_valid else "llm_rejected"] += 1
+        return is_valid
+
+    def _select_sections(self, sections: list[str], best_sections: list[int]) -> list[int]:
+        """Returns the sections matched by the summary's sentences that fit the LLM token budget, in document order."""
+        selected = []
+        budget = self.llm_tokens
+        # Sections matched by several sentences first
+        for index in sorted(set(best_sections), key=lambda i: (-best_sections.count(i), i)):
+            tokens = count_tokens(sections[index])
+            if selected and tokens > budget:
+                continue
+            selected.append(index)
+            budget -= tokens
+        return sorted(selected)
+
+    def get_stats(self) -> dict:
+        decisions = sum(self.stats.values())
+        llm_calls = self.stats["llm_accepted"] + self.stats["llm_rejected"]
+        return {**self.stats, "llm_rate": llm_calls / decisions if decisions else 0.0}
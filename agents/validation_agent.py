@@ -1,17 +1,22 @@
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
+from core.exceptions import LLMServiceError
 from core.logger import get_logger
 
 logger = get_logger(__name__)
 
 class ValidationAgent:
-    def __init__(self, client: AzureOpenAI, completion_model: str):
+    def __init__(self, client: AsyncAzureOpenAI, completion_model: str):
         self.client = client
         self.model = completion_model
 
-    def validate_summary(self, original_text: str, summary: str) -> bool:
+    async def validate_summary(self, original_text: str, summary: str, excerpts: bool = False) -> bool:
         """
         Validates if the summary accurately reflects the original text.
 
+        Args:
+            excerpts: `original_text` holds only the parts of the document most
+                relevant to the summary, so omissions should not count against it.
+
         Returns:
             bool: True if the summary is valid, False otherwise.
         """
@@ -22,8 +27,13 @@ class ValidationAgent:
             Do not be overly critical, but ensure no major contradictions or hallucinations are present.
             Respond with only the single word "Yes" or "No".
             """
+            if excerpts:
+                system_prompt += """
+            The original text consists of the excerpts of a longer document that best match the summary, separated by "...".
+            Judge whether the summary's statements are supported by them; do not reject it for leaving out points of the excerpts.
+            """
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -38,5 +48,4 @@ class ValidationAgent:
 
         except Exception as e:
             logger.error(f"An error occurred during summary validation: {e}")
-            # Default to True to avoid blocking the pipeline on a validation error
-            return True
\ No newline at end of file
+            raise LLMServiceError(f"Failed to validate summary: {e}") from e
\ No newline at end of file
@@ -30,31 +30,202 @@ uploaded_files = st.sidebar.file_uploader(
     accept_multiple_files=True
 )
 
+_STAGE_LABELS = {
+    "started": "Started",
+    "parsed": "Parsed",
+    "summarized": "Summarized",
+    "entities_extracted": "Entities extracted",
+    "validated": "Validated",
+    "embedded": "Embedded",
+}
+
+
+def describe_event(event: dict) -> str:
+    """Turns a progress event from /ingest/stream into a short status line."""
+    kind = event["event"]
+    if kind == "parsed":
+        return f"Parsed {event['pages']} page(s) into {event['chunks']} chunk(s)"
+    if kind == "chunk":
+        return f"Analysed {event['done']} of {event['total']} chunk(s) ({event['kind']})"
+    if kind == "validated":
+        return "Validated" if event["valid"] else "Validated (needs review)"
+    if kind == "duplicate":
+        return f"Duplicate of document {event['duplicate_of']}"
+    return _STAGE_LABELS.get(kind, kind)
+
+
+def stream_ingestion(files_to_upload: list):
+    """Uploads files to /ingest/stream and shows each file's progress as the events arrive."""
+    progress_bar = st.sidebar.progress(0.0, text="Uploading...")
+    placeholders = {}
+    finished, failed = 0, 0
+    with requests.post(f"{FASTAPI_URL}/ingest/stream", files=files_to_upload, stream=True) as response:
+        if response.status_code != 200:
+            st.error(f"Error from backend ({response.status_code}): {response.json().get('detail')}")
+            return
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "done":
+                break
+            name = event["file"]
+            if name not in placeholders:
+                placeholders[name] = st.sidebar.empty()
+            if event["event"] == "saved":
+                placeholders[name].success(f"{name}: saved as document {event['document_id']}")
+            elif event["event"] == "failed":
+                failed += 1
+                placeholders[name].error(f"{name}: {event['error']}")
+            elif event["event"] == "skipped":
+                placeholders[name].warning(f"{name}: {event['reason']}")
+            else:
+                placeholders[name].info(f"{name}: {describe_event(event)}")
+                continue
+            finished += 1
+            progress_bar.progress(
+                finished / len(files_to_upload),
+                text=f"Finished {finished} of {len(files_to_upload)} file(s)",
+            )
+    if failed:
+        st.warning(f"{failed} file(s) could not be processed; the rest were saved.")
+    else:
+        st.success("Files processed successfully by the backend!")
+
+
 if uploaded_files:
     if st.sidebar.button("Process Uploaded Files"):
         files_to_upload = [("files", (file.name, file.getvalue(), file.type)) for file in uploaded_files]
         
-        with st.spinner("Sending files to backend for processing... This may take a while."):
-            try:
-                response = requests.post(f"{FASTAPI_URL}/ingest/", files=files_to_upload)
-                if response.status_code == 200:
-                    st.success("Files processed successfully by the backend!")
-                    st.rerun() # Rerun the script to refresh the document list
-                else:
-                    st.error(f"Error from backend ({response.status_code}): {response.json().get('detail')}")
-            except requests.exceptions.ConnectionError:
-                st.error(f"Connection Error: Could not connect to the backend at {FASTAPI_URL}.")
-            except Exception as e:
-                st.error(f"An unexpected error occurred: {e}")
+        try:
+            stream_ingestion(files_to_upload)
+        except requests.exceptions.ConnectionError:
+            st.error(f"Connection Error: Could not connect to the backend at {FASTAPI_URL}.")
+        except Exception as e:
+            st.error(f"An unexpected error occurred: {e}")
 
 # --- Document Interaction Area ---
 st.header("Document Interaction")
 st.markdown("---")
 
+PAGE_SIZE = 50
+
+if 'doc_page_cursors' not in st.session_state:
+    # Cursor of every page visited so far; the first page has none
+    st.session_state.doc_page_cursors = [None]
+if 'doc_list_cache' not in st.session_state:
+    st.session_state.doc_list_cache = {}
+if 'doc_text_cache' not in st.session_state:
+    st.session_state.doc_text_cache = {}
+
+TEXT_PREVIEW_BYTES = 20480
+
+
+def fetch_document_page(params: dict):
+    """Fetches a page of the document list, revalidating a cached copy with its ETag."""
+    cache_key = json.dumps(params, sort_keys=True)
+    cached = st.session_state.doc_list_cache.get(cache_key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = requests.get(f"{FASTAPI_URL}/documents/", params=params, headers=headers)
+    if response.status_code == 304:
+        return cached[1]
+    if response.status_code == 200:
+        cache = st.session_state.doc_list_cache
+        cache[cache_key] = (response.headers.get("ETag"), response.json())
+        # Keep only the most recently fetched pages
+        while len(cache) > 20:
+            cache.pop(next(iter(cache)))
+        return response.json()
+    return None
+
+
+def fetch_document_text(doc_id: int):
+    """Fetches the first TEXT_PREVIEW_BYTES of a document's text once per session; None if unavailable."""
+    cache = st.session_state.doc_text_cache
+    if doc_id not in cache:
+        # Only the first part is fetched; the full text can be large
+        response = requests.get(
+            f"{FASTAPI_URL}/document/{doc_id}/content", headers={"Range": f"bytes=0-{TEXT_PREVIEW_BYTES - 1}"}
+        )
+        if response.status_code not in (200, 206):
+            return None
+        cache[doc_id] = response.content.decode("utf-8", errors="ignore")
+        while len(cache) > 5:
+            cache.pop(next(iter(cache)))
+    return cache[doc_id]
+
+
+def stream_answer(url: str, question: str, sources: list):
+    """Yields the pieces of an answer from a Q&A endpoint, collecting the cited chunks into `sources`."""
+    with requests.get(url, params={"q": question}, stream=True) as response:
+        if response.status_code != 200:
+            yield f"Error from backend ({response.status_code}): {response.json().get('detail')}"
+            return
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "sources":
+                sources.extend(event["sources"])
+            elif event["event"] == "answer":
+                yield event["text"]
+            elif event["event"] == "error":
+                yield f"\n\nThe answer could not be completed: {event['error']}"
+
+
+def ask_question(url: str, key: str):
+    """Shows a question box whose answer streams in from `url`."""
+    question = st.text_input("Ask a question", key=key)
+    if question and st.button("Ask", key=f"{key}_button"):
+        sources = []
+        try:
+            st.write_stream(stream_answer(url, question, sources))
+        except requests.exceptions.ConnectionError:
+            st.error(f"Connection Error: Could not connect to the backend at {FASTAPI_URL}.")
+            return
+        if sources:
+            st.caption("Sources: " + ", ".join(
+                f"[{i}] {s['filename']} (part {s['chunk_index'] + 1})" for i, s in enumerate(sources, start=1)
+            ))
+
+
+with st.expander("Ask across all documents"):
+    ask_question(f"{FASTAPI_URL}/ask/", key="corpus_question")
+
+
+def reset_document_paging():
+    st.session_state.doc_page_cursors = [None]
+
+
+filter_col, status_col = st.columns([3, 1])
+filename_filter = filter_col.text_input("Search documents by filename", on_change=reset_document_paging)
+status_filter = status_col.selectbox(
+    "Status", ["All", "processed", "needs_review"], on_change=reset_document_paging
+)
+
 try:
-    doc_response = requests.get(f"{FASTAPI_URL}/documents/")
-    if doc_response.status_code == 200:
-        documents = doc_response.json().get("documents", [])
+    params = {"limit": PAGE_SIZE}
+    if filename_filter:
+        params["filename"] = filename_filter
+    if status_filter != "All":
+        params["status"] = status_filter
+    page_number = len(st.session_state.doc_page_cursors)
+    if st.session_state.doc_page_cursors[-1]:
+        params["cursor"] = st.session_state.doc_page_cursors[-1]
+
+    page = fetch_document_page(params)
+    if page is not None:
+        documents = page.get("documents", [])
+
+        prev_col, info_col, next_col = st.columns([1, 3, 1])
+        info_col.caption(f"Page {page_number} · about {page.get('total_estimate', 0)} matching document(s)")
+        if page_number > 1 and prev_col.button("← Previous"):
+            st.session_state.doc_page_cursors.pop()
+            st.rerun()
+        if page.get("next_cursor") and next_col.button("Next →"):
+            st.session_state.doc_page_cursors.append(page["next_cursor"])
+            st.rerun()
+
         if documents:
             # Create a mapping from a display string to the document ID
             doc_options = {f"{doc['filename']} (ID: {doc['id']})": doc['id'] for doc in documents}
@@ -95,6 +266,20 @@ try:
                         else:
                             st.error("Failed to update summary.")
 
+                    # An expander's body runs on every rerun; the checkbox fetches the text only when asked
+                    if st.checkbox("Show extracted text", key=f"show_text_{doc_id}"):
+                        text = fetch_document_text(doc_id)
+                        if text is not None:
+                            st.text(text)
+                            size = doc_data.get("content_bytes")
+                            if size and size > TEXT_PREVIEW_BYTES:
+                                st.caption(f"Showing the first {TEXT_PREVIEW_BYTES // 1024} KB of {size // 1024} KB.")
+                        else:
+                            st.info("The text of this document is not available.")
+
+                    st.subheader("Ask about this document")
+                    ask_question(f"{FASTAPI_URL}/document/{doc_id}/ask", key=f"question_{doc_id}")
+
                     # Display Entities
                     st.subheader("Extracted Entities")
                     entities = doc_data.get('entities')
@@ -0,0 +1,131 @@
+"""
+Compares the LLM token usage of the "agents" and "combined" analysis modes
+(see ANALYSIS_MODE in core/ingestion.py) on the same documents.
+
+Every document is analysed once per mode against the configured Azure OpenAI
+deployment, with the response cache disabled so all calls reach the model.
+Results are printed as JSON.
+
+Usage:
+    python -m benchmarks.analysis_modes FILE [FILE ...] [--modes agents combined] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from core.llm import get_async_azure_openai_client
+from core.parser import PDF_CONTENT_TYPE, DOCX_CONTENT_TYPE, HTML_CONTENT_TYPE, shutdown_parser_pool, stream_pages
+from core.pipeline import IngestionPipeline
+from core.rate_limiter import RateLimitedLLMClient
+
+from agents.summarization_agent import SummarizationAgent
+from agents.entity_extraction_agent import EntityExtractionAgent
+from agents.validation_agent import ValidationAgent
+from agents.combined_analysis_agent import CombinedAnalysisAgent
+
+_CONTENT_TYPES = {".pdf": PDF_CONTENT_TYPE, ".docx": DOCX_CONTENT_TYPE, ".html": HTML_CONTENT_TYPE, ".htm": HTML_CONTENT_TYPE}
+
+
+class _UsageRecorder:
+    """Counts the calls and tokens of every chat completion made through it."""
+
+    def __init__(self, client):
+        self._client = client
+        self.chat = self
+        self.completions = self
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def create(self, **kwargs):
+        response = await self._client.chat.completions.create(**kwargs)
+        self.calls += 1
+        if response.usage is not None:
+            self.prompt_tokens += response.usage.prompt_tokens
+            self.completion_tokens += response.usage.completion_tokens
+        return response
+
+
+def _build_pipeline(mode: str, recorder: _UsageRecorder, model: str) -> IngestionPipeline:
+    if mode == "combined":
+        summarizer, entity_extractor = CombinedAnalysisAgent(recorder, model), None
+    else:
+        summarizer, entity_extractor = SummarizationAgent(recorder, model), EntityExtractionAgent(recorder, model)
+    return IngestionPipeline(summarizer, entity_extractor, ValidationAgent(recorder, model))
+
+
+async def _load_text(path: str) -> str:
+    """Extracts the text of a document with the same parser process pool as ingestion."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        data = f.read()
+    if extension in _CONTENT_TYPES:
+        pages = [page async for page in stream_pages(os.path.basename(path), _CONTENT_TYPES[extension], data)]
+        return "\n".join(pages)
+    return data.decode("utf-8", errors="replace")
+
+
+async def _run_mode(mode: str, documents: dict[str, str], model: str) -> dict:
+    recorder = _UsageRecorder(RateLimitedLLMClient(get_async_azure_openai_client()))
+    pipeline = _build_pipeline(mode, recorder, model)
+    statuses = {}
+    started = time.perf_counter()
+    for name, text in documents.items():
+        builder = pipeline.summarizer.chunk_builder()
+        chunks = builder.add(text) + builder.finish()
+        result = await pipeline.process(text, chunks=chunks)
+        statuses[name] = result["status"]
+    elapsed = time.perf_counter() - started
+    return {
+        "documents": len(documents),
+        "llm_calls": recorder.calls,
+        "prompt_tokens": recorder.prompt_tokens,
+        "completion_tokens": recorder.completion_tokens,
+        "total_tokens": recorder.prompt_tokens + recorder.completion_tokens,
+        "elapsed_seconds": round(elapsed, 2),
+        "statuses": statuses,
+    }
+
+
+async def _main(args):
+    model = os.getenv("COMPLETION_DEPLOYMENT_NAME")
+    if not model:
+        raise SystemExit("COMPLETION_DEPLOYMENT_NAME must be set in the .env file.")
+    try:
+        documents = {path: await _load_text(path) for path in args.files}
+    finally:
+        shutdown_parser_pool()
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = await _run_mode(mode, documents, model)
+    if "agents" in results and "combined" in results and results["agents"]["prompt_tokens"]:
+        results["combined_vs_agents"] = {
+            key: round(results["combined"][key] / results["agents"][key], 3)
+            for key in ("llm_calls", "prompt_tokens", "completion_tokens", "elapsed_seconds")
+            if results["agents"][key]
+        }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare token usage of the analysis modes.")
+    parser.add_argument("files", nargs="+", help="Documents to analyse (PDF, DOCX, HTML or plain text).")
+    parser.add_argument("--modes", nargs="+", choices=["agents", "combined"], default=["agents", "combined"])
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+    load_dotenv()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Generates a reproducible corpus of PDF, DOCX and HTML documents of controlled
+sizes for the ingestion benchmarks.
+
+Usage:
+    python -m benchmarks.corpus OUTPUT_DIR [--count 30] [--words 2000 8000 30000] [--formats pdf docx html] [--seed 1]
+
+Files are named <format>-<words>w-<n>.<ext>; every file has different text so
+the deduplication step doesn't short-circuit the pipeline.
+"""
+import argparse
+import os
+import random
+
+from docx import Document
+
+_WORDS = (
+    "system data model process result analysis report market growth revenue customer service product "
+    "team project quality design research policy network platform strategy risk value performance "
+    "security infrastructure operation support budget schedule review feature release contract partner "
+    "region account energy supply demand cost price capacity investment training standard method"
+).split()
+_NAMES = (
+    "Acme Corporation", "Globex Industries", "Initech Systems", "Umbrella Holdings", "Stark Logistics",
+    "Jane Doe", "John Smith", "Maria Garcia", "Wei Chen", "Amara Okafor",
+    "New York", "Berlin", "Tokyo", "Nairobi", "Sao Paulo",
+)
+_CHARS_PER_PDF_LINE = 95
+_LINES_PER_PDF_PAGE = 60
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(_WORDS, k=rng.randint(8, 18))
+    if rng.random() < 0.5:
+        words.insert(rng.randrange(len(words)), rng.choice(_NAMES))
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), str(rng.randint(2, 9999)))
+    sentence = " ".join(words)
+    # Only the first letter: lowercasing the rest would hide the names from entity extraction
+    return sentence[0].upper() + sentence[1:] + "."
+
+
+def generate_paragraphs(words: int, rng: random.Random) -> list[str]:
+    """Returns paragraphs totalling roughly `words` words."""
+    paragraphs = []
+    total = 0
+    while total < words:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 7)))
+        paragraphs.append(paragraph)
+        total += len(paragraph.split())
+    return paragraphs
+
+
+def _wrap(text: str, width: int) -> list[str]:
+    lines, current = [], ""
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+
+def write_pdf(path: str, paragraphs: list[str]):
+    """Writes a minimal text-only PDF (Helvetica, one text stream per page) that pypdf can extract."""
+    lines = []
+    for paragraph in paragraphs:
+        lines.extend(_wrap(paragraph, _CHARS_PER_PDF_LINE))
+        lines.append("")
+    pages = [lines[i:i + _LINES_PER_PDF_PAGE] for i in range(0, len(lines), _LINES_PER_PDF_PAGE)] or [[]]
+
+    # Object 1: catalog, 2: page tree, 3: font, then a page and a content stream per page
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    page_ids = []
+    for i, page_lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        page_ids.append(page_id)
+        text = "".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T* " for line in page_lines
+        )
+        stream = f"BT /F1 10 Tf 12 TL 50 780 Td {text}ET".encode("latin-1", errors="replace")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids),
+    )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def write_docx(path: str, paragraphs: list[str]):
+    document = Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_html(path: str, paragraphs: list[str]):
+    body = "\n".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html>\n<html><head><title>Benchmark document</title></head>\n<body>\n{body}\n</body></html>\n")
+
+
+_WRITERS = {"pdf": write_pdf, "docx": write_docx, "html": write_html}
+
+
+def generate_corpus(output_dir: str, count: int, sizes: list[int], formats: list[str], seed: int = 1) -> list[str]:
+    """Writes `count` files cycling through `formats` and `sizes` (in words) and returns their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for n in range(count):
+        file_format = formats[n % len(formats)]
+        words = sizes[(n // len(formats)) % len(sizes)]
+        path = os.path.join(output_dir, f"{file_format}-{words}w-{n}.{file_format}")
+        _WRITERS[file_format](path, generate_paragraphs(words, rng))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a benchmark corpus.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--count", type=int, default=30, help="Number of files.")
+    parser.add_argument("--words", type=int, nargs="+", default=[2000, 8000, 30000], help="Document sizes in words.")
+    parser.add_argument("--formats", nargs="+", choices=sorted(_WRITERS), default=["pdf", "docx", "html"])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    paths = generate_corpus(args.output_dir, args.count, args.words, args.formats, args.seed)
+    print(f"Wrote {len(paths)} files to {args.output_dir}.")
+
+
+if __name__ == "__main__":
+    main()
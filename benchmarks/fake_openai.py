@@ -0,0 +1,181 @@
+"""
+Local stand-in for the Azure OpenAI chat completions and embeddings API, for
+benchmarking without spending Azure budget.
+
+Responses are derived from the request text so the agents get plausible JSON
+(summaries are the leading sentences, entities the capitalized names, and
+validation always answers "Yes"). Requests with `stream: true` get the answer
+as server-sent chunks, like the question answering endpoints ask for.
+Latency, jitter and injected 429 responses are configurable. GET /_stats reports the calls served, POST /_reset clears them.
+
+Usage:
+    python -m benchmarks.fake_openai [--port 8100] [--latency-ms 300] [--jitter-ms 100] [--throttle-rate 0.02]
+
+Then point the API at it:
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100 AZURE_OPENAI_KEY=fake AZURE_OPENAI_API_VERSION=2024-02-01
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from core.chunking import count_tokens
+from core.embeddings import LocalEmbeddingBackend
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_NAME_RE = re.compile(r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+")
+
+app = FastAPI(title="Fake Azure OpenAI")
+app.state.config = {"latency_ms": 300.0, "jitter_ms": 100.0, "throttle_rate": 0.0, "retry_after": 1.0}
+_stats = {"chat_calls": 0, "embedding_calls": 0, "embedding_inputs": 0, "throttled": 0,
+          "prompt_tokens": 0, "completion_tokens": 0, "calls_by_kind": {}}
+_embedder = LocalEmbeddingBackend()
+
+
+async def _simulate_latency() -> Optional[JSONResponse]:
+    """Sleeps for the configured latency and returns a 429 response when one is injected."""
+    config = app.state.config
+    await asyncio.sleep(max(0.0, random.gauss(config["latency_ms"], config["jitter_ms"])) / 1000)
+    if random.random() < config["throttle_rate"]:
+        _stats["throttled"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(config["retry_after"])},
+            content={"error": {"code": "429", "message": "Rate limit is exceeded (injected)."}},
+        )
+    return None
+
+
+def _summarize(text: str) -> str:
+    sentences = [s.strip() for s in _SENTENCE_RE.split(" ".join(text.split())) if s.strip()]
+    return " ".join(sentences[:3])[:600]
+
+
+def _entities(text: str) -> list[dict]:
+    names = dict.fromkeys(_NAME_RE.findall(text))
+    return [{"text": name, "type": "Name"} for name in list(names)[:20]]
+
+
+def _answer(system_prompt: str, user_content: str) -> tuple[str, str]:
+    """Returns (kind, content) for a chat request, based on which agent sent it."""
+    if "validation expert" in system_prompt:
+        return "validation", "Yes"
+    if '"summary"' in system_prompt and '"entities"' in system_prompt:
+        return "combined", json.dumps({"summary": _summarize(user_content), "entities": _entities(user_content)})
+    if '"entities"' in system_prompt:
+        return "entities", json.dumps({"entities": _entities(user_content)})
+    if '"summary"' in system_prompt:
+        return "summary", json.dumps({"summary": _summarize(user_content)})
+    if "question answering" in system_prompt:
+        return "answer", _summarize(user_content.split("\n\nQuestion:")[0]) + " [1]"
+    return "other", _summarize(user_content)
+
+
+def _stream_chunks(deployment: str, content: str, usage: Optional[dict]):
+    """Yields the answer word by word as chat.completion.chunk server-sent events."""
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": deployment}
+    pieces = re.findall(r"\S+\s*", content)
+    for i, piece in enumerate(pieces):
+        delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+        yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n"
+    yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+    if usage is not None:
+        # Sent only with stream_options.include_usage, in a chunk without choices
+        yield f"data: {json.dumps({**base, 'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    throttled = await _simulate_latency()
+    if throttled:
+        return throttled
+    body = await request.json()
+    messages = body.get("messages", [])
+    system_prompt = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    user_content = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    kind, content = _answer(system_prompt, user_content)
+
+    prompt_tokens = sum(count_tokens(m.get("content") or "") for m in messages)
+    completion_tokens = count_tokens(content)
+    _stats["chat_calls"] += 1
+    _stats["calls_by_kind"][kind] = _stats["calls_by_kind"].get(kind, 0) + 1
+    _stats["prompt_tokens"] += prompt_tokens
+    _stats["completion_tokens"] += completion_tokens
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+             "total_tokens": prompt_tokens + completion_tokens}
+    if body.get("stream"):
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        return StreamingResponse(_stream_chunks(deployment, content, usage if include_usage else None),
+                                 media_type="text/event-stream")
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+@app.post("/openai/deployments/{deployment}/embeddings")
+async def embeddings(deployment: str, request: Request):
+    throttled = await _simulate_latency()
+    if throttled:
+        return throttled
+    body = await request.json()
+    inputs = body.get("input")
+    inputs = [inputs] if isinstance(inputs, str) else inputs or []
+    vectors = await _embedder.embed(inputs)
+
+    prompt_tokens = sum(count_tokens(text) for text in inputs)
+    _stats["embedding_calls"] += 1
+    _stats["embedding_inputs"] += len(inputs)
+    _stats["prompt_tokens"] += prompt_tokens
+    return {
+        "object": "list",
+        "model": deployment,
+        "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors)],
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {**_stats, "config": app.state.config}
+
+
+@app.post("/_reset")
+async def reset_stats():
+    for key in _stats:
+        _stats[key] = {} if isinstance(_stats[key], dict) else 0
+    return {"message": "Statistics reset."}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Azure OpenAI server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean response latency.")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Standard deviation of the latency.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with a 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429.")
+    args = parser.parse_args()
+    app.state.config = {
+        "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+        "throttle_rate": args.throttle_rate, "retry_after": args.retry_after,
+    }
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Drives the API with a benchmark corpus and records throughput, latency, LLM
+calls per document and peak memory as JSON, so runs can be compared across
+commits.
+
+Scenarios:
+    ingest     uploads the corpus to /ingest/ and waits for every job to finish
+    list       pages through /documents/
+    get        fetches /document/{id} for the ingested documents
+
+With --launch, the fake OpenAI server (benchmarks/fake_openai.py) and the API
+(with its in-process workers) are started as subprocesses against the local
+Postgres configured in .env, and their peak RSS is recorded. Use an empty
+database or a new corpus seed for every run; re-uploaded files are deduplicated.
+Without network access, token counts are estimated from text length unless
+TIKTOKEN_CACHE_DIR holds the cl100k_base encoding.
+
+Usage:
+    python -m benchmarks.corpus /tmp/corpus
+    python -m benchmarks.load /tmp/corpus --launch --concurrency 8 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+_CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".html": "text/html",
+}
+
+
+def _percentiles(latencies: list[float]) -> dict:
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def _at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 4),
+        "p50": _at(0.50),
+        "p95": _at(0.95),
+        "p99": _at(0.99),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def _process_tree_rss(pid: int) -> int:
+    """Returns the resident memory in bytes of a process and all its descendants (Linux only)."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return total
+
+
+class _RssSampler:
+    """Samples the memory of the given process trees in the background and keeps the peak."""
+
+    def __init__(self, pids: dict[str, int], interval: float = 0.25):
+        self.pids = pids
+        self.interval = interval
+        self.peaks = {name: 0 for name in pids}
+        self._task = None
+
+    async def _run(self):
+        while True:
+            for name, pid in self.pids.items():
+                self.peaks[name] = max(self.peaks[name], _process_tree_rss(pid))
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.pids:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        return {name: round(peak / 2 ** 20, 1) for name, peak in self.peaks.items()}
+
+
+async def _wait_until_ready(client: httpx.AsyncClient, url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"{url} did not come up within {timeout:.0f}s.")
+
+
+async def _run_concurrently(items: list, concurrency: int, fn) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(item):
+        async with semaphore:
+            return await fn(item)
+
+    return await asyncio.gather(*(_run(item) for item in items))
+
+
+async def _scenario_ingest(client: httpx.AsyncClient, paths: list[str], concurrency: int, batch_size: int,
+                           poll_interval: float) -> tuple[dict, list[int]]:
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    upload_latencies = []
+
+    async def _upload(batch):
+        files = []
+        for path in batch:
+            with open(path, "rb") as f:
+                files.append(("files", (os.path.basename(path), f.read(), _CONTENT_TYPES[os.path.splitext(path)[1]])))
+        started = time.perf_counter()
+        response = await client.post("/ingest/", files=files)
+        upload_latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        return response.json()["job_id"]
+
+    started = time.perf_counter()
+    job_ids = await _run_concurrently(batches, concurrency, _upload)
+
+    pending = set(job_ids)
+    while pending:
+        await asyncio.sleep(poll_interval)
+        for job_id in list(pending):
+            job = (await client.get(f"/jobs/{job_id}")).json()
+            if job["status"] not in ("queued", "running"):
+                pending.discard(job_id)
+    elapsed = time.perf_counter() - started
+
+    # End-to-end latency of every file: from its job's creation to its last update
+    file_latencies, document_ids, statuses = [], [], {}
+    for job_id in job_ids:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        created = datetime.fromisoformat(job["created_at"])
+        for file in (await client.get(f"/jobs/{job_id}/files")).json()["files"]:
+            statuses[file["status"]] = statuses.get(file["status"], 0) + 1
+            file_latencies.append((datetime.fromisoformat(file["updated_at"]) - created).total_seconds())
+            if file["document_id"]:
+                document_ids.append(file["document_id"])
+
+    return {
+        "files": len(paths),
+        "elapsed_seconds": round(elapsed, 2),
+        "docs_per_second": round(len(paths) / elapsed, 3),
+        "file_statuses": statuses,
+        "upload_latency": _percentiles(upload_latencies),
+        "document_latency": _percentiles(file_latencies),
+    }, document_ids
+
+
+async def _scenario_list(client: httpx.AsyncClient, requests: int, concurrency: int, page_size: int) -> dict:
+    latencies = []
+
+    async def _walk(_):
+        cursor = None
+        for _ in range(max(1, requests // concurrency)):
+            params = {"limit": page_size}
+            if cursor:
+                params["cursor"] = cursor
+            started = time.perf_counter()
+            response = await client.get("/documents/", params=params)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+            cursor = response.json()["next_cursor"]
+
+    started = time.perf_counter()
+    await _run_concurrently(list(range(concurrency)), concurrency, _walk)
+    elapsed = time.perf_counter() - started
+    return {"requests_per_second": round(len(latencies) / elapsed, 2), "latency": _percentiles(latencies)}
+
+
+async def _scenario_get(client: httpx.AsyncClient, document_ids: list[int], requests: int, concurrency: int) -> dict:
+    if not document_ids:
+        return {"skipped": "no documents were ingested"}
+    latencies = []
+
+    async def _get(doc_id):
+        started = time.perf_counter()
+        response = await client.get(f"/document/{doc_id}")
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+
+    started = time.perf_counter()
+    await _run_concurrently([random.choice(document_ids) for _ in range(requests)], concurrency, _get)
+    elapsed = time.perf_counter() - started
+    return {"requests_per_second": round(len(latencies) / elapsed, 2), "latency": _percentiles(latencies)}
+
+
+def _launch(args) -> dict[str, subprocess.Popen]:
+    env = {
+        **os.environ,
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{args.fake_port}",
+        "AZURE_OPENAI_KEY": "fake",
+        "AZURE_OPENAI_API_VERSION": os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01"),
+        "COMPLETION_DEPLOYMENT_NAME": os.getenv("COMPLETION_DEPLOYMENT_NAME", "fake-completion"),
+        "EMBEDDING_DEPLOYMENT_NAME": os.getenv("EMBEDDING_DEPLOYMENT_NAME", "fake-embedding"),
+        # Measure the model calls, not results stored by an earlier run against the same database
+        "LLM_CACHE_ENABLED": "false",
+        "CHUNK_REUSE_ENABLED": "false",
+    }
+    fake = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--throttle-rate", str(args.throttle_rate),
+    ], env=env)
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port), "--log-level", "warning",
+    ], env=env)
+    return {"fake_openai": fake, "api": api}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def _main(args) -> dict:
+    paths = sorted(
+        os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+        if os.path.splitext(name)[1] in _CONTENT_TYPES
+    )
+    if not paths:
+        raise SystemExit(f"No PDF, DOCX or HTML files in {args.corpus}.")
+
+    processes = _launch(args) if args.launch else {}
+    api_url = f"http://127.0.0.1:{args.api_port}" if args.launch else args.api_url
+    fake_url = f"http://127.0.0.1:{args.fake_port}" if args.launch else args.fake_url
+    sampler = _RssSampler({name: process.pid for name, process in processes.items()})
+    try:
+        async with httpx.AsyncClient(base_url=api_url, timeout=args.timeout) as client, \
+                httpx.AsyncClient(base_url=fake_url, timeout=10) as fake:
+            await _wait_until_ready(client, "/stats/")
+            fake_available = True
+            try:
+                await fake.post("/_reset")
+            except httpx.TransportError:
+                fake_available = False
+            sampler.start()
+
+            results = {
+                "commit": _git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "config": {k: v for k, v in vars(args).items() if k != "output"},
+            }
+            document_ids = []
+            if "ingest" in args.scenarios:
+                results["ingest"], document_ids = await _scenario_ingest(
+                    client, paths, args.concurrency, args.batch_size, args.poll_interval,
+                )
+                if fake_available:
+                    llm = (await fake.get("/_stats")).json()
+                    processed = max(1, len(document_ids))
+                    results["llm"] = {
+                        **llm,
+                        "chat_calls_per_doc": round(llm["chat_calls"] / processed, 2),
+                        "embedding_calls_per_doc": round(llm["embedding_calls"] / processed, 2),
+                        "prompt_tokens_per_doc": round(llm["prompt_tokens"] / processed, 1),
+                    }
+            if "list" in args.scenarios:
+                results["list"] = await _scenario_list(client, args.requests, args.concurrency, args.page_size)
+            if "get" in args.scenarios:
+                if not document_ids:
+                    page = (await client.get("/documents/", params={"limit": 500})).json()
+                    document_ids = [doc["id"] for doc in page["documents"]]
+                results["get"] = await _scenario_get(client, document_ids, args.requests, args.concurrency)
+            results["peak_rss_mb"] = await sampler.stop()
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait(timeout=30)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and document endpoints.")
+    parser.add_argument("corpus", help="Directory with the files to ingest (see benchmarks/corpus.py).")
+    parser.add_argument("--scenarios", nargs="+", choices=["ingest", "list", "get"], default=["ingest", "list", "get"])
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients per scenario.")
+    parser.add_argument("--batch-size", type=int, default=5, help="Files per /ingest/ request.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per read scenario.")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=120.0, help="HTTP timeout in seconds.")
+    parser.add_argument("--launch", action="store_true", help="Start the fake OpenAI server and the API.")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000", help="API to use without --launch.")
+    parser.add_argument("--fake-url", default="http://127.0.0.1:8100", help="Fake OpenAI server to read stats from.")
+    parser.add_argument("--api-port", type=int, default=8001)
+    parser.add_argument("--fake-port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = asyncio.run(_main(args))
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Content-addressed store of per-chunk model results (the map step of the agents)."""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Optional
+
+from core.db import get_db_connection
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def chunk_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest identifying a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ChunkAnalysisStore:
+    """
+    Keeps the summary and entities computed for every chunk in the
+    `chunk_analyses` table, keyed by the chunk's content hash, the kind of
+    result, the model and the prompt version. A chunk that appears again, in a
+    new version of a document or in another document, is not sent to the model.
+
+    Store errors are logged and treated as misses so ingestion never depends on them.
+    """
+
+    def __init__(self, model: str, prompt_version: Optional[str] = None):
+        self.model = model
+        # Shares the LLM cache's setting: bump it after changing a prompt template
+        self.prompt_version = prompt_version or os.getenv("LLM_CACHE_PROMPT_VERSION", "1")
+        self.stats = {"reused": 0, "computed": 0, "errors": 0}
+
+    async def get_many(self, kind: str, hashes: list[str]) -> dict:
+        """Returns the stored results of `kind` for the given chunk hashes, by hash."""
+        if not hashes:
+            return {}
+        try:
+            async with get_db_connection() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT content_hash, result FROM chunk_analyses
+                    WHERE content_hash = ANY($1::char(64)[]) AND kind = $2 AND model = $3 AND prompt_version = $4;
+                    """,
+                    list(set(hashes)), kind, self.model, self.prompt_version,
+                )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Chunk analysis lookup failed: {e}")
+            return {}
+        return {row["content_hash"]: json.loads(row["result"]) for row in rows}
+
+    async def put_many(self, kind: str, results: dict):
+        """Stores results of `kind` by chunk hash."""
+        if not results:
+            return
+        try:
+            async with get_db_connection() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO chunk_analyses (content_hash, kind, model, prompt_version, result)
+                    SELECT h, $2, $3, $4, r::jsonb FROM unnest($1::char(64)[], $5::text[]) AS v(h, r)
+                    ON CONFLICT DO NOTHING;
+                    """,
+                    list(results), kind, self.model, self.prompt_version,
+                    [json.dumps(result) for result in results.values()],
+                )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Storing chunk analyses failed: {e}")
+
+    async def map_chunks(self, kind: str, chunks: list[str], fn, on_reused=None) -> list:
+        """
+        Returns `await fn(chunk)` for every chunk, in order, computing only the
+        results that are not stored yet (each distinct chunk once) and storing them.
+        If some chunks fail, the others are still stored before the first error
+        is raised, so a retry of the document only redoes the failed ones.
+        `on_reused(count)` is called with the number of chunks that need no call.
+        """
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+        stored = await self.get_many(kind, hashes)
+        missing = {h: chunk for h, chunk in zip(hashes, chunks) if h not in stored}
+        if on_reused and len(missing) < len(chunks):
+            on_reused(len(chunks) - len(missing))
+        computed = {}
+        if missing:
+            outcomes = await asyncio.gather(*(fn(chunk) for chunk in missing.values()), return_exceptions=True)
+            computed = {h: outcome for h, outcome in zip(missing, outcomes) if not isinstance(outcome, BaseException)}
+            await self.put_many(kind, computed)
+            for outcome in outcomes:
+                if isinstance(outcome, BaseException):
+                    raise outcome
+        self.stats["reused"] += len(chunks) - len(missing)
+        self.stats["computed"] += len(missing)
+        if stored:
+            logger.info(f"Reused {len(chunks) - len(missing)} of {len(chunks)} stored '{kind}' chunk results.")
+        return [stored[h] if h in stored else computed[h] for h in hashes]
+
+    async def map_batch(self, kind: str, chunks: list[str], fn) -> list:
+        """
+        Like map_chunks, but computes all the results that are not stored yet
+        with a single `await fn(missing_chunks)` call returning them in order,
+        e.g. one batched embedding request.
+        """
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+        stored = await self.get_many(kind, hashes)
+        missing = {h: chunk for h, chunk in zip(hashes, chunks) if h not in stored}
+        computed = {}
+        if missing:
+            computed = dict(zip(missing, await fn(list(missing.values()))))
+            await self.put_many(kind, computed)
+        self.stats["reused"] += len(chunks) - len(missing)
+        self.stats["computed"] += len(missing)
+        if stored:
+            logger.info(f"Reused {len(chunks) - len(missing)} of {len(chunks)} stored '{kind}' chunk results.")
+        return [stored[h] if h in stored else computed[h] for h in hashes]
+
+    def get_stats(self) -> dict:
+        total = self.stats["reused"] + self.stats["computed"]
+        return {**self.stats, "reuse_rate": self.stats["reused"] / total if total else 0.0}
+
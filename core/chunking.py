@@ -0,0 +1,180 @@
+"""Token-aware text chunking used by the agents."""
+import hashlib
+import os
+import re
+from functools import lru_cache
+
+from core.logger import get_logger
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional
+    tiktoken = None
+
+logger = get_logger(__name__)
+
+# Rough characters-per-token ratio used when tiktoken is not installed
+_CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+# Joins the units of a chunk; its tokens count towards the chunk's size
+_SEPARATOR = "\n\n"
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding is downloaded on first use unless TIKTOKEN_CACHE_DIR already holds it
+        logger.warning(f"tiktoken encoding unavailable ({e}); estimating token counts from text length.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Returns the number of tokens in `text`, estimated from its length if tiktoken is unavailable."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _split_by_tokens(text: str, max_tokens: int) -> list[str]:
+    """Hard-splits a piece of text that has no usable sentence boundary."""
+    encoding = _get_encoding()
+    if encoding is None:
+        step = max_tokens * _CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def _split_units(text: str, max_tokens: int) -> list[tuple[str, int]]:
+    """
+    Breaks text into (unit, token_count) pairs where each unit fits in `max_tokens`.
+    Paragraphs are kept whole when possible, then sentences, then raw token slices.
+    """
+    units = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            units.append((paragraph, tokens))
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                units.append((sentence, tokens))
+            else:
+                units.extend((piece, count_tokens(piece)) for piece in _split_by_tokens(sentence, max_tokens))
+    return units
+
+
+def content_defined_chunking_enabled() -> bool:
+    """Whether chunk boundaries should follow the content (CHUNKING_CONTENT_DEFINED, on by default)."""
+    return os.getenv("CHUNKING_CONTENT_DEFINED", "true").lower() == "true"
+
+
+class ChunkBuilder:
+    """
+    Packs text into chunks of at most `max_tokens` tokens, breaking on paragraph
+    and sentence boundaries. Consecutive chunks share up to `overlap_tokens`
+    tokens of trailing context so that no statement is cut off from its lead-in.
+
+    With `content_defined`, a chunk also ends after any unit whose hash marks
+    it as a boundary once the chunk holds half of `max_tokens`, so chunks average
+    about three quarters of the limit. Boundaries then depend on the text around
+    them rather than on everything before it: editing one page of a document
+    changes only the chunks around the edit, and the others can be reused.
+
+    Text can be fed incrementally with `add`, e.g. page by page while a document
+    is still being parsed; `finish` returns the last, partial chunk.
+    """
+
+    def __init__(self, max_tokens: int = 2000, overlap_tokens: int = 200, content_defined: bool = False):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens.")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.content_defined = content_defined
+        self._min_tokens = max_tokens // 2
+        self._separator_tokens = count_tokens(_SEPARATOR)
+        self._current: list[tuple[str, int]] = []
+        # Tokens of the units in the chunk and of the separators between them
+        self._current_tokens = 0
+
+    def _is_boundary(self, unit: str, tokens: int) -> bool:
+        # Each unit ends the chunk with a probability proportional to its size, so
+        # past min_tokens a boundary comes after (max_tokens - min_tokens) / 2 tokens on average
+        digest = hashlib.blake2b(unit.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2 ** 64 < 2 * tokens / (self.max_tokens - self._min_tokens)
+
+    def _cut(self, next_tokens: int) -> str:
+        """Returns the current chunk and starts the next one with its overlap."""
+        chunk = _SEPARATOR.join(u for u, _ in self._current)
+        # Carry the tail of the previous chunk over as overlap, leaving room for
+        # the next unit and the separator before it
+        next_size = next_tokens + self._separator_tokens if next_tokens else 0
+        overlap: list[tuple[str, int]] = []
+        overlap_size = 0
+        for prev_unit, prev_tokens in reversed(self._current):
+            size = overlap_size + prev_tokens + (self._separator_tokens if overlap else 0)
+            if size > self.overlap_tokens or size + next_size > self.max_tokens:
+                break
+            overlap.insert(0, (prev_unit, prev_tokens))
+            overlap_size = size
+        self._current, self._current_tokens = overlap, overlap_size
+        return chunk
+
+    def _size_with(self, tokens: int) -> int:
+        return self._current_tokens + tokens + (self._separator_tokens if self._current else 0)
+
+    def add(self, text: str) -> list[str]:
+        """Adds text and returns the chunks it completed."""
+        completed = []
+        for unit, tokens in _split_units(text, self.max_tokens):
+            if self._current and self._size_with(tokens) > self.max_tokens:
+                completed.append(self._cut(tokens))
+            self._current_tokens = self._size_with(tokens)
+            self._current.append((unit, tokens))
+            if (self.content_defined and self._current_tokens >= self._min_tokens
+                    and self._is_boundary(unit, tokens)):
+                completed.append(self._cut(0))
+        return completed
+
+    def finish(self) -> list[str]:
+        """Returns the remaining partial chunk, if any."""
+        if not self._current:
+            return []
+        chunk = _SEPARATOR.join(u for u, _ in self._current)
+        self._current, self._current_tokens = [], 0
+        return [chunk]
+
+
+def split_into_chunks(text: str, max_tokens: int = 2000, overlap_tokens: int = 200,
+                      content_defined: bool = False) -> list[str]:
+    """Splits a complete text into chunks; see ChunkBuilder."""
+    builder = ChunkBuilder(max_tokens, overlap_tokens, content_defined)
+    return builder.add(text) + builder.finish()
+
+
+def group_by_token_budget(texts: list[str], max_tokens: int) -> list[list[str]]:
+    """Packs consecutive texts into groups whose combined size stays within `max_tokens`."""
+    groups: list[list[str]] = []
+    current: list[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
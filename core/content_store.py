@@ -0,0 +1,184 @@
+"""
+Compressed, segmented storage of the extracted text of documents.
+
+The text is kept out of the `documents` rows, in zlib-compressed segments of
+CONTENT_SEGMENT_BYTES (default 256 KiB) of UTF-8 in `document_content_segments`,
+so writing, vacuuming and caching document rows doesn't move the text around,
+and byte ranges can be read by decompressing only the segments they cover.
+
+Documents stored inline before this table existed can be moved with:
+    python -m core.content_store [--batch-size 100]
+"""
+import argparse
+import asyncio
+import os
+import zlib
+from typing import AsyncIterator, Optional
+
+from core.db import init_db_pool, close_db_pool, get_db_connection
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def segment_bytes() -> int:
+    return int(os.getenv("CONTENT_SEGMENT_BYTES", str(256 * 1024)))
+
+
+def compress_content(content: str) -> tuple[int, list[tuple]]:
+    """
+    Splits the UTF-8 encoding of `content` into segments and compresses them.
+    CPU-bound; run it in a thread.
+
+    Returns:
+        tuple: The size of the text in bytes, and (segment_index, byte_offset,
+            byte_length, compressed data) per segment.
+    """
+    data = content.encode("utf-8")
+    size = segment_bytes()
+    segments = [
+        (index, offset, len(data[offset:offset + size]), zlib.compress(data[offset:offset + size], 6))
+        for index, offset in enumerate(range(0, len(data), size))
+    ]
+    return len(data), segments
+
+
+async def copy_content_segments(conn, records: list[tuple[int, list[tuple]]]):
+    """Bulk-inserts the segments of documents, given (document_id, segments from compress_content) records."""
+    await conn.copy_records_to_table(
+        "document_content_segments",
+        records=[(document_id, *segment) for document_id, segments in records for segment in segments],
+        columns=["document_id", "segment_index", "byte_offset", "byte_length", "data"],
+    )
+
+
+async def get_content_info(conn, document_id: int) -> Optional[dict]:
+    """
+    Returns where the text of a document is stored: "source_id" (the original
+    for duplicates) and "size" in bytes, or None if the document doesn't exist.
+    Documents stored inline have a None size.
+    """
+    row = await conn.fetchrow(
+        """
+        SELECT o.id AS source_id, o.content_bytes AS size FROM documents d
+        JOIN documents o ON o.id = COALESCE(d.duplicate_of, d.id)
+        WHERE d.id = $1;
+        """,
+        document_id,
+    )
+    return dict(row) if row else None
+
+
+async def _read_inline(document_id: int) -> bytes:
+    async with get_db_connection() as conn:
+        content = await conn.fetchval(
+            """
+            SELECT COALESCE(d.content, o.content) FROM documents d
+            LEFT JOIN documents o ON o.id = d.duplicate_of
+            WHERE d.id = $1;
+            """,
+            document_id,
+        )
+    return (content or "").encode("utf-8")
+
+
+async def iter_content(document_id: int, info: dict, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Yields bytes `start` to `end` (exclusive; the whole text by default) of a
+    document's UTF-8 text, one segment at a time. A connection is held only
+    while a segment is read, not while the caller consumes it.
+    """
+    if info["size"] is None:
+        data = await _read_inline(document_id)
+        yield data[start:end]
+        return
+    end = info["size"] if end is None else min(end, info["size"])
+    async with get_db_connection() as conn:
+        segments = await conn.fetch(
+            """
+            SELECT segment_index, byte_offset, byte_length FROM document_content_segments
+            WHERE document_id = $1 AND byte_offset < $3 AND byte_offset + byte_length > $2
+            ORDER BY segment_index;
+            """,
+            info["source_id"], start, end,
+        )
+    for segment in segments:
+        async with get_db_connection() as conn:
+            compressed = await conn.fetchval(
+                "SELECT data FROM document_content_segments WHERE document_id = $1 AND segment_index = $2;",
+                info["source_id"], segment["segment_index"],
+            )
+        data = await asyncio.to_thread(zlib.decompress, compressed)
+        offset = segment["byte_offset"]
+        yield data[max(0, start - offset):end - offset]
+
+
+async def load_content(conn, document_id: int) -> Optional[str]:
+    """Returns the whole text of a document, or None if the document doesn't exist."""
+    info = await get_content_info(conn, document_id)
+    if info is None:
+        return None
+    if info["size"] is None:
+        return (await _read_inline(document_id)).decode("utf-8")
+    rows = await conn.fetch(
+        "SELECT data FROM document_content_segments WHERE document_id = $1 ORDER BY segment_index;",
+        info["source_id"],
+    )
+    data = await asyncio.to_thread(lambda: b"".join(zlib.decompress(row["data"]) for row in rows))
+    return data.decode("utf-8")
+
+
+async def migrate_inline_content(batch_size: int = 100) -> int:
+    """Moves inline document text into compressed segments. Returns the number of documents moved."""
+    total = 0
+    while True:
+        async with get_db_connection() as conn:
+            # Originals have lower ids than their duplicates, so they are moved first
+            rows = await conn.fetch(
+                """
+                SELECT id, duplicate_of, content FROM documents
+                WHERE content IS NOT NULL ORDER BY id LIMIT $1;
+                """,
+                batch_size,
+            )
+            if not rows:
+                break
+            originals = [row for row in rows if row["duplicate_of"] is None]
+            compressed = await asyncio.to_thread(lambda: [compress_content(row["content"]) for row in originals])
+            async with conn.transaction():
+                await copy_content_segments(conn, [(row["id"], segments) for row, (_, segments) in zip(originals, compressed)])
+                await conn.execute(
+                    """
+                    UPDATE documents d SET content = NULL, content_bytes = v.size
+                    FROM unnest($1::int[], $2::bigint[]) AS v(id, size)
+                    WHERE d.id = v.id;
+                    """,
+                    [row["id"] for row in originals], [size for size, _ in compressed],
+                )
+                # Duplicates read the text of their original
+                await conn.execute(
+                    "UPDATE documents SET content = NULL WHERE id = ANY($1::int[]);",
+                    [row["id"] for row in rows if row["duplicate_of"] is not None],
+                )
+        total += len(rows)
+        logger.info(f"Moved the content of {total} document(s) to segment storage.")
+    return total
+
+
+async def _main(batch_size: int):
+    await init_db_pool()
+    try:
+        total = await migrate_inline_content(batch_size)
+    finally:
+        await close_db_pool()
+    print(f"Moved the content of {total} document(s) to segment storage.")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Move inline document text to compressed segment storage.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(_main(args.batch_size))
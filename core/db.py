@@ -1,26 +1,163 @@
+import asyncio
 import os
-import streamlit as st
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from pgvector.psycopg2 import register_vector # <-- Import here
+import time
+from contextlib import asynccontextmanager
 
-def get_db_connection():
+import asyncpg
+from pgvector.asyncpg import register_vector
+
+from core.exceptions import DatabaseUnavailableError
+from core.logger import get_logger
+from core.metrics import DB_ACQUIRE_SECONDS
+
+logger = get_logger(__name__)
+
+# Process-wide connection pool, created on startup (or lazily on first use)
+_pool = None
+_pool_lock = asyncio.Lock()
+_pool_stats = {
+    "checkouts": 0,
+    "checkout_timeouts": 0,
+    "failed_health_checks": 0,
+    "total_wait_seconds": 0.0,
+}
+
+
+async def _init_connection(conn):
+    """Runs once for every new pooled connection: registers the VECTOR type codec."""
+    await register_vector(conn)
+
+
+async def _check_connection(conn):
+    """Runs on every checkout: makes sure the pooled connection is still usable."""
+    if os.getenv("DB_POOL_HEALTH_CHECK", "true").lower() != "true":
+        return
+    try:
+        await conn.fetchval("SELECT 1;", timeout=float(os.getenv("DB_POOL_HEALTH_CHECK_TIMEOUT", "2")))
+    except Exception:
+        _pool_stats["failed_health_checks"] += 1
+        raise
+
+
+def _connection_settings() -> dict:
+    return {
+        "host": os.getenv("DB_HOST"),
+        "database": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "port": int(os.getenv("DB_PORT", "5432")),
+    }
+
+
+async def connect():
     """
-    Establishes and returns a connection to the PostgreSQL database
-    that is pre-configured to handle the VECTOR type.
+    Opens a single connection outside the pool, without the VECTOR codec, e.g.
+    to create the pgvector extension the pooled connections depend on. The
+    caller closes it.
+
+    Raises:
+        DatabaseUnavailableError: If the database can't be reached.
     """
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            port=os.getenv("DB_PORT")
-            # Do not use RealDictCursor here, we will apply it per-query
-        )
-        # THIS IS THE FIX: Register the vector type adapter on the connection
-        register_vector(conn)
-        return conn
+        return await asyncpg.connect(**_connection_settings())
     except Exception as e:
-        st.error(f"Database connection failed: {e}")
-        return None
\ No newline at end of file
+        raise DatabaseUnavailableError(f"Database connection failed: {e}") from e
+
+
+async def init_db_pool():
+    """
+    Creates the process-wide PostgreSQL connection pool. Sizing is controlled with
+    DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE; idle connections are closed after
+    DB_POOL_MAX_IDLE_SECONDS.
+    """
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            return _pool
+        try:
+            _pool = await asyncpg.create_pool(
+                **_connection_settings(),
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                max_inactive_connection_lifetime=float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300")),
+                init=_init_connection,
+                setup=_check_connection,
+            )
+            logger.info("Database connection pool created.")
+        except Exception as e:
+            logger.error(f"Database connection pool could not be created: {e}")
+            raise DatabaseUnavailableError(f"Database connection failed: {e}") from e
+        return _pool
+
+
+async def close_db_pool():
+    """Closes the connection pool, waiting for borrowed connections to be returned."""
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+            logger.info("Database connection pool closed.")
+
+
+@asynccontextmanager
+async def get_db_connection():
+    """
+    Borrows a connection from the pool for the duration of the `async with` block
+    and returns it afterwards. The connection is pre-configured to handle the
+    VECTOR type.
+
+    Raises:
+        DatabaseUnavailableError: If no healthy connection could be checked out
+            within DB_POOL_CHECKOUT_TIMEOUT seconds.
+    """
+    pool = _pool or await init_db_pool()
+    timeout = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "10"))
+
+    started = time.perf_counter()
+    conn = None
+    # A connection that fails its health check is discarded by the pool; try once more
+    for attempt in range(2):
+        try:
+            conn = await pool.acquire(timeout=timeout)
+            break
+        except asyncio.TimeoutError as e:
+            _pool_stats["checkout_timeouts"] += 1
+            raise DatabaseUnavailableError("Timed out waiting for a database connection.") from e
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            if attempt == 1:
+                raise DatabaseUnavailableError(f"Database connection failed: {e}") from e
+            logger.warning(f"Discarding unhealthy pooled connection: {e}")
+    waited = time.perf_counter() - started
+    _pool_stats["checkouts"] += 1
+    _pool_stats["total_wait_seconds"] += waited
+    DB_ACQUIRE_SECONDS.observe(waited)
+
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+def get_pool_stats() -> dict:
+    """Returns sizing and usage statistics for the connection pool."""
+    stats = {
+        "initialized": _pool is not None,
+        "checkouts": _pool_stats["checkouts"],
+        "checkout_timeouts": _pool_stats["checkout_timeouts"],
+        "failed_health_checks": _pool_stats["failed_health_checks"],
+        "avg_checkout_wait_ms": (
+            1000 * _pool_stats["total_wait_seconds"] / _pool_stats["checkouts"] if _pool_stats["checkouts"] else 0.0
+        ),
+    }
+    if _pool is not None:
+        size = _pool.get_size()
+        idle = _pool.get_idle_size()
+        stats.update({
+            "min_size": _pool.get_min_size(),
+            "max_size": _pool.get_max_size(),
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+        })
+    return stats
@@ -0,0 +1,95 @@
+"""Embedding backends used for document chunks and search queries."""
+import asyncio
+import hashlib
+import math
+import os
+import re
+from typing import Optional
+
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Dimension of the `embedding` columns (text-embedding-ada-002 / text-embedding-3-small)
+EMBEDDING_DIMENSIONS = 1536
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class AzureEmbeddingBackend:
+    """Computes embeddings with the Azure OpenAI deployment, several inputs per API call."""
+
+    def __init__(self, client, model: str, batch_size: Optional[int] = None, max_concurrency: Optional[int] = None):
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self._semaphore = asyncio.Semaphore(max_concurrency or int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4")))
+
+    async def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        async with self._semaphore:
+            response = await self.client.embeddings.create(model=self.model, input=batch)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Returns one embedding per text, in order."""
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        return [embedding for batch in results for embedding in batch]
+
+
+class LocalEmbeddingBackend:
+    """
+    Deterministic, dependency-free embeddings based on feature hashing of word
+    unigrams and bigrams. Similar texts get similar vectors, which is enough to
+    test and benchmark search without calling Azure.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        # Identifies the vectors, like the deployment name of the Azure backend
+        self.model = f"local-hashing-{dimensions}"
+
+    def _embed_one(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        words = _TOKEN_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Returns one embedding per text, in order."""
+        return await asyncio.to_thread(lambda: [self._embed_one(text) for text in texts])
+
+
+def build_embedding_backend(client):
+    """
+    Returns the embedding backend selected by EMBEDDING_BACKEND ("azure" or
+    "local"). Defaults to Azure when EMBEDDING_DEPLOYMENT_NAME is set.
+    """
+    model = os.getenv("EMBEDDING_DEPLOYMENT_NAME")
+    backend = os.getenv("EMBEDDING_BACKEND", "azure" if model else "local").lower()
+    if backend == "local":
+        logger.info("Using the local hashing embedding backend.")
+        return LocalEmbeddingBackend()
+    if not model:
+        raise ValueError("EMBEDDING_DEPLOYMENT_NAME must be set to use the azure embedding backend.")
+    return AzureEmbeddingBackend(client, model)
+
+
+def mean_embedding(embeddings: list[list[float]]) -> Optional[list[float]]:
+    """
+    Averages chunk embeddings into a normalized document-level embedding.
+    Returns None (stored as NULL) without chunks or when the mean is the zero
+    vector, whose cosine distance to anything is NaN.
+    """
+    if not embeddings:
+        return None
+    mean = [sum(values) / len(embeddings) for values in zip(*embeddings)]
+    norm = math.sqrt(sum(v * v for v in mean))
+    return [v / norm for v in mean] if norm else None
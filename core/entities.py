@@ -0,0 +1,158 @@
+"""
+Canonicalization of extracted entities for the normalized `entities` and
+`document_entities` tables.
+
+Documents ingested before the tables existed can be indexed with:
+    python -m core.entities [--batch-size 500]
+"""
+import argparse
+import asyncio
+import json
+import re
+import unicodedata
+from typing import Optional
+
+from core.db import init_db_pool, close_db_pool, get_db_connection
+from core.logger import get_logger
+from core.repository import replace_document_entities
+
+logger = get_logger(__name__)
+
+_SPACES_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w")
+# Quotes, brackets and punctuation the model sometimes leaves around a name
+_EDGE_CHARACTERS = " \t\"'`“”‘’()[]{}<>.,;:!?-–—"
+
+
+def canonicalize_entity(text: str) -> str:
+    """
+    Returns the form an entity is indexed and looked up by: Unicode-normalized,
+    casefolded, with single spaces and without surrounding punctuation.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return _SPACES_RE.sub(" ", text).strip(_EDGE_CHARACTERS).casefold()
+
+
+def canonicalize_type(entity_type: Optional[str]) -> str:
+    return _SPACES_RE.sub(" ", unicodedata.normalize("NFKC", entity_type or "")).strip().casefold() or "unknown"
+
+
+def _find_mentions(names: set[str], chunks: list[str]) -> dict[str, list[int]]:
+    """
+    Returns the indexes of the `chunks` mentioning each canonical name, as whole
+    words only, so "art" isn't found in "start". Lookarounds rather than \\b also
+    work for names starting or ending with a symbol, like "c++".
+
+    All names are searched in one pass per chunk: the alternation is tried
+    longest first at every word start, and the shorter names the match starts
+    with (e.g. "new" in "new york") are counted from a precomputed prefix table.
+    """
+    if not names:
+        return {}
+    ordered = sorted(names, key=len, reverse=True)
+    pattern = re.compile(rf"(?<!\w)(?=({'|'.join(map(re.escape, ordered))})(?!\w))")
+    prefixes = {
+        name: [other for other in ordered if len(other) < len(name) and name.startswith(other)
+               and not _WORD_RE.match(name[len(other)])]
+        for name in ordered
+    }
+
+    found: dict[str, list[int]] = {}
+    for i, chunk in enumerate(chunks):
+        lowered = _SPACES_RE.sub(" ", unicodedata.normalize("NFKC", chunk)).casefold()
+        mentioned = set()
+        for match in pattern.finditer(lowered):
+            mentioned.add(match.group(1))
+            mentioned.update(prefixes[match.group(1)])
+        for name in mentioned:
+            found.setdefault(name, []).append(i)
+    return found
+
+
+def normalize_entities(entities_data, chunks: list[str]) -> list[dict]:
+    """
+    Turns the agents' entity output ({"entities": [{"text", "type"}, ...]} or the
+    bare list) into one row per distinct canonical (text, type), with the number
+    of chunks mentioning it and the indexes of those retrieval `chunks`.
+    """
+    if isinstance(entities_data, dict):
+        entities_data = entities_data.get("entities")
+    if not isinstance(entities_data, list):
+        return []
+    rows = {}
+    for entity in entities_data:
+        if not isinstance(entity, dict) or not isinstance(entity.get("text"), str):
+            continue
+        canonical = canonicalize_entity(entity["text"])
+        if not canonical:
+            continue
+        key = (canonical, canonicalize_type(entity.get("type") if isinstance(entity.get("type"), str) else None))
+        if key in rows:
+            continue
+        rows[key] = {
+            "canonical_text": key[0],
+            "type": key[1],
+            "display_text": _SPACES_RE.sub(" ", entity["text"]).strip(),
+            "mentions": 1,
+            "chunk_indexes": [],
+        }
+
+    found = _find_mentions({key[0] for key in rows}, chunks)
+    for (canonical, _), row in rows.items():
+        row["chunk_indexes"] = found.get(canonical, [])
+        row["mentions"] = max(1, len(row["chunk_indexes"]))
+    return list(rows.values())
+
+
+async def backfill_entities(batch_size: int = 500) -> int:
+    """Indexes the entities of documents that have none indexed yet. Returns the number of documents."""
+    total = 0
+    last_id = 0
+    while True:
+        async with get_db_connection() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT d.id, COALESCE(d.duplicate_of, d.id) AS source_id, d.entities FROM documents d
+                WHERE d.id > $1 AND d.entities IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM document_entities de WHERE de.document_id = d.id)
+                ORDER BY d.id LIMIT $2;
+                """,
+                last_id, batch_size,
+            )
+            if not rows:
+                break
+            # Duplicates are matched against the chunks of their original
+            chunk_rows = await conn.fetch(
+                "SELECT document_id, content FROM document_chunks WHERE document_id = ANY($1::int[]) ORDER BY document_id, chunk_index;",
+                list({row["source_id"] for row in rows}),
+            )
+            chunks = {}
+            for chunk in chunk_rows:
+                chunks.setdefault(chunk["document_id"], []).append(chunk["content"])
+            async with conn.transaction():
+                for row in rows:
+                    entities = normalize_entities(json.loads(row["entities"]), chunks.get(row["source_id"], []))
+                    await replace_document_entities(conn, row["id"], entities)
+        total += len(rows)
+        last_id = rows[-1]["id"]
+        logger.info(f"Indexed the entities of {total} document(s).")
+    return total
+
+
+async def _main(batch_size: int):
+    await init_db_pool()
+    try:
+        total = await backfill_entities(batch_size)
+    finally:
+        await close_db_pool()
+    print(f"Indexed the entities of {total} document(s).")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Index the entities of previously ingested documents.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(_main(args.batch_size))
@@ -0,0 +1,39 @@
+"""Defines custom exceptions for the application."""
+
+class DocumentProcessingError(Exception):
+    """Base exception for errors during document processing."""
+    pass
+
+class ParsingError(DocumentProcessingError):
+    """Raised when text extraction from a file fails."""
+    def __init__(self, filename, message="Failed to parse content"):
+        self.filename = filename
+        self.message = f"[{filename}] {message}"
+        super().__init__(self.message)
+
+class UnsupportedFileTypeError(DocumentProcessingError):
+    """Raised when an unsupported file type is uploaded."""
+    def __init__(self, filename, file_type):
+        self.filename = filename
+        self.file_type = file_type
+        self.message = f"[{filename}] Unsupported file type: '{file_type}'"
+        super().__init__(self.message)
+
+class DocumentTooLargeError(DocumentProcessingError):
+    """Raised when a file exceeds the configured size or page limit."""
+    def __init__(self, filename, message="Document is too large"):
+        self.filename = filename
+        self.message = f"[{filename}] {message}"
+        super().__init__(self.message)
+
+class DatabaseUnavailableError(Exception):
+    """Raised when no database connection can be obtained."""
+    def __init__(self, message="Database connection is unavailable."):
+        self.message = message
+        super().__init__(self.message)
+
+class LLMServiceError(Exception):
+    """Raised when a call to the language model fails and cannot be retried further."""
+    def __init__(self, message="The language model request failed."):
+        self.message = message
+        super().__init__(self.message)
@@ -0,0 +1,271 @@
+"""Per-document ingestion workflow shared by the API and the ingestion workers."""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Optional
+
+from core.chunk_store import ChunkAnalysisStore, chunk_hash
+from core.chunking import ChunkBuilder, content_defined_chunking_enabled
+from core.content_store import compress_content, copy_content_segments
+from core.db import get_db_connection
+from core.embeddings import build_embedding_backend, mean_embedding
+from core.entities import normalize_entities
+from core.llm import get_async_azure_openai_client
+from core.llm_cache import CachedLLMClient
+from core.logger import get_logger
+from core.metrics import document_timings, stage
+from core.parser import stream_pages
+from core.pipeline import IngestionPipeline
+from core.progress import emit_progress
+from core.rate_limiter import RateLimitedLLMClient
+from core.repository import (
+    find_document_by_hash, allocate_document_ids, copy_documents, copy_chunks, insert_duplicates,
+    add_document_entities, copy_document_entities,
+)
+
+from agents.summarization_agent import SummarizationAgent
+from agents.combined_analysis_agent import CombinedAnalysisAgent
+from agents.entity_extraction_agent import EntityExtractionAgent
+from agents.validation_agent import ValidationAgent
+from agents.tiered_validation_agent import TieredValidationAgent
+
+logger = get_logger(__name__)
+
+
+def build_pipeline():
+    """
+    Creates the LLM client (rate limited, and wrapped in the response cache
+    unless LLM_CACHE_ENABLED=false), the agents and the embedding backend
+    used for ingestion.
+
+    ANALYSIS_MODE selects how documents are analysed: "agents" (default)
+    runs separate summarization and entity extraction calls, "combined"
+    gets both from a single structured call per chunk.
+
+    Summaries are validated with local checks first and only borderline ones
+    go to the LLM, unless VALIDATION_TIERED=false.
+
+    Per-chunk results are stored and reused for chunks seen before, unless
+    CHUNK_REUSE_ENABLED=false.
+
+    Returns:
+        tuple: The IngestionPipeline and the CachedLLMClient, or None if caching is disabled.
+    """
+    completion_model = os.getenv("COMPLETION_DEPLOYMENT_NAME")
+    if not completion_model:
+        raise ValueError("COMPLETION_DEPLOYMENT_NAME must be set in the .env file.")
+
+    # Cache hits never reach the limiter, so they don't use up the rate budget
+    client = RateLimitedLLMClient(get_async_azure_openai_client())
+    llm_cache = None
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true":
+        # Agents call the model through the cache transparently
+        llm_cache = client = CachedLLMClient(client)
+
+    mode = os.getenv("ANALYSIS_MODE", "agents").lower()
+    if mode == "combined":
+        summarizer, entity_extractor = CombinedAnalysisAgent(client, completion_model), None
+    elif mode == "agents":
+        summarizer, entity_extractor = SummarizationAgent(client, completion_model), EntityExtractionAgent(client, completion_model)
+    else:
+        raise ValueError(f"Unknown ANALYSIS_MODE '{mode}'; expected 'agents' or 'combined'.")
+    logger.info(f"Using the '{mode}' analysis mode.")
+
+    embedder = build_embedding_backend(client)
+    validator = ValidationAgent(client, completion_model)
+    if os.getenv("VALIDATION_TIERED", "true").lower() == "true":
+        validator = TieredValidationAgent(validator, embedder)
+
+    chunk_store = embedding_store = None
+    if os.getenv("CHUNK_REUSE_ENABLED", "true").lower() == "true":
+        chunk_store = ChunkAnalysisStore(completion_model)
+        # Embeddings don't depend on the prompts, only on the embedding model
+        embedding_store = ChunkAnalysisStore(embedder.model, prompt_version="1")
+
+    pipeline = IngestionPipeline(summarizer, entity_extractor, validator, embedder=embedder, chunk_store=chunk_store,
+                                 embedding_store=embedding_store)
+    return pipeline, llm_cache
+
+
+def _retrieval_chunk_builder() -> ChunkBuilder:
+    return ChunkBuilder(
+        max_tokens=int(os.getenv("EMBEDDING_CHUNK_TOKENS", "512")),
+        overlap_tokens=int(os.getenv("EMBEDDING_CHUNK_OVERLAP_TOKENS", "64")),
+        content_defined=content_defined_chunking_enabled(),
+    )
+
+
+async def analyze_document(pipeline: IngestionPipeline, filename: str, content_type: str, data: bytes) -> Optional[dict]:
+    """
+    Parses a document and runs the agents and embeddings on it, without writing
+    anything. Documents seen before are detected by hash and not analysed again.
+
+    Returns:
+        dict: A record to pass to `save_documents`, or None if the file had no content.
+            The record's "timings" hold the time spent per stage and the LLM usage.
+    """
+    with document_timings() as timings, stage("ingest", filename=filename):
+        record = await _analyze_document(pipeline, filename, content_type, data)
+    if record is not None:
+        record["timings"] = timings
+    return record
+
+
+async def _analyze_document(pipeline: IngestionPipeline, filename: str, content_type: str, data: bytes) -> Optional[dict]:
+    logger.info(f"Processing file: {filename}")
+
+    # --- DEDUPLICATION BY RAW BYTES ---
+    file_hash = hashlib.sha256(data).hexdigest()
+    with stage("dedup_lookup"):
+        async with get_db_connection() as conn:
+            original_id = await find_document_by_hash(conn, file_hash=file_hash)
+    if original_id:
+        emit_progress("duplicate", duplicate_of=original_id)
+        return {"filename": filename, "file_hash": file_hash, "duplicate_of": original_id}
+
+    # --- PARSING ---
+    # Pages are extracted in the parser process pool and chunked as they arrive,
+    # so chunking overlaps with the extraction of later pages.
+    pages = []
+    content_hasher = hashlib.sha256()
+    chunk_builder = pipeline.summarizer.chunk_builder()
+    chunks = []
+    # Retrieval uses smaller chunks than summarization
+    retrieval_builder = _retrieval_chunk_builder()
+    retrieval_chunks = []
+    with stage("parse"):
+        async for page in stream_pages(filename, content_type, data):
+            content_hasher.update((("\n" if pages else "") + page).encode("utf-8"))
+            pages.append(page)
+            chunks.extend(await asyncio.to_thread(chunk_builder.add, page))
+            retrieval_chunks.extend(await asyncio.to_thread(retrieval_builder.add, page))
+        chunks.extend(chunk_builder.finish())
+        retrieval_chunks.extend(retrieval_builder.finish())
+    content = "\n".join(pages)
+    if not content.strip():
+        logger.warning(f"No content extracted from {filename}. Skipping.")
+        return None
+    emit_progress("parsed", pages=len(pages), characters=len(content), chunks=len(chunks))
+
+    # --- DEDUPLICATION BY EXTRACTED CONTENT ---
+    content_hash = content_hasher.hexdigest()
+    with stage("dedup_lookup"):
+        async with get_db_connection() as conn:
+            original_id = await find_document_by_hash(conn, content_hash=content_hash)
+    if original_id:
+        emit_progress("duplicate", duplicate_of=original_id)
+        return {"filename": filename, "file_hash": file_hash, "duplicate_of": original_id}
+
+    # --- AGENT WORKFLOW AND EMBEDDINGS ---
+    # Validation compares the summary against the retrieval chunks, so it reuses their embeddings
+    embed_task = asyncio.create_task(embed_chunks(pipeline, retrieval_chunks))
+    try:
+        result = await pipeline.process(content, chunks=chunks, sections=retrieval_chunks, section_embeddings=embed_task)
+        chunk_embeddings = await embed_task
+    finally:
+        embed_task.cancel()
+    if result["status"] == "needs_review":
+        logger.warning(f"Summary for {filename} failed validation. Status set to 'needs_review'.")
+    entity_rows = await asyncio.to_thread(normalize_entities, result["entities"], retrieval_chunks)
+    content_bytes, content_segments = await asyncio.to_thread(compress_content, content)
+
+    return {
+        "filename": filename,
+        "file_hash": file_hash,
+        "duplicate_of": None,
+        "content_bytes": content_bytes,
+        "content_segments": content_segments,
+        "content_hash": content_hash,
+        "summary": result["summary"],
+        "entities": result["entities"],
+        "status": result["status"],
+        "chunks": retrieval_chunks,
+        "chunk_embeddings": chunk_embeddings,
+        "entity_rows": entity_rows,
+    }
+
+
+async def embed_chunks(pipeline: IngestionPipeline, texts: list[str]) -> list[list[float]]:
+    """Embeds retrieval chunks, reusing the stored embedding of chunks that were embedded before."""
+    with stage("embed"):
+        if pipeline.embedding_store is None:
+            embeddings = await pipeline.embedder.embed(texts)
+        else:
+            embeddings = await pipeline.embedding_store.map_batch("embedding", texts, pipeline.embedder.embed)
+    emit_progress("embedded", chunks=len(texts))
+    return embeddings
+
+
+async def save_documents(conn, records: list[dict]) -> list[dict]:
+    """
+    Writes analysed documents, their compressed text, chunks, entity links and
+    duplicate references with a handful of bulk statements. Run it inside a transaction so a batch is
+    committed once.
+
+    Returns:
+        list: The id, filename and deduplication info of every record, in order.
+    """
+    if not records:
+        return []
+    ids = await allocate_document_ids(conn, len(records))
+
+    new_docs = [(doc_id, r) for doc_id, r in zip(ids, records) if r["duplicate_of"] is None]
+    duplicates = [(doc_id, r) for doc_id, r in zip(ids, records) if r["duplicate_of"] is not None]
+
+    if new_docs:
+        await copy_documents(conn, [
+            (doc_id, r["filename"], r["summary"], json.dumps(r["entities"]),
+             mean_embedding(r["chunk_embeddings"]), r["status"], r["content_hash"], r["file_hash"],
+             json.dumps(r["timings"]), r["content_bytes"])
+            for doc_id, r in new_docs
+        ])
+        await copy_content_segments(conn, [(doc_id, r["content_segments"]) for doc_id, r in new_docs])
+        await copy_chunks(conn, [
+            (doc_id, i, chunk, embedding, chunk_hash(chunk))
+            for doc_id, r in new_docs
+            for i, (chunk, embedding) in enumerate(zip(r["chunks"], r["chunk_embeddings"]))
+            # A zero vector has no cosine distance to anything (it is NaN)
+            if any(embedding)
+        ])
+        await add_document_entities(conn, [(doc_id, r["entity_rows"]) for doc_id, r in new_docs])
+    if duplicates:
+        await insert_duplicates(
+            conn,
+            [doc_id for doc_id, _ in duplicates],
+            [r["filename"] for _, r in duplicates],
+            [r["file_hash"] for _, r in duplicates],
+            [r["duplicate_of"] for _, r in duplicates],
+        )
+        await copy_document_entities(conn, [doc_id for doc_id, _ in duplicates], [r["duplicate_of"] for _, r in duplicates])
+        for doc_id, r in duplicates:
+            logger.info(f"{r['filename']} is a duplicate of document id {r['duplicate_of']}. Saved as id {doc_id} without reprocessing.")
+
+    logger.info(f"Saved {len(new_docs)} new and {len(duplicates)} deduplicated document(s).")
+    return [
+        {"id": doc_id, "filename": r["filename"], "deduplicated": r["duplicate_of"] is not None, "duplicate_of": r["duplicate_of"]}
+        for doc_id, r in zip(ids, records)
+    ]
+
+
+async def ingest_document(pipeline: IngestionPipeline, filename: str, content_type: str, data: bytes) -> Optional[dict]:
+    """
+    Parses, analyses and stores a single document in its own transaction, so
+    it is kept even if a later file of the same request fails. Emits a
+    "saved" progress event once it is committed.
+
+    Returns:
+        dict: The new document id, filename, deduplication info and status, or
+            None if the file had no content.
+    """
+    record = await analyze_document(pipeline, filename, content_type, data)
+    if record is None:
+        return None
+    async with get_db_connection() as conn:
+        async with conn.transaction():
+            [saved] = await save_documents(conn, [record])
+    saved["status"] = record.get("status")
+    emit_progress("saved", document_id=saved["id"], deduplicated=saved["deduplicated"],
+                  duplicate_of=saved["duplicate_of"], status=saved["status"], timings=record.get("timings"))
+    logger.info(f"Successfully ingested and saved document id: {saved['id']}")
+    return saved
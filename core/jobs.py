@@ -0,0 +1,301 @@
+"""Durable, Postgres-backed queue for ingestion jobs."""
+import asyncio
+import os
+import uuid
+from typing import Optional
+
+from core.db import get_db_connection
+from core.exceptions import ParsingError, UnsupportedFileTypeError, DocumentTooLargeError
+from core.ingestion import analyze_document, save_documents
+from core.logger import get_logger
+from core.metrics import DOCUMENTS, stage
+
+logger = get_logger(__name__)
+
+# Errors that will not go away by retrying the file
+_PERMANENT_ERRORS = (ParsingError, UnsupportedFileTypeError, DocumentTooLargeError)
+
+
+async def enqueue_job(conn, files: list[tuple[str, str, bytes]]) -> str:
+    """
+    Stores a new job and its files in one transaction.
+
+    Args:
+        files: (filename, content_type, data) for every uploaded file.
+
+    Returns:
+        str: The job id.
+    """
+    job_id = uuid.uuid4()
+    async with conn.transaction():
+        await conn.execute("INSERT INTO ingest_jobs (id, total_files) VALUES ($1, $2);", job_id, len(files))
+        await conn.executemany(
+            "INSERT INTO ingest_job_files (job_id, filename, content_type, data) VALUES ($1, $2, $3, $4);",
+            [(job_id, filename, content_type, data) for filename, content_type, data in files],
+        )
+    return str(job_id)
+
+
+async def claim_files(conn, limit: int, lock_timeout: float, max_attempts: int) -> list:
+    """
+    Claims up to `limit` queued files for this worker. Files left in 'processing'
+    for longer than `lock_timeout` seconds (e.g. after a worker crash) are
+    picked up again until they have been attempted `max_attempts` times.
+    """
+    async with conn.transaction():
+        await conn.execute(
+            """
+            UPDATE ingest_job_files
+            SET status = 'failed', data = NULL, updated_at = NOW(),
+                error = 'Gave up after ' || attempts || ' attempts.'
+            WHERE status = 'processing' AND attempts >= $1
+              AND locked_at < NOW() - make_interval(secs => $2);
+            """,
+            max_attempts, lock_timeout,
+        )
+        return await conn.fetch(
+            """
+            UPDATE ingest_job_files
+            SET status = 'processing', attempts = attempts + 1, locked_at = NOW(), updated_at = NOW()
+            WHERE id IN (
+                SELECT id FROM ingest_job_files
+                WHERE status = 'queued'
+                   OR (status = 'processing' AND locked_at < NOW() - make_interval(secs => $2))
+                ORDER BY id
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, job_id, filename, content_type, data, attempts;
+            """,
+            limit, lock_timeout,
+        )
+
+
+async def refresh_locks(conn, file_ids: list[int], attempts: list[int]):
+    """
+    Renews the lock of files that are still being processed, so they aren't
+    claimed again after `lock_timeout` while this worker is working on them.
+    A file is identified by its id and its attempt count when it was claimed,
+    which changes when another worker claims it.
+    """
+    await conn.execute(
+        """
+        UPDATE ingest_job_files f SET locked_at = NOW()
+        FROM unnest($1::int[], $2::int[]) AS v(id, attempts)
+        WHERE f.id = v.id AND f.attempts = v.attempts AND f.status = 'processing';
+        """,
+        file_ids, attempts,
+    )
+
+
+async def complete_files(conn, file_ids: list[int], attempts: list[int], results: list[Optional[dict]]):
+    """
+    Records processed files in one statement. A result is None when the file
+    had no content. Files claimed again by another worker since (see
+    refresh_locks) are left to it.
+    """
+    await conn.execute(
+        """
+        UPDATE ingest_job_files f
+        SET status = v.status, document_id = v.document_id, deduplicated = v.deduplicated,
+            data = NULL, error = NULL, updated_at = NOW()
+        FROM unnest($1::int[], $2::int[], $3::text[], $4::int[], $5::bool[])
+             AS v(id, attempts, status, document_id, deduplicated)
+        WHERE f.id = v.id AND f.attempts = v.attempts AND f.status = 'processing';
+        """,
+        file_ids,
+        attempts,
+        ["done" if result else "skipped" for result in results],
+        [result["id"] if result else None for result in results],
+        [bool(result and result["deduplicated"]) for result in results],
+    )
+
+
+async def fail_file(conn, file_id: int, attempts: int, error: str, retry: bool):
+    """Records a failed attempt, putting the file back in the queue if it should be retried."""
+    if retry:
+        await conn.execute(
+            """
+            UPDATE ingest_job_files SET status = 'queued', error = $3, locked_at = NULL, updated_at = NOW()
+            WHERE id = $1 AND attempts = $2 AND status = 'processing';
+            """,
+            file_id, attempts, error,
+        )
+    else:
+        await conn.execute(
+            """
+            UPDATE ingest_job_files SET status = 'failed', error = $3, data = NULL, updated_at = NOW()
+            WHERE id = $1 AND attempts = $2 AND status = 'processing';
+            """,
+            file_id, attempts, error,
+        )
+
+
+def _job_status(counts: dict, total: int) -> str:
+    pending = counts.get("queued", 0) + counts.get("processing", 0)
+    if pending:
+        return "queued" if counts.get("queued", 0) == total else "running"
+    if counts.get("failed", 0) == total:
+        return "failed"
+    if counts.get("failed", 0):
+        return "completed_with_errors"
+    return "completed"
+
+
+async def get_job(conn, job_id: str) -> Optional[dict]:
+    """Returns the overall status and per-status file counts of a job, or None if it doesn't exist."""
+    job = await conn.fetchrow("SELECT id, total_files, created_at FROM ingest_jobs WHERE id = $1;", uuid.UUID(job_id))
+    if not job:
+        return None
+    rows = await conn.fetch(
+        "SELECT status, COUNT(*) AS n FROM ingest_job_files WHERE job_id = $1 GROUP BY status;", job["id"]
+    )
+    counts = {row["status"]: row["n"] for row in rows}
+    finished = sum(n for status, n in counts.items() if status not in ("queued", "processing"))
+    return {
+        "job_id": job_id,
+        "status": _job_status(counts, job["total_files"]),
+        "total_files": job["total_files"],
+        "finished_files": finished,
+        "file_counts": counts,
+        "created_at": job["created_at"],
+    }
+
+
+async def get_queue_depth(conn) -> dict:
+    """Returns the number of queued and processing files."""
+    rows = await conn.fetch(
+        """
+        SELECT status, COUNT(*) AS n FROM ingest_job_files
+        WHERE status IN ('queued', 'processing') GROUP BY status;
+        """
+    )
+    return {row["status"]: row["n"] for row in rows}
+
+
+async def get_job_files(conn, job_id: str) -> list[dict]:
+    """Returns the per-file progress of a job."""
+    rows = await conn.fetch(
+        """
+        SELECT id, filename, status, document_id, deduplicated, error, attempts, updated_at
+        FROM ingest_job_files WHERE job_id = $1 ORDER BY id;
+        """,
+        uuid.UUID(job_id),
+    )
+    return [dict(row) for row in rows]
+
+
+async def _save_batch(conn, records: list[dict]) -> list:
+    """
+    Saves a batch of analysed documents in a single transaction. If that fails,
+    falls back to one transaction per document so one bad record doesn't
+    fail the others. Returns the saved result or the exception per record.
+    """
+    try:
+        async with conn.transaction():
+            return await save_documents(conn, records)
+    except Exception as e:
+        if len(records) == 1:
+            return [e]
+        logger.warning(f"Bulk save of {len(records)} documents failed, saving them one by one: {e}")
+    results = []
+    for record in records:
+        try:
+            async with conn.transaction():
+                results.extend(await save_documents(conn, [record]))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+async def _process_claimed(pipeline, claimed: list, max_attempts: int):
+    async def _handle(row):
+        return await analyze_document(pipeline, row["filename"], row["content_type"], row["data"])
+
+    outcomes = await pipeline.run_batch(claimed, _handle)
+    # Metric label of every analysed file, counted once the file has been saved
+    labels = {
+        i: "duplicate" if outcome["duplicate_of"] is not None else outcome["status"]
+        for i, outcome in enumerate(outcomes) if outcome is not None and not isinstance(outcome, Exception)
+    }
+
+    async with get_db_connection() as conn:
+        # Write every analysed document of the batch at once
+        to_save = [i for i, outcome in enumerate(outcomes) if outcome is not None and not isinstance(outcome, Exception)]
+        with stage("db_save"):
+            saved = await _save_batch(conn, [outcomes[i] for i in to_save])
+        for i, result in zip(to_save, saved):
+            outcomes[i] = result
+
+        completed = [(row, outcome) for row, outcome in zip(claimed, outcomes) if not isinstance(outcome, Exception)]
+        for i, outcome in enumerate(outcomes):
+            if not isinstance(outcome, Exception):
+                DOCUMENTS.inc(outcome=labels.get(i, "skipped"))
+        if completed:
+            await complete_files(
+                conn,
+                [row["id"] for row, _ in completed],
+                [row["attempts"] for row, _ in completed],
+                [result for _, result in completed],
+            )
+
+        for row, outcome in zip(claimed, outcomes):
+            if isinstance(outcome, Exception):
+                message = getattr(outcome, "message", None) or str(outcome)
+                retry = not isinstance(outcome, _PERMANENT_ERRORS) and row["attempts"] < max_attempts
+                DOCUMENTS.inc(outcome="retried" if retry else "failed")
+                logger.error(f"Ingestion of {row['filename']} (job {row['job_id']}) failed: {message}"
+                             f"{' Will retry.' if retry else ''}")
+                await fail_file(conn, row["id"], row["attempts"], message, retry)
+
+
+async def _keep_locked(claimed: list, interval: float):
+    """Refreshes the lock of the claimed files every `interval` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with get_db_connection() as conn:
+                await refresh_locks(conn, [row["id"] for row in claimed], [row["attempts"] for row in claimed])
+        except Exception as e:
+            logger.warning(f"Failed to refresh the lock of {len(claimed)} claimed file(s): {e}")
+
+
+async def run_worker(pipeline, stop_event: asyncio.Event, batch_size: Optional[int] = None):
+    """
+    Claims and processes queued files until `stop_event` is set. Any number of
+    these loops can run, in one or many processes, against the same queue.
+    """
+    # Files are analysed `pipeline.concurrency` at a time and written together per batch
+    batch_size = batch_size or int(os.getenv("INGEST_WORKER_BATCH_SIZE", "16"))
+    poll_interval = float(os.getenv("INGEST_WORKER_POLL_SECONDS", "1"))
+    lock_timeout = float(os.getenv("INGEST_WORKER_LOCK_TIMEOUT_SECONDS", "900"))
+    max_attempts = int(os.getenv("INGEST_WORKER_MAX_ATTEMPTS", "3"))
+
+    logger.info(f"Ingestion worker started (batch size {batch_size}).")
+    while not stop_event.is_set():
+        try:
+            with stage("db_claim"):
+                async with get_db_connection() as conn:
+                    claimed = await claim_files(conn, batch_size, lock_timeout, max_attempts)
+            if claimed:
+                # Long batches would otherwise outlive the lock and be claimed by another worker
+                heartbeat = asyncio.create_task(_keep_locked(claimed, lock_timeout / 3))
+                try:
+                    await _process_claimed(pipeline, claimed, max_attempts)
+                finally:
+                    heartbeat.cancel()
+                continue
+        except asyncio.CancelledError:
+            if stop_event.is_set() or asyncio.current_task().cancelling():
+                raise
+            # A cancellation that wasn't meant for this worker, e.g. leaking from a shared request;
+            # the claimed files are picked up again after the lock timeout
+            logger.error("Ingestion worker batch was cancelled unexpectedly; continuing.", exc_info=True)
+        except Exception as e:
+            logger.error(f"Ingestion worker error: {e}", exc_info=True)
+
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=poll_interval)
+        except asyncio.TimeoutError:
+            pass
+    logger.info("Ingestion worker stopped.")
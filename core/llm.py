@@ -1,14 +1,19 @@
 import os
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
 
-def get_azure_openai_client():
+def get_async_azure_openai_client():
     """
-    Initializes and returns the AzureOpenAI client using credentials
-    from environment variables.
+    Initializes and returns the AsyncAzureOpenAI client using credentials
+    from environment variables. Calls made with this client are awaitable,
+    so they do not block the event loop of the API worker.
+
+    The SDK's own retries are disabled; retries and backoff are handled by
+    the shared rate limiter in core/rate_limiter.py.
     """
-    client = AzureOpenAI(
+    client = AsyncAzureOpenAI(
         api_key=os.getenv("AZURE_OPENAI_KEY"),
         api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        max_retries=0
     )
-    return client
\ No newline at end of file
+    return client
@@ -0,0 +1,208 @@
+"""Two-tier response cache for chat completions."""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from openai.types.chat import ChatCompletion
+
+from core.db import get_db_connection
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Completions:
+    def __init__(self, cache: "CachedLLMClient"):
+        self._cache = cache
+
+    async def create(self, **kwargs):
+        return await self._cache.create_chat_completion(**kwargs)
+
+
+class _Chat:
+    def __init__(self, cache: "CachedLLMClient"):
+        self.completions = _Completions(cache)
+
+
+class CachedLLMClient:
+    """
+    Wraps an AsyncAzureOpenAI client so that `client.chat.completions.create(...)`
+    is served from cache when the same request was made before.
+
+    Requests are keyed on (model, prompt version, messages, params). Lookups go
+    through an in-memory LRU first and then the `llm_cache` table, which is
+    shared by all workers. Entries expire after `ttl_seconds`; the memory tier
+    holds at most `memory_size` entries and the persistent tier at most
+    `max_persistent_rows`. Every other attribute is passed through to the
+    wrapped client, so agents can use this object in its place.
+    """
+
+    def __init__(
+        self,
+        client,
+        memory_size: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        persistent: Optional[bool] = None,
+        max_persistent_rows: Optional[int] = None,
+        prompt_version: Optional[str] = None,
+    ):
+        self._client = client
+        self.memory_size = memory_size or int(os.getenv("LLM_CACHE_MEMORY_SIZE", "2048"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+        self.persistent = persistent if persistent is not None else os.getenv("LLM_CACHE_PERSISTENT", "true").lower() == "true"
+        self.max_persistent_rows = max_persistent_rows or int(os.getenv("LLM_CACHE_MAX_ROWS", "100000"))
+        # Bump to invalidate every cached response, e.g. after changing a prompt template
+        self.prompt_version = prompt_version or os.getenv("LLM_CACHE_PROMPT_VERSION", "1")
+
+        self._memory: OrderedDict = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._writes_since_eviction = 0
+        # "coalesced" counts requests answered by an identical request that was already in flight
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "coalesced": 0, "misses": 0, "persistent_errors": 0}
+        self.chat = _Chat(self)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _make_key(self, kwargs: dict) -> str:
+        params = {k: v for k, v in kwargs.items() if k not in ("model", "messages")}
+        payload = {
+            "model": kwargs.get("model"),
+            "prompt_version": self.prompt_version,
+            "messages": kwargs.get("messages"),
+            "params": params,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    # --- Memory tier ---
+
+    def _memory_get(self, key: str):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at < time.monotonic():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return response
+
+    def _memory_put(self, key: str, response):
+        self._memory[key] = (time.monotonic() + self.ttl_seconds, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    # --- Persistent tier ---
+
+    async def _persistent_get(self, key: str):
+        try:
+            async with get_db_connection() as conn:
+                raw = await conn.fetchval(
+                    """
+                    SELECT response FROM llm_cache
+                    WHERE cache_key = $1 AND created_at > NOW() - make_interval(secs => $2);
+                    """,
+                    key, float(self.ttl_seconds),
+                )
+        except Exception as e:
+            self.stats["persistent_errors"] += 1
+            logger.warning(f"LLM cache lookup failed, treating as a miss: {e}")
+            return None
+        return ChatCompletion.model_validate_json(raw) if raw else None
+
+    async def _persistent_put(self, key: str, model: str, response):
+        try:
+            async with get_db_connection() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO llm_cache (cache_key, model, response) VALUES ($1, $2, $3)
+                    ON CONFLICT (cache_key) DO UPDATE SET response = EXCLUDED.response, created_at = NOW();
+                    """,
+                    key, model, response.model_dump_json(),
+                )
+                self._writes_since_eviction += 1
+                if self._writes_since_eviction >= 500:
+                    self._writes_since_eviction = 0
+                    await self._evict(conn)
+        except Exception as e:
+            self.stats["persistent_errors"] += 1
+            logger.warning(f"Failed to store LLM response in cache: {e}")
+
+    async def _evict(self, conn):
+        """Drops expired rows, then the oldest rows beyond `max_persistent_rows`."""
+        await conn.execute(
+            "DELETE FROM llm_cache WHERE created_at <= NOW() - make_interval(secs => $1);",
+            float(self.ttl_seconds),
+        )
+        await conn.execute(
+            """
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache ORDER BY created_at DESC OFFSET $1
+            );
+            """,
+            self.max_persistent_rows,
+        )
+
+    # --- Public API ---
+
+    async def create_chat_completion(self, **kwargs):
+        """Returns a cached ChatCompletion for identical requests, calling the model on a miss."""
+        if kwargs.get("stream"):
+            return await self._client.chat.completions.create(**kwargs)
+
+        key = self._make_key(kwargs)
+        # Identical requests already on their way to the model share the result
+        while key in self._inflight:
+            shared = self._inflight[key]
+            try:
+                response = await asyncio.shield(shared)
+                self.stats["coalesced"] += 1
+                return response
+            except asyncio.CancelledError:
+                # Only the caller that made the request was cancelled: make it ourselves
+                if not shared.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        response = self._memory_get(key)
+        if response is not None:
+            self.stats["memory_hits"] += 1
+            return response
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._persistent_get(key) if self.persistent else None
+            if response is not None:
+                self.stats["persistent_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                response = await self._client.chat.completions.create(**kwargs)
+                if self.persistent:
+                    await self._persistent_put(key, kwargs.get("model"), response)
+            self._memory_put(key, response)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def get_stats(self) -> dict:
+        hits = self.stats["memory_hits"] + self.stats["persistent_hits"] + self.stats["coalesced"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
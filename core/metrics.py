@@ -0,0 +1,254 @@
+"""
+In-process instrumentation: Prometheus-style counters and histograms,
+per-document stage timings and optional OpenTelemetry trace spans.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+from typing import Optional
+
+try:
+    from opentelemetry import trace
+except ImportError:  # tracing is optional
+    trace = None
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = _DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        lines = self._header()
+        for key, state in values.items():
+            for bound, count in zip(self.buckets, state):
+                bucket_labels = _format_labels(self.label_names, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            bucket_labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {state[-1]}")
+        return lines
+
+
+_registry: list[_Metric] = []
+
+STAGE_SECONDS = Histogram("docsum_stage_duration_seconds", "Time spent in each ingestion stage.", ("stage",))
+LLM_REQUEST_SECONDS = Histogram(
+    "docsum_llm_request_duration_seconds", "Latency of Azure OpenAI requests, including retries.", ("operation", "stage"),
+)
+LLM_TOKENS = Counter("docsum_llm_tokens_total", "Tokens reported by Azure OpenAI responses.", ("operation", "stage", "kind"))
+LLM_COST = Counter("docsum_llm_cost_total", "Estimated Azure OpenAI cost, from the LLM_*_COST_PER_1K settings.", ("operation",))
+DB_ACQUIRE_SECONDS = Histogram("docsum_db_pool_acquire_seconds", "Time spent waiting for a pooled database connection.")
+DOCUMENTS = Counter("docsum_documents_total", "Ingested files by outcome.", ("outcome",))
+HTTP_REQUEST_SECONDS = Histogram("docsum_http_request_duration_seconds", "API request latency.", ("method", "route", "status"))
+
+# Stage and per-document timings of the code currently running
+_current_stage: ContextVar[str] = ContextVar("docsum_stage", default="none")
+_document_timings: ContextVar[Optional[dict]] = ContextVar("docsum_document_timings", default=None)
+
+_tracer = trace.get_tracer("docsum") if trace is not None else None
+
+
+def _tracing_enabled() -> bool:
+    return _tracer is not None and os.getenv("TRACING_ENABLED", "false").lower() == "true"
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Times the enclosed block as ingestion stage `name`: observes the stage
+    histogram, adds the time to the current document's timings, labels LLM
+    calls made inside it and, with TRACING_ENABLED=true, opens a trace span
+    (child of the enclosing stage's span, so all stages of a file are linked).
+    """
+    with ExitStack() as stack:
+        if _tracing_enabled():
+            stack.enter_context(_tracer.start_as_current_span(name, attributes=attributes))
+        token = _current_stage.set(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_stage.reset(token)
+            STAGE_SECONDS.observe(elapsed, stage=name)
+            timings = _document_timings.get()
+            if timings is not None:
+                timings["stages"][name] = round(timings["stages"].get(name, 0.0) + elapsed, 4)
+
+
+@contextmanager
+def document_timings():
+    """
+    Collects the stage timings and LLM usage of the document processed in the
+    enclosed block, including tasks and threads started from it. Yields the dict.
+    """
+    timings = {"stages": {}, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+    token = _document_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings["total_seconds"] = round(time.perf_counter() - started, 4)
+        _document_timings.reset(token)
+
+
+def record_llm_call(operation: str, usage, elapsed: float):
+    """Records the latency and the token usage of one completed Azure OpenAI request."""
+    current = _current_stage.get()
+    LLM_REQUEST_SECONDS.observe(elapsed, operation=operation, stage=current)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.inc(prompt_tokens, operation=operation, stage=current, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, operation=operation, stage=current, kind="completion")
+
+    prefix = "LLM" if operation == "chat" else "EMBEDDING"
+    cost = (prompt_tokens * float(os.getenv(f"{prefix}_PROMPT_COST_PER_1K", "0"))
+            + completion_tokens * float(os.getenv(f"{prefix}_COMPLETION_COST_PER_1K", "0"))) / 1000
+    LLM_COST.inc(cost, operation=operation)
+
+    timings = _document_timings.get()
+    if timings is not None:
+        timings["llm_calls"] += 1
+        timings["prompt_tokens"] += prompt_tokens
+        timings["completion_tokens"] += completion_tokens
+        timings["cost"] += cost
+
+
+def _render_gauges(gauges: dict) -> list[str]:
+    """Renders {name: (documentation, {labels tuple or (): value})} as gauges."""
+    lines = []
+    for name, (documentation, samples) in gauges.items():
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+        for labels, value in samples.items():
+            label_text = "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}" if labels else ""
+            lines.append(f"{name}{label_text} {float(value)}")
+    return lines
+
+
+def build_gauges(pool_stats: Optional[dict] = None, cache_stats: Optional[dict] = None,
+                 limiter_stats: Optional[dict] = None, validation_stats: Optional[dict] = None,
+                 queue_counts: Optional[dict] = None, startup: Optional[dict] = None) -> dict:
+    """Turns the stats dicts of the pool, LLM cache, rate limiters, validator, queue and startup report into gauges."""
+    gauges = {}
+    if pool_stats and pool_stats.get("initialized"):
+        gauges["docsum_db_pool_connections"] = ("Database pool connections by state.", {
+            (("state", "in_use"),): pool_stats["in_use"],
+            (("state", "idle"),): pool_stats["idle"],
+            (("state", "max"),): pool_stats["max_size"],
+        })
+    if pool_stats:
+        gauges["docsum_db_pool_checkout_timeouts"] = ("Checkouts that timed out since startup.", {(): pool_stats["checkout_timeouts"]})
+    if cache_stats:
+        gauges["docsum_llm_cache_lookups"] = ("LLM cache lookups since startup by result.", {
+            (("result", "memory_hit"),): cache_stats["memory_hits"],
+            (("result", "persistent_hit"),): cache_stats["persistent_hits"],
+            (("result", "coalesced"),): cache_stats["coalesced"],
+            (("result", "miss"),): cache_stats["misses"],
+        })
+        gauges["docsum_llm_cache_hit_ratio"] = ("Share of LLM cache lookups served from the cache.", {(): cache_stats["hit_rate"]})
+    if limiter_stats:
+        gauges["docsum_llm_concurrency_limit"] = ("Current adaptive concurrency limit per deployment.", {
+            (("limiter", name),): stats["concurrency_limit"] for name, stats in limiter_stats.items()
+        })
+        gauges["docsum_llm_in_flight"] = ("Requests in flight per deployment.", {
+            (("limiter", name),): stats["in_flight"] for name, stats in limiter_stats.items()
+        })
+        gauges["docsum_llm_throttled"] = ("429 responses since startup per deployment.", {
+            (("limiter", name),): stats["throttled"] for name, stats in limiter_stats.items()
+        })
+    if validation_stats:
+        gauges["docsum_validation_decisions"] = ("Summary validation decisions since startup by tier.", {
+            (("decision", name),): value for name, value in validation_stats.items() if name != "llm_rate"
+        })
+    if queue_counts is not None:
+        gauges["docsum_ingest_queue_files"] = ("Files waiting in or being processed from the ingestion queue.", {
+            (("status", status),): queue_counts.get(status, 0) for status in ("queued", "processing")
+        })
+    if startup and startup.get("total_seconds") is not None:
+        gauges["docsum_startup_seconds"] = ("Time this process took to start, in total and by phase.", {
+            (("phase", "total"),): startup["total_seconds"],
+            **{(("phase", name),): seconds for name, seconds in startup["phases"].items()},
+        })
+    return gauges
+
+
+def render_metrics(gauges: Optional[dict] = None) -> str:
+    """
+    Returns all metrics in the Prometheus text exposition format, followed by
+    point-in-time `gauges` collected by the caller (see build_gauges).
+    """
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    lines += _render_gauges(gauges or {})
+    return "\n".join(lines) + "\n"
@@ -1,52 +1,178 @@
-from fastapi import UploadFile
-import pypdf
-import docx
-from bs4 import BeautifulSoup
-import io
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator
 
-from .exceptions import ParsingError, UnsupportedFileTypeError
+from .exceptions import ParsingError, UnsupportedFileTypeError, DocumentTooLargeError
 
-def parse_document(file: UploadFile) -> str:
-    """
-    Parses the content of an uploaded file based on its content type.
+if TYPE_CHECKING:
+    from fastapi import UploadFile
+
+# The parser libraries (pypdf, python-docx, BeautifulSoup with lxml) are imported
+# on first use of their file type, so processes that never parse a type don't load them.
+
+PDF_CONTENT_TYPE = "application/pdf"
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+HTML_CONTENT_TYPE = "text/html"
+SUPPORTED_CONTENT_TYPES = (PDF_CONTENT_TYPE, DOCX_CONTENT_TYPE, HTML_CONTENT_TYPE)
+
+# Number of DOCX paragraphs yielded together as one "page"
+_DOCX_PARAGRAPHS_PER_PAGE = 50
+
+_executor = None
+
+
+def max_file_bytes() -> int:
+    return int(os.getenv("PARSER_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+
+
+def max_pages() -> int:
+    return int(os.getenv("PARSER_MAX_PAGES", "2000"))
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Returns the process pool used for CPU-heavy extraction, creating it on first use."""
+    global _executor
+    if _executor is None:
+        workers = int(os.getenv("PARSER_PROCESSES", "0")) or os.cpu_count() or 1
+        # spawn rather than fork: the parent runs an event loop and worker threads
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown_parser_pool():
+    """Stops the parser processes. Called when the application shuts down."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+# --- Extraction (runs in the worker processes) ---
+
+# Every function reads the file from a temporary path rather than being sent its
+# bytes, so a PDF split into many page-range tasks is written once, not pickled per task.
+
+def _open_pdf(path: str):
+    import pypdf
+
+    return pypdf.PdfReader(path)
+
+
+def _count_pdf_pages(path: str) -> int:
+    return len(_open_pdf(path).pages)
+
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> list[str]:
+    pdf_reader = _open_pdf(path)
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
 
-    Args:
-        file (UploadFile): The file uploaded by the user.
 
-    Returns:
-        str: The extracted text content of the document.
-    
+def _extract_docx_pages(path: str) -> list[str]:
+    import docx
+
+    paragraphs = [para.text for para in docx.Document(path).paragraphs]
+    return [
+        "\n".join(paragraphs[i:i + _DOCX_PARAGRAPHS_PER_PAGE])
+        for i in range(0, len(paragraphs), _DOCX_PARAGRAPHS_PER_PAGE)
+    ]
+
+
+def _extract_html_pages(path: str) -> list[str]:
+    from bs4 import BeautifulSoup
+
+    with open(path, "rb") as f:
+        soup = BeautifulSoup(f.read(), "lxml")
+    # Remove script and style elements
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.decompose()
+    return [soup.get_text(separator='\n', strip=True)]
+
+
+def _check_limits(filename: str, content_type: str, file_content: bytes):
+    if content_type not in SUPPORTED_CONTENT_TYPES:
+        raise UnsupportedFileTypeError(filename=filename, file_type=content_type)
+    if len(file_content) > max_file_bytes():
+        raise DocumentTooLargeError(filename, f"File is larger than the {max_file_bytes()} byte limit")
+
+
+def _check_page_count(filename: str, page_count: int):
+    if page_count > max_pages():
+        raise DocumentTooLargeError(filename, f"Document has {page_count} pages; the limit is {max_pages()}")
+
+
+def _write_temp_file(file_content: bytes) -> str:
+    with tempfile.NamedTemporaryFile(prefix="parser-", delete=False) as temp_file:
+        temp_file.write(file_content)
+    return temp_file.name
+
+
+# --- Public API ---
+
+async def stream_pages(filename: str, content_type: str, file_content: bytes) -> AsyncIterator[str]:
+    """
+    Yields the text of a document page by page, in order, while extraction runs
+    in the parser process pool. PDFs are split into page ranges that are
+    extracted in parallel, so consumers can start on the first pages before the
+    last ones are done. The file is written to a temporary file once and the
+    processes read it by path, instead of every task being sent the whole file.
+
     Raises:
         ParsingError: If text extraction fails.
         UnsupportedFileTypeError: If the file type is not supported.
+        DocumentTooLargeError: If the file exceeds the size or page limit.
     """
-    content_type = file.content_type
-    filename = file.filename
-    file_content = file.file.read()
-    
+    _check_limits(filename, content_type, file_content)
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+
+    futures = []
+    temp_path = None
     try:
-        if content_type == "application/pdf":
-            pdf_reader = pypdf.PdfReader(io.BytesIO(file_content))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() or ""
-            return text
-        
-        elif content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            doc = docx.Document(io.BytesIO(file_content))
-            text = "\n".join([para.text for para in doc.paragraphs])
-            return text
-            
-        elif content_type == "text/html":
-            soup = BeautifulSoup(file_content, "lxml")
-            # Remove script and style elements
-            for script_or_style in soup(["script", "style"]):
-                script_or_style.decompose()
-            text = soup.get_text(separator='\n', strip=True)
-            return text
-            
+        temp_path = await asyncio.to_thread(_write_temp_file, file_content)
+        if content_type == PDF_CONTENT_TYPE:
+            page_count = await loop.run_in_executor(executor, _count_pdf_pages, temp_path)
+            _check_page_count(filename, page_count)
+            pages_per_task = int(os.getenv("PARSER_PAGES_PER_TASK", "16"))
+            futures = [
+                loop.run_in_executor(executor, _extract_pdf_pages, temp_path, start, min(start + pages_per_task, page_count))
+                for start in range(0, page_count, pages_per_task)
+            ]
+        elif content_type == DOCX_CONTENT_TYPE:
+            futures = [loop.run_in_executor(executor, _extract_docx_pages, temp_path)]
         else:
-            raise UnsupportedFileTypeError(filename=filename, file_type=content_type)
+            futures = [loop.run_in_executor(executor, _extract_html_pages, temp_path)]
 
+        for future in futures:
+            for page in await future:
+                yield page
+    except DocumentTooLargeError:
+        raise
     except Exception as e:
         raise ParsingError(filename=filename, message=f"An error occurred during parsing: {e}")
+    finally:
+        for future in futures:
+            future.cancel()
+        if temp_path is not None:
+            # Wait for running tasks so the file isn't removed while they read it
+            await asyncio.gather(*futures, return_exceptions=True)
+            os.unlink(temp_path)
+
+
+async def read_upload(file: "UploadFile", chunk_size: int = 1024 * 1024) -> bytes:
+    """
+    Reads an upload in chunks and stops as soon as it exceeds the configured
+    size limit, so oversized files are never held in memory in full.
+
+    Raises:
+        DocumentTooLargeError: If the file is larger than PARSER_MAX_FILE_BYTES.
+    """
+    limit = max_file_bytes()
+    buffer = bytearray()
+    while chunk := await file.read(chunk_size):
+        buffer += chunk
+        if len(buffer) > limit:
+            raise DocumentTooLargeError(file.filename, f"File is larger than the {limit} byte limit")
+    return bytes(buffer)
@@ -0,0 +1,154 @@
+"""Schedules the agent workflow for ingested documents."""
+import asyncio
+import inspect
+import os
+from typing import Optional
+
+from core.chunking import count_tokens
+from core.logger import get_logger
+from core.metrics import stage
+from core.progress import ChunkProgress, emit_progress
+
+from agents.entity_extraction_agent import merge_entities
+from agents.tiered_validation_agent import TieredValidationAgent
+
+logger = get_logger(__name__)
+
+
+class IngestionPipeline:
+    """
+    Runs the summarization, entity extraction and validation agents for a
+    document, and fans a batch of documents out with a bounded concurrency.
+
+    Entity extraction does not depend on the summary, so it runs alongside
+    the summarize -> validate chain instead of after it. Without an
+    `entity_extractor`, the summarizer must be a CombinedAnalysisAgent, which
+    returns the summary and the entities from the same calls.
+
+    Documents are analysed chunk by chunk. With a `chunk_store`, the results of
+    chunks that were analysed before (e.g. the unchanged pages of a new version
+    of a document) are reused, so only new chunks are sent to the model and the
+    reduce step runs over the stored chunk summaries. The `embedding_store`
+    likewise keeps the embeddings of retrieval chunks, keyed by the embedding model.
+    """
+
+    def __init__(self, summarizer, entity_extractor, validator, embedder=None, concurrency: Optional[int] = None,
+                 chunk_store=None, embedding_store=None):
+        concurrency = concurrency or int(os.getenv("INGEST_CONCURRENCY", "4"))
+        if concurrency < 1:
+            raise ValueError("Ingestion concurrency must be at least 1.")
+        self.summarizer = summarizer
+        self.entity_extractor = entity_extractor
+        self.validator = validator
+        self.embedder = embedder
+        self.concurrency = concurrency
+        self.chunk_store = chunk_store
+        self.embedding_store = embedding_store
+
+    async def _map_chunks(self, kind: str, chunks: list[str], fn) -> list:
+        progress = ChunkProgress(kind, len(chunks))
+        if self.chunk_store is None:
+            return await asyncio.gather(*(progress.wrap(fn)(chunk) for chunk in chunks))
+        return await self.chunk_store.map_chunks(kind, chunks, progress.wrap(fn), on_reused=progress.advance)
+
+    async def _validate(self, content: str, summary_text: str, sections: Optional[list[str]], section_embeddings) -> bool:
+        if sections is None or not isinstance(self.validator, TieredValidationAgent):
+            with stage("validate"):
+                return await self.validator.validate_summary(content, summary_text)
+        if inspect.isawaitable(section_embeddings):
+            section_embeddings = await section_embeddings
+        with stage("validate"):
+            return await self.validator.validate_summary(content, summary_text, sections, section_embeddings)
+
+    async def _summarize_and_validate(self, content: str, chunks: list[str], sections: Optional[list[str]],
+                                      section_embeddings) -> tuple[str, bool]:
+        with stage("summarize"):
+            summaries = await self._map_chunks("summary", chunks, self.summarizer.summarize_chunk)
+            summary_text = await self.summarizer.combine(summaries)
+        emit_progress("summarized")
+        is_valid = await self._validate(content, summary_text, sections, section_embeddings)
+        emit_progress("validated", valid=is_valid)
+        return summary_text, is_valid
+
+    async def _extract_entities(self, chunks: list[str]) -> dict:
+        with stage("extract_entities"):
+            entity_lists = await self._map_chunks("entities", chunks, self.entity_extractor.extract_chunk)
+        entities = merge_entities(entity_lists)
+        emit_progress("entities_extracted", count=len(entities))
+        return {"entities": entities}
+
+    async def _analyze_and_validate(self, content: str, chunks: list[str], sections: Optional[list[str]],
+                                    section_embeddings) -> dict:
+        with stage("analyze"):
+            results = await self._map_chunks("combined", chunks, self.summarizer.analyze_chunk)
+            summary_text = await self.summarizer.combine([r["summary"] for r in results])
+        entities = merge_entities([r["entities"] for r in results])
+        emit_progress("summarized")
+        emit_progress("entities_extracted", count=len(entities))
+        is_valid = await self._validate(content, summary_text, sections, section_embeddings)
+        emit_progress("validated", valid=is_valid)
+        return {
+            "summary": summary_text,
+            "entities": {"entities": entities},
+            "status": "processed" if is_valid else "needs_review",
+        }
+
+    async def process(self, content: str, chunks: Optional[list[str]] = None, sections: Optional[list[str]] = None,
+                      section_embeddings=None) -> dict:
+        """
+        Runs all agents for a single document. `chunks` are the text split with
+        `summarizer.chunk_builder()`, e.g. while it was being parsed; they are
+        computed from `content` when omitted.
+
+        `sections` are the retrieval chunks of the document and
+        `section_embeddings` their embeddings (or an awaitable of them, e.g. the
+        task computing them), which a TieredValidationAgent compares the summary
+        against instead of embedding the text again.
+
+        Returns:
+            dict: The summary text, the extracted entities and the resulting status.
+        """
+        if chunks is None:
+            builder = self.summarizer.chunk_builder()
+            chunks = await asyncio.to_thread(lambda: builder.add(content) + builder.finish())
+        # Content-defined boundaries can split a text that fits in one call; analyse it whole
+        if 1 < len(chunks) <= 3 and count_tokens(content) <= self.summarizer.chunk_tokens:
+            chunks = [content]
+        chunks = chunks or [content]
+
+        if self.entity_extractor is None:
+            return await self._analyze_and_validate(content, chunks, sections, section_embeddings)
+
+        summary_task = asyncio.create_task(self._summarize_and_validate(content, chunks, sections, section_embeddings))
+        entities_task = asyncio.create_task(self._extract_entities(chunks))
+        try:
+            (summary_text, is_valid), entities_data = await asyncio.gather(summary_task, entities_task)
+        except Exception:
+            # Don't leave the sibling stage running (and spending tokens) for a failed document
+            for task in (summary_task, entities_task):
+                task.cancel()
+            raise
+
+        return {
+            "summary": summary_text,
+            "entities": entities_data,
+            "status": "processed" if is_valid else "needs_review",
+        }
+
+    async def run_batch(self, items: list, handler) -> list:
+        """
+        Calls `handler(item)` for every item, with at most `concurrency` running at once.
+
+        A failing item does not abort the rest of the batch: its exception is
+        returned in place of its result, in the same order as `items`.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _run(item):
+            async with semaphore:
+                try:
+                    return await handler(item)
+                except Exception as e:
+                    return e
+
+        return await asyncio.gather(*(_run(item) for item in items))
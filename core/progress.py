@@ -0,0 +1,53 @@
+"""Progress events emitted while a document is ingested, for streaming to clients."""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# (queue, fields added to every event) of the document being processed, if anyone listens
+_listener: ContextVar[Optional[tuple]] = ContextVar("progress_listener", default=None)
+
+
+@contextmanager
+def progress_listener(queue: asyncio.Queue, **fields):
+    """
+    Sends the progress events emitted in the enclosed block, including tasks
+    started from it, to `queue` as dicts. `fields` (e.g. the filename) are
+    added to every event.
+    """
+    token = _listener.set((queue, fields))
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def emit_progress(event: str, **data):
+    """Reports that `event` happened to the current document. Does nothing without a listener."""
+    listener = _listener.get()
+    if listener is None:
+        return
+    queue, fields = listener
+    queue.put_nowait({"event": event, **fields, **data, "time": round(time.time(), 3)})
+
+
+class ChunkProgress:
+    """Counts finished chunks of one kind and emits a "chunk" event for each of them."""
+
+    def __init__(self, kind: str, total: int):
+        self.kind = kind
+        self.total = total
+        self.done = 0
+
+    def advance(self, count: int = 1):
+        self.done = min(self.total, self.done + count)
+        emit_progress("chunk", kind=self.kind, done=self.done, total=self.total)
+
+    def wrap(self, fn):
+        """Returns `fn` reporting progress each time a call to it finishes."""
+        async def _tracked(chunk):
+            result = await fn(chunk)
+            self.advance()
+            return result
+        return _tracked
@@ -0,0 +1,181 @@
+"""Retrieval-augmented question answering over the stored document chunks, with an answer cache."""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+from core.chunk_store import chunk_hash
+from core.db import get_db_connection
+from core.exceptions import LLMServiceError
+from core.logger import get_logger
+from core.metrics import stage
+from core.repository import search_chunks
+
+logger = get_logger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases a question and drops extra whitespace and trailing punctuation, for cache keys."""
+    return " ".join(question.casefold().split()).rstrip("?!. ")
+
+
+class AnswerCache:
+    """
+    Two-tier cache of answers: an in-memory LRU in front of the `qa_answers`
+    table. Answers are keyed by the normalized question, the scope it was
+    asked in (a document or the filtered corpus) and the version of the
+    content it was answered from, so an answer is never served for content
+    that has changed. Store errors are logged and treated as misses.
+    """
+
+    def __init__(self, model: str, memory_size: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 prompt_version: Optional[str] = None):
+        self.model = model
+        self.memory_size = memory_size or int(os.getenv("QA_CACHE_MEMORY_SIZE", "512"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("QA_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+        self.prompt_version = prompt_version or os.getenv("LLM_CACHE_PROMPT_VERSION", "1")
+        self._memory: OrderedDict = OrderedDict()
+        self._writes_since_eviction = 0
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "errors": 0}
+
+    def make_key(self, question: str, scope: str, version: str, top_k: int) -> str:
+        payload = [self.model, self.prompt_version, normalize_question(question), scope, version, top_k]
+        return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Returns the cached {"answer", "sources"} for `key`, or None."""
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry[1]
+        try:
+            async with get_db_connection() as conn:
+                row = await conn.fetchrow(
+                    """
+                    SELECT answer, sources FROM qa_answers
+                    WHERE cache_key = $1 AND created_at > NOW() - make_interval(secs => $2);
+                    """,
+                    key, float(self.ttl_seconds),
+                )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Answer cache lookup failed, treating as a miss: {e}")
+            row = None
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["persistent_hits"] += 1
+        result = {"answer": row["answer"], "sources": json.loads(row["sources"])}
+        self._memory_put(key, result)
+        return result
+
+    def _memory_put(self, key: str, result: dict):
+        self._memory[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    async def put(self, key: str, question: str, answer: str, sources: list[dict]):
+        self._memory_put(key, {"answer": answer, "sources": sources})
+        try:
+            async with get_db_connection() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO qa_answers (cache_key, question, answer, sources) VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (cache_key) DO UPDATE SET answer = EXCLUDED.answer, sources = EXCLUDED.sources,
+                                                          created_at = NOW();
+                    """,
+                    key, question, answer, json.dumps(sources),
+                )
+                self._writes_since_eviction += 1
+                if self._writes_since_eviction >= 200:
+                    self._writes_since_eviction = 0
+                    await conn.execute(
+                        "DELETE FROM qa_answers WHERE created_at <= NOW() - make_interval(secs => $1);",
+                        float(self.ttl_seconds),
+                    )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Failed to store answer in cache: {e}")
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["persistent_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["persistent_hits"]
+        return {**self.stats, "hit_rate": hits / lookups if lookups else 0.0, "memory_entries": len(self._memory)}
+
+
+def _error_message(error: Exception) -> str:
+    return getattr(error, "message", None) or str(error)
+
+
+def _source_info(source: dict) -> dict:
+    return {key: source[key] for key in ("document_id", "filename", "chunk_index", "score")}
+
+
+def _sources_version(sources: list[dict]) -> str:
+    """Identifies the exact retrieved content, for scopes without a single document version."""
+    return hashlib.sha256(json.dumps([
+        [source["document_id"], source["chunk_index"], chunk_hash(source["content"])] for source in sources
+    ]).encode("utf-8")).hexdigest()
+
+
+async def answer_question(agent, embedder, cache: Optional[AnswerCache], question: str, top_k: int, scope: str,
+                          version: Optional[str] = None, document_id: Optional[int] = None,
+                          status: Optional[str] = None, filename: Optional[str] = None) -> AsyncIterator[dict]:
+    """
+    Answers `question` from the `top_k` stored chunks closest to it and yields
+    events: "sources" (the chunks used), "answer" (pieces of the answer as
+    they are generated), then "done", or "error" if retrieval or the model
+    call fails, so clients always receive a final event.
+
+    With a `version` (e.g. the content hash of the asked document), a cached
+    answer is returned without even retrieving chunks. Otherwise the cache is
+    keyed by the retrieved chunks, so new or changed content gets a new answer.
+    """
+    key = cache.make_key(question, scope, version, top_k) if cache and version else None
+    cached = await cache.get(key) if key else None
+
+    if cached is None:
+        try:
+            with stage("qa_retrieve"):
+                [query_embedding] = await embedder.embed([question])
+                async with get_db_connection() as conn:
+                    chunks = await search_chunks(conn, query_embedding, top_k, status, filename, document_id)
+        except Exception as e:
+            logger.error(f"Failed to retrieve chunks for a question: {e}", exc_info=True)
+            yield {"event": "error", "error": _error_message(e)}
+            return
+        sources = agent.select_sources(chunks)
+        if cache and key is None and sources:
+            key = cache.make_key(question, scope, _sources_version(sources), top_k)
+            cached = await cache.get(key)
+
+    if cached is not None:
+        yield {"event": "sources", "sources": cached["sources"]}
+        yield {"event": "answer", "text": cached["answer"]}
+        yield {"event": "done", "cached": True}
+        return
+
+    source_info = [_source_info(source) for source in sources]
+    yield {"event": "sources", "sources": source_info}
+    if not sources:
+        yield {"event": "answer", "text": "No ingested document content matches the question."}
+        yield {"event": "done", "cached": False}
+        return
+
+    parts = []
+    try:
+        async for piece in agent.stream_answer(question, sources):
+            parts.append(piece)
+            yield {"event": "answer", "text": piece}
+    except Exception as e:
+        if not isinstance(e, LLMServiceError):
+            logger.error(f"Failed to answer a question: {e}", exc_info=True)
+        yield {"event": "error", "error": _error_message(e)}
+        return
+    if cache and key:
+        await cache.put(key, question, "".join(parts), source_info)
+    yield {"event": "done", "cached": False}
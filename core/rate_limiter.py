@@ -0,0 +1,329 @@
+"""Process-wide rate limiting, adaptive concurrency and retries for Azure OpenAI calls."""
+import asyncio
+import os
+import random
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+
+import openai
+
+from core.chunking import count_tokens
+from core.exceptions import LLMServiceError
+from core.logger import get_logger
+from core.metrics import record_llm_call
+
+logger = get_logger(__name__)
+
+# Errors worth retrying: throttling, timeouts, connection problems and 5xx responses
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Completion tokens assumed for a request that doesn't set max_tokens
+_DEFAULT_COMPLETION_TOKENS = 512
+
+
+class _TokenBucket:
+    """Refills `per_minute` units evenly over a minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full one)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        """Takes `amount` units; the balance may go negative when actual usage exceeds the estimate."""
+        self._refill()
+        self.available -= amount
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Reads the server's requested delay from the Retry-After headers of an API error."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class RateLimiter:
+    """
+    Shared budget for one Azure OpenAI deployment.
+
+    Every call waits for a slot in the adaptive concurrency window and for
+    room in the requests-per-minute and tokens-per-minute buckets. The window
+    grows by about one slot per window's worth of successful calls and is
+    halved on a 429 (AIMD). A 429 also pauses all callers for the Retry-After
+    period. Retryable errors are retried with exponential backoff and full
+    jitter; when the retries are exhausted, LLMServiceError is raised.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.name = name
+        self._rpm = _TokenBucket(rpm) if rpm else None
+        self._tpm = _TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "failures": 0}
+
+    async def _acquire_slot(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self._limit))
+            self._in_flight += 1
+
+    async def _release_slot(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    async def _wait_for_budget(self, tokens: int):
+        while True:
+            wait = self._paused_until - time.monotonic()
+            if self._rpm:
+                wait = max(wait, self._rpm.time_until(1))
+            if self._tpm:
+                wait = max(wait, self._tpm.time_until(tokens))
+            if wait <= 0:
+                # No await between the check and the consume, so this is atomic on the event loop
+                if self._rpm:
+                    self._rpm.consume(1)
+                if self._tpm:
+                    self._tpm.consume(tokens)
+                return
+            await asyncio.sleep(wait)
+
+    async def _on_success(self):
+        async with self._condition:
+            self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+    def _on_throttled(self, retry_after: Optional[float]):
+        now = time.monotonic()
+        self.stats["throttled"] += 1
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        # One decrease per burst of 429s from the same window
+        if now - self._last_decrease > 1.0:
+            self._limit = max(self.min_concurrency, self._limit / 2)
+            self._last_decrease = now
+            logger.warning(f"[{self.name}] Throttled by Azure OpenAI; concurrency reduced to {int(self._limit)}.")
+
+    def _settle(self, usage, estimated_tokens: int):
+        if self._tpm and usage is not None:
+            # Settle the estimate against the tokens actually used
+            self._tpm.consume(usage.total_tokens - estimated_tokens)
+
+    async def _start(self, fn, estimated_tokens: int):
+        """
+        Runs `await fn()` within the budget, retrying retryable errors, and
+        returns its result with the concurrency slot still held.
+        """
+        attempt = 0
+        while True:
+            await self._acquire_slot()
+            try:
+                await self._wait_for_budget(estimated_tokens)
+                self.stats["requests"] += 1
+                return await fn()
+            except _RETRYABLE_ERRORS as e:
+                await self._release_slot()
+                error = e
+                retry_after = _retry_after_seconds(e)
+                if isinstance(e, openai.RateLimitError):
+                    self._on_throttled(retry_after)
+            except openai.APIError as e:
+                await self._release_slot()
+                self.stats["failures"] += 1
+                raise LLMServiceError(f"Azure OpenAI request failed: {e}") from e
+            except BaseException:
+                await self._release_slot()
+                raise
+
+            attempt += 1
+            if attempt > self.max_retries:
+                self.stats["failures"] += 1
+                raise LLMServiceError(f"Azure OpenAI request failed after {attempt} attempts: {error}") from error
+            self.stats["retries"] += 1
+            delay = retry_after or random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            logger.warning(f"[{self.name}] {type(error).__name__}; retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries}).")
+            await asyncio.sleep(delay)
+
+    async def call(self, fn, estimated_tokens: int):
+        """Runs `await fn()` within the budget, retrying retryable errors."""
+        response = await self._start(fn, estimated_tokens)
+        try:
+            await self._on_success()
+            self._settle(getattr(response, "usage", None), estimated_tokens)
+            return response
+        finally:
+            await self._release_slot()
+
+    async def stream(self, fn, estimated_tokens: int) -> AsyncIterator:
+        """
+        Yields the events of the stream returned by `await fn()`. The slot is
+        held until the stream is consumed or closed, and the token budget is
+        settled against the usage reported in its last event. Only opening the
+        stream is retried.
+        """
+        stream = await self._start(fn, estimated_tokens)
+        usage = None
+        try:
+            async for event in stream:
+                usage = getattr(event, "usage", None) or usage
+                yield event
+        except openai.APIError as e:
+            self.stats["failures"] += 1
+            raise LLMServiceError(f"Azure OpenAI stream failed: {e}") from e
+        else:
+            await self._on_success()
+        finally:
+            self._settle(usage, estimated_tokens)
+            await self._release_slot()
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "concurrency_limit": int(self._limit),
+            "in_flight": self._in_flight,
+            "paused_for_seconds": max(0.0, self._paused_until - time.monotonic()),
+        }
+
+
+_limiters: dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(name: str, env_prefix: str) -> RateLimiter:
+    """
+    Returns the process-wide limiter called `name`, creating it from the
+    <env_prefix>_RPM, _TPM, _MAX_CONCURRENCY and _MAX_RETRIES variables.
+    """
+    if name not in _limiters:
+        rpm = os.getenv(f"{env_prefix}_RPM")
+        tpm = os.getenv(f"{env_prefix}_TPM")
+        _limiters[name] = RateLimiter(
+            name,
+            rpm=int(rpm) if rpm else None,
+            tpm=int(tpm) if tpm else None,
+            max_concurrency=int(os.getenv(f"{env_prefix}_MAX_CONCURRENCY", "16")),
+            max_retries=int(os.getenv(f"{env_prefix}_MAX_RETRIES", "6")),
+        )
+    return _limiters[name]
+
+
+def get_rate_limiter_stats() -> dict:
+    return {name: limiter.get_stats() for name, limiter in _limiters.items()}
+
+
+class _Completions:
+    def __init__(self, client: "RateLimitedLLMClient"):
+        self._client = client
+
+    async def create(self, **kwargs):
+        estimated = sum(count_tokens(str(m.get("content") or "")) for m in kwargs.get("messages", []))
+        estimated += kwargs.get("max_tokens") or _DEFAULT_COMPLETION_TOKENS
+        if kwargs.get("stream"):
+            # The last event then reports the usage, to settle the token budget with
+            kwargs.setdefault("stream_options", {"include_usage": True})
+            return self._stream(kwargs, estimated)
+        started = time.perf_counter()
+        response = await self._client.chat_limiter.call(
+            lambda: self._client._client.chat.completions.create(**kwargs), estimated
+        )
+        record_llm_call("chat", getattr(response, "usage", None), time.perf_counter() - started)
+        return response
+
+    async def _stream(self, kwargs: dict, estimated: int) -> AsyncIterator:
+        started = time.perf_counter()
+        usage = None
+        events = self._client.chat_limiter.stream(lambda: self._client._client.chat.completions.create(**kwargs), estimated)
+        # Closes the limiter's stream, releasing its slot, when the caller stops reading early
+        async with aclosing(events):
+            async for event in events:
+                usage = getattr(event, "usage", None) or usage
+                yield event
+        record_llm_call("chat", usage, time.perf_counter() - started)
+
+
+class _Chat:
+    def __init__(self, client: "RateLimitedLLMClient"):
+        self.completions = _Completions(client)
+
+
+class _Embeddings:
+    def __init__(self, client: "RateLimitedLLMClient"):
+        self._client = client
+
+    async def create(self, **kwargs):
+        inputs = kwargs.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else inputs or []
+        estimated = sum(count_tokens(text) for text in inputs)
+        started = time.perf_counter()
+        response = await self._client.embedding_limiter.call(
+            lambda: self._client._client.embeddings.create(**kwargs), estimated
+        )
+        record_llm_call("embeddings", getattr(response, "usage", None), time.perf_counter() - started)
+        return response
+
+
+class RateLimitedLLMClient:
+    """
+    Wraps an AsyncAzureOpenAI client so that chat completions and embeddings
+    go through the shared rate limiters of their deployments. The wrapped
+    client should be created with max_retries=0 so retries happen here.
+    """
+
+    def __init__(self, client, chat_limiter: Optional[RateLimiter] = None,
+                 embedding_limiter: Optional[RateLimiter] = None):
+        self._client = client
+        self.chat_limiter = chat_limiter or get_rate_limiter("chat", "LLM")
+        self.embedding_limiter = embedding_limiter or get_rate_limiter("embeddings", "EMBEDDING")
+        self.chat = _Chat(self)
+        self.embeddings = _Embeddings(self)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
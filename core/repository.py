@@ -0,0 +1,365 @@
+"""SQL helpers for reading and writing documents."""
+import json
+from datetime import datetime
+from typing import Optional
+
+# Column order of the records passed to copy_documents
+DOCUMENT_COLUMNS = [
+    "id", "filename", "summary", "entities", "embedding", "status", "content_hash", "file_hash", "timings",
+    "content_bytes",
+]
+
+
+async def find_document_by_hash(conn, file_hash: str = None, content_hash: str = None):
+    """
+    Looks up a previously processed document with the same raw bytes or the
+    same extracted content. Returns the id of the original row, or None.
+    """
+    if file_hash:
+        doc_id = await conn.fetchval(
+            "SELECT id FROM documents WHERE file_hash = $1 AND duplicate_of IS NULL ORDER BY id LIMIT 1;",
+            file_hash,
+        )
+        if doc_id:
+            return doc_id
+    if content_hash:
+        return await conn.fetchval(
+            "SELECT id FROM documents WHERE content_hash = $1 AND duplicate_of IS NULL ORDER BY id LIMIT 1;",
+            content_hash,
+        )
+    return None
+
+
+async def allocate_document_ids(conn, count: int) -> list[int]:
+    """Reserves `count` ids from the documents sequence so rows can be bulk-copied with known ids."""
+    rows = await conn.fetch(
+        "SELECT nextval(pg_get_serial_sequence('documents', 'id')) AS id FROM generate_series(1, $1);",
+        count,
+    )
+    return [row["id"] for row in rows]
+
+
+async def copy_documents(conn, records: list[tuple]):
+    """Bulk-inserts newly processed documents with COPY. Records follow DOCUMENT_COLUMNS."""
+    await conn.copy_records_to_table("documents", records=records, columns=DOCUMENT_COLUMNS)
+
+
+async def insert_duplicates(conn, ids: list[int], filenames: list[str], file_hashes: list[str], original_ids: list[int]):
+    """
+    Creates rows for re-uploaded documents in one statement by copying the
+    stored results of their originals, so no agent has to run. Their text is
+    read from the original.
+    """
+    await conn.execute(
+        """
+        INSERT INTO documents (id, filename, summary, entities, embedding, status, content_hash, file_hash, duplicate_of)
+        SELECT v.id, v.filename, d.summary, d.entities, d.embedding, d.status, d.content_hash, v.file_hash, d.id
+        FROM unnest($1::int[], $2::text[], $3::text[], $4::int[]) AS v(id, filename, file_hash, original_id)
+        JOIN documents d ON d.id = v.original_id;
+        """,
+        ids, filenames, file_hashes, original_ids,
+    )
+
+
+async def copy_chunks(conn, records: list[tuple]):
+    """Bulk-inserts (document_id, chunk_index, content, embedding, content_hash) retrieval chunks with COPY."""
+    await conn.copy_records_to_table(
+        "document_chunks", records=records,
+        columns=["document_id", "chunk_index", "content", "embedding", "content_hash"],
+    )
+
+
+async def search_chunks(conn, query_embedding: list[float], top_k: int, status: str = None,
+                        filename: str = None, document_id: int = None) -> list[dict]:
+    """
+    Returns the `top_k` chunks closest to `query_embedding` by cosine distance,
+    optionally restricted by document status, filename substring or document id.
+    Duplicate documents are searched through the chunks of their original.
+    Documents without an embedding (no embeddable text) are skipped.
+
+    Within a single document the distances of all its chunks are computed
+    exactly, through the document_id index: filtering the approximate index
+    scan instead would drop the document's chunks from the candidates once the
+    corpus is large.
+    """
+    args: list = [query_embedding, top_k]
+    conditions = _document_filters(status, filename, args)
+    where = f"AND {' AND '.join(conditions)}" if conditions else ""
+    if document_id is not None:
+        args.append(document_id)
+        rows = await conn.fetch(
+            f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT document_id, chunk_index, content, embedding FROM document_chunks
+                WHERE document_id = (SELECT COALESCE(duplicate_of, id) FROM documents WHERE id = ${len(args)})
+            )
+            SELECT c.document_id, d.filename, d.status, c.chunk_index, c.content,
+                   1 - (c.embedding <=> $1) AS score
+            FROM candidates c
+            JOIN documents d ON d.id = c.document_id
+            WHERE d.embedding IS NOT NULL {where}
+            ORDER BY c.embedding <=> $1
+            LIMIT $2;
+            """,
+            *args,
+        )
+        return [dict(row) for row in rows]
+
+    async with conn.transaction():
+        # Filters are applied after the index scan, so look at more candidates
+        await conn.execute(f"SET LOCAL hnsw.ef_search = {max(40, top_k * 4)};")
+        rows = await conn.fetch(
+            f"""
+            SELECT c.document_id, d.filename, d.status, c.chunk_index, c.content,
+                   1 - (c.embedding <=> $1) AS score
+            FROM document_chunks c
+            JOIN documents d ON d.id = c.document_id
+            WHERE d.embedding IS NOT NULL {where}
+            ORDER BY c.embedding <=> $1
+            LIMIT $2;
+            """,
+            *args,
+        )
+    return [dict(row) for row in rows]
+
+
+async def get_document_version(conn, document_id: int) -> Optional[dict]:
+    """
+    Returns the id and content hash of the document whose chunks answer for
+    `document_id` (its original if it is a duplicate), or None if it doesn't exist.
+    """
+    row = await conn.fetchrow(
+        """
+        SELECT o.id, o.content_hash FROM documents d
+        JOIN documents o ON o.id = COALESCE(d.duplicate_of, d.id)
+        WHERE d.id = $1;
+        """,
+        document_id,
+    )
+    return dict(row) if row else None
+
+
+async def add_document_entities(conn, records: list[tuple[int, list[dict]]]):
+    """
+    Links documents to their entities, given (document_id, rows from
+    core.entities.normalize_entities) records. Entities are created on first
+    sight and their document counts are kept up to date in the same statement.
+    """
+    counts, display = {}, {}
+    for _, rows in records:
+        for row in rows:
+            key = (row["canonical_text"], row["type"])
+            counts[key] = counts.get(key, 0) + 1
+            display.setdefault(key, row["display_text"])
+    if not counts:
+        return
+    # Sorted keys lock the entity rows in the same order in every transaction
+    keys = sorted(counts)
+    entity_rows = await conn.fetch(
+        """
+        INSERT INTO entities (canonical_text, type, display_text, document_count)
+        SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::int[])
+        ON CONFLICT (canonical_text, type) DO UPDATE SET document_count = entities.document_count + EXCLUDED.document_count
+        RETURNING id, canonical_text, type;
+        """,
+        [k[0] for k in keys], [k[1] for k in keys], [display[k] for k in keys], [counts[k] for k in keys],
+    )
+    ids = {(row["canonical_text"], row["type"]): row["id"] for row in entity_rows}
+    await conn.copy_records_to_table(
+        "document_entities",
+        records=[
+            (ids[(row["canonical_text"], row["type"])], document_id, row["mentions"], row["chunk_indexes"])
+            for document_id, rows in records for row in rows
+        ],
+        columns=["entity_id", "document_id", "mentions", "chunk_indexes"],
+    )
+
+
+async def copy_document_entities(conn, ids: list[int], original_ids: list[int]):
+    """Gives deduplicated documents the entity links of their originals."""
+    await conn.execute(
+        """
+        WITH copied AS (
+            INSERT INTO document_entities (entity_id, document_id, mentions, chunk_indexes)
+            SELECT de.entity_id, v.id, de.mentions, de.chunk_indexes
+            FROM unnest($1::int[], $2::int[]) AS v(id, original_id)
+            JOIN document_entities de ON de.document_id = v.original_id
+            RETURNING entity_id
+        )
+        UPDATE entities e SET document_count = e.document_count + c.n
+        FROM (SELECT entity_id, COUNT(*) AS n FROM copied GROUP BY entity_id) c
+        WHERE e.id = c.entity_id;
+        """,
+        ids, original_ids,
+    )
+
+
+async def replace_document_entities(conn, document_id: int, rows: list[dict]):
+    """Replaces the entity links of a document, e.g. after it was analysed again."""
+    await conn.execute(
+        """
+        WITH removed AS (DELETE FROM document_entities WHERE document_id = $1 RETURNING entity_id)
+        UPDATE entities e SET document_count = e.document_count - 1
+        FROM removed WHERE e.id = removed.entity_id;
+        """,
+        document_id,
+    )
+    await add_document_entities(conn, [(document_id, rows)])
+
+
+async def find_entities(conn, canonical_text: str, entity_type: str = None) -> list[dict]:
+    """Returns the entities with exactly this canonical text, of any type unless `entity_type` is given."""
+    rows = await conn.fetch(
+        """
+        SELECT id, display_text, type, document_count FROM entities
+        WHERE canonical_text = $1 AND ($2::text IS NULL OR type = $2)
+        ORDER BY document_count DESC;
+        """,
+        canonical_text, entity_type,
+    )
+    return [dict(row) for row in rows]
+
+
+async def autocomplete_entities(conn, prefix: str, limit: int, entity_type: str = None) -> list[dict]:
+    """
+    Returns up to `limit` entities whose canonical text starts with `prefix`,
+    most frequent first, topped up with the closest trigram matches (which
+    catch typos and words further into the name) when there are too few.
+    """
+    # A range instead of LIKE, so the text_pattern_ops index is used by generic plans too
+    rows = await conn.fetch(
+        """
+        SELECT id, display_text, type, document_count FROM entities
+        WHERE canonical_text ~>=~ $1 AND canonical_text ~<~ $2 AND ($4::text IS NULL OR type = $4)
+        ORDER BY document_count DESC, id
+        LIMIT $3;
+        """,
+        prefix, prefix + "\U0010ffff", limit, entity_type,
+    )
+    results = [dict(row) for row in rows]
+    if len(results) < limit:
+        fuzzy = await conn.fetch(
+            """
+            SELECT id, display_text, type, document_count FROM entities
+            WHERE canonical_text % $1 AND ($3::text IS NULL OR type = $3) AND NOT (id = ANY($4::bigint[]))
+            ORDER BY canonical_text <-> $1, document_count DESC
+            LIMIT $2;
+            """,
+            prefix, limit - len(results), entity_type, [r["id"] for r in results],
+        )
+        results += [dict(row) for row in fuzzy]
+    return results
+
+
+async def list_entity_documents(conn, entity_id: int, limit: int, before_id: Optional[int] = None,
+                                status: str = None, filename: str = None) -> list[dict]:
+    """
+    Returns up to `limit` documents mentioning the entity, newest id first,
+    starting below `before_id`. Walks the (entity_id, document_id) primary key,
+    so the cost depends on the page size, not on how common the entity is.
+    """
+    args: list = [entity_id, limit]
+    conditions = ["de.entity_id = $1"] + _document_filters(status, filename, args)
+    if before_id is not None:
+        args.append(before_id)
+        conditions.append(f"de.document_id < ${len(args)}")
+    rows = await conn.fetch(
+        f"""
+        SELECT d.id, d.filename, d.status, d.created_at, de.mentions, de.chunk_indexes
+        FROM document_entities de
+        JOIN documents d ON d.id = de.document_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY de.document_id DESC
+        LIMIT $2;
+        """,
+        *args,
+    )
+    return [dict(row) for row in rows]
+
+
+async def cooccurring_entities(conn, entity_id: int, limit: int, sample_size: int) -> list[dict]:
+    """
+    Returns the entities that appear in the most documents together with the
+    given one. Only its `sample_size` most recent documents are considered,
+    which bounds the cost for very common entities.
+    """
+    rows = await conn.fetch(
+        """
+        WITH sample AS (
+            SELECT document_id FROM document_entities WHERE entity_id = $1
+            ORDER BY document_id DESC LIMIT $3
+        )
+        SELECT e.id, e.display_text, e.type, e.document_count, COUNT(*) AS shared_documents
+        FROM sample s
+        JOIN document_entities de ON de.document_id = s.document_id AND de.entity_id <> $1
+        JOIN entities e ON e.id = de.entity_id
+        GROUP BY e.id
+        ORDER BY shared_documents DESC, e.id
+        LIMIT $2;
+        """,
+        entity_id, limit, sample_size,
+    )
+    return [dict(row) for row in rows]
+
+
+def _document_filters(status: Optional[str], filename: Optional[str], args: list) -> list[str]:
+    """
+    Builds WHERE conditions for the active filters only, appending their values
+    to `args`. Keeping unused filters out of the SQL lets the planner pick the
+    matching index even for cached generic plans.
+    """
+    conditions = []
+    if status is not None:
+        args.append(status)
+        conditions.append(f"status = ${len(args)}")
+    if filename is not None:
+        escaped = filename.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        args.append(f"%{escaped}%")
+        conditions.append(f"filename ILIKE ${len(args)}")
+    return conditions
+
+
+async def list_documents(conn, limit: int, after: Optional[tuple[datetime, int]] = None,
+                         status: str = None, filename: str = None) -> list[dict]:
+    """
+    Returns up to `limit` documents, newest first, starting after the
+    (created_at, id) keyset position `after`. Uses the (created_at, id) indexes
+    instead of scanning and sorting the whole table.
+    """
+    args: list = [limit]
+    conditions = _document_filters(status, filename, args)
+    if after is not None:
+        args.extend(after)
+        conditions.append(f"(created_at, id) < (${len(args) - 1}, ${len(args)})")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = await conn.fetch(
+        f"""
+        SELECT id, filename, status, created_at
+        FROM documents
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT $1;
+        """,
+        *args,
+    )
+    return [dict(row) for row in rows]
+
+
+async def estimate_document_count(conn, status: str = None, filename: str = None) -> int:
+    """
+    Returns a cheap estimate of the number of matching documents: the planner
+    statistics for the whole table, or the planner's row estimate when filtered.
+    """
+    if status is None and filename is None:
+        estimate = await conn.fetchval("SELECT reltuples::bigint FROM pg_class WHERE oid = 'documents'::regclass;")
+        if estimate is not None and estimate >= 0:
+            return estimate
+        # The table has never been analysed
+        return await conn.fetchval("SELECT COUNT(*) FROM documents;")
+    args: list = []
+    conditions = _document_filters(status, filename, args)
+    plan = await conn.fetchval(
+        f"EXPLAIN (FORMAT JSON) SELECT 1 FROM documents WHERE {' AND '.join(conditions)};",
+        *args,
+    )
+    return int(json.loads(plan)[0]["Plan"]["Plan Rows"])
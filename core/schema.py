@@ -0,0 +1,183 @@
+"""Idempotent schema migrations applied when the API starts."""
+import os
+
+from core.db import connect
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Arbitrary key so concurrent workers don't run the migrations at the same time
+_MIGRATION_LOCK_KEY = 7_364_201
+
+# Every statement must be safe to run repeatedly against an up-to-date database.
+# The pgvector extension is created separately by ensure_extensions.
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+        id SERIAL PRIMARY KEY,
+        filename TEXT NOT NULL,
+        content TEXT,
+        summary TEXT,
+        entities JSONB,
+        embedding VECTOR(1536),
+        status VARCHAR(50) DEFAULT 'pending',
+        created_at TIMESTAMPTZ DEFAULT NOW()
+    );
+    """,
+    # Content-addressed deduplication
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash CHAR(64);",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_hash CHAR(64);",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS duplicate_of INTEGER REFERENCES documents(id) ON DELETE SET NULL;",
+    "CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash);",
+    "CREATE INDEX IF NOT EXISTS idx_documents_file_hash ON documents (file_hash);",
+    # Keyset pagination and filtering of the document list
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+    "CREATE INDEX IF NOT EXISTS idx_documents_created_at_id ON documents (created_at DESC, id DESC);",
+    "CREATE INDEX IF NOT EXISTS idx_documents_status_created_at_id ON documents (status, created_at DESC, id DESC);",
+    "CREATE INDEX IF NOT EXISTS idx_documents_filename_trgm ON documents USING gin (filename gin_trgm_ops);",
+    # Persistent tier of the LLM response cache
+    """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key CHAR(64) PRIMARY KEY,
+        model TEXT,
+        response JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at);",
+    # Retrieval chunks with an approximate nearest neighbour index for semantic search
+    """
+    CREATE TABLE IF NOT EXISTS document_chunks (
+        id BIGSERIAL PRIMARY KEY,
+        document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+        chunk_index INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        embedding VECTOR(1536) NOT NULL,
+        UNIQUE (document_id, chunk_index)
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding ON document_chunks
+    USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+    """,
+    # Durable ingestion queue, consumed by the workers with SKIP LOCKED
+    """
+    CREATE TABLE IF NOT EXISTS ingest_jobs (
+        id UUID PRIMARY KEY,
+        total_files INTEGER NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_job_files (
+        id SERIAL PRIMARY KEY,
+        job_id UUID NOT NULL REFERENCES ingest_jobs(id) ON DELETE CASCADE,
+        filename TEXT NOT NULL,
+        content_type TEXT,
+        data BYTEA,
+        status VARCHAR(20) NOT NULL DEFAULT 'queued',
+        document_id INTEGER REFERENCES documents(id) ON DELETE SET NULL,
+        deduplicated BOOLEAN NOT NULL DEFAULT FALSE,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        locked_at TIMESTAMPTZ,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ingest_job_files_job_id ON ingest_job_files (job_id);",
+    """
+    CREATE INDEX IF NOT EXISTS idx_ingest_job_files_pending ON ingest_job_files (id)
+    WHERE status IN ('queued', 'processing');
+    """,
+    # Per-document stage timings and LLM usage
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS timings JSONB;",
+    # Content-hashed chunks, so unchanged chunks of re-ingested documents are reused
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash CHAR(64);",
+    "CREATE INDEX IF NOT EXISTS idx_document_chunks_content_hash ON document_chunks (content_hash);",
+    """
+    CREATE TABLE IF NOT EXISTS chunk_analyses (
+        content_hash CHAR(64) NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        model TEXT NOT NULL,
+        prompt_version TEXT NOT NULL,
+        result JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (content_hash, kind, model, prompt_version)
+    );
+    """,
+    # Answers of the question answering endpoints
+    """
+    CREATE TABLE IF NOT EXISTS qa_answers (
+        cache_key CHAR(64) PRIMARY KEY,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        sources JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_qa_answers_created_at ON qa_answers (created_at);",
+    # Normalized entities: prefix and trigram lookups by canonical text, documents by entity and back
+    """
+    CREATE TABLE IF NOT EXISTS entities (
+        id BIGSERIAL PRIMARY KEY,
+        canonical_text TEXT NOT NULL,
+        type TEXT NOT NULL,
+        display_text TEXT NOT NULL,
+        document_count INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (canonical_text, type)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_entities_canonical_prefix ON entities (canonical_text text_pattern_ops);",
+    "CREATE INDEX IF NOT EXISTS idx_entities_canonical_trgm ON entities USING gin (canonical_text gin_trgm_ops);",
+    """
+    CREATE TABLE IF NOT EXISTS document_entities (
+        entity_id BIGINT NOT NULL REFERENCES entities(id) ON DELETE CASCADE,
+        document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+        mentions INTEGER NOT NULL DEFAULT 1,
+        chunk_indexes INTEGER[] NOT NULL DEFAULT '{}',
+        PRIMARY KEY (entity_id, document_id)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_document_entities_document_id ON document_entities (document_id);",
+    # Extracted text in compressed segments outside the documents rows
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_bytes BIGINT;",
+    """
+    CREATE TABLE IF NOT EXISTS document_content_segments (
+        document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+        segment_index INTEGER NOT NULL,
+        byte_offset BIGINT NOT NULL,
+        byte_length INTEGER NOT NULL,
+        data BYTEA NOT NULL,
+        PRIMARY KEY (document_id, segment_index)
+    );
+    """,
+    # The segments are compressed already; don't let TOAST try again
+    "ALTER TABLE document_content_segments ALTER COLUMN data SET STORAGE EXTERNAL;",
+]
+
+
+def auto_migrate_enabled() -> bool:
+    return os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
+
+
+async def ensure_extensions():
+    """
+    Creates the pgvector extension on a connection outside the pool. Pooled
+    connections register the VECTOR codec as they are opened, which fails
+    while the extension doesn't exist, so this runs before the pool is created.
+    """
+    conn = await connect()
+    try:
+        await conn.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    finally:
+        await conn.close()
+
+
+async def ensure_schema(conn):
+    """Applies SCHEMA_STATEMENTS in a single transaction, serialized across workers."""
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1);", _MIGRATION_LOCK_KEY)
+        for statement in SCHEMA_STATEMENTS:
+            await conn.execute(statement)
+    logger.info("Database schema is up to date.")
@@ -0,0 +1,43 @@
+"""Timings of the startup phases of the API and worker processes."""
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class StartupReport:
+    """
+    Records how long each startup phase (imports, client and agent creation,
+    database pool, migrations, ...) took, so slow cold starts can be traced to
+    a phase. For a per-module breakdown of the imports, run the process with
+    `python -X importtime`.
+    """
+
+    def __init__(self, started: Optional[float] = None):
+        # perf_counter() value the startup began at, e.g. before the first import
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.total_seconds: Optional[float] = None
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = round(self.phases.get(name, 0.0) + seconds, 4)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def finish(self):
+        """Marks the process as ready and logs the report."""
+        self.total_seconds = round(time.perf_counter() - self.started, 4)
+        breakdown = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        logger.info(f"Started in {self.total_seconds:.3f}s ({breakdown}).")
+
+    def as_dict(self) -> dict:
+        return {"phases": dict(self.phases), "total_seconds": self.total_seconds}
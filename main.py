@@ -1,157 +1,384 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from typing import List
+import time
+
+# Measured from before the first import, for the startup report
+_PROCESS_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import base64
+import gc
+import hashlib
 import os
 import json
+from datetime import datetime
 from dotenv import load_dotenv
-from psycopg2.extras import RealDictCursor
 
 # Core imports
 from core.logger import get_logger
-from core.exceptions import ParsingError, UnsupportedFileTypeError
-from core.parser import parse_document
-from core.db import get_db_connection
-from core.llm import get_azure_openai_client
-
-# Agent imports
-from agents.summarization_agent import SummarizationAgent
-from agents.entity_extraction_agent import EntityExtractionAgent
-from agents.validation_agent import ValidationAgent
+from core.exceptions import DatabaseUnavailableError, DocumentTooLargeError
+from core.content_store import get_content_info, iter_content, load_content
+from core.db import get_db_connection, init_db_pool, close_db_pool, get_pool_stats
+from core.entities import canonicalize_entity, canonicalize_type, normalize_entities
+from core.ingestion import build_pipeline, embed_chunks, ingest_document
+from core.jobs import enqueue_job, get_job, get_job_files, get_queue_depth, run_worker
+from core.metrics import DOCUMENTS, HTTP_REQUEST_SECONDS, build_gauges, document_timings, render_metrics, stage
+from core.parser import read_upload, shutdown_parser_pool
+from core.progress import emit_progress, progress_listener
+from core.qa import AnswerCache, answer_question
+from core.rate_limiter import get_rate_limiter_stats
+from core.repository import (
+    search_chunks, list_documents, estimate_document_count, get_document_version, replace_document_entities,
+    find_entities, autocomplete_entities, list_entity_documents, cooccurring_entities,
+)
+from core.schema import auto_migrate_enabled, ensure_extensions, ensure_schema
+from core.startup import StartupReport
+from agents.qa_agent import QuestionAnsweringAgent
+from agents.tiered_validation_agent import TieredValidationAgent
 
 # --- Initialization ---
 load_dotenv()
 logger = get_logger(__name__)
+startup_report = StartupReport(_PROCESS_STARTED)
+startup_report.record("imports", time.perf_counter() - _PROCESS_STARTED)
+
+# Clients and agents are created in the lifespan, i.e. in each server worker
+# process after it has started, never at import time
+pipeline = None
+llm_cache = None
+qa_agent = None
+answer_cache = None
+
+# In-process ingestion workers; set INGEST_INPROCESS_WORKERS=0 when running worker.py separately
+_worker_stop = asyncio.Event()
+_worker_tasks: list[asyncio.Task] = []
+# Streamed ingestions keep running when the client disconnects; hold a reference until they finish
+_stream_tasks: set[asyncio.Task] = set()
+
+
+def _build_services():
+    global pipeline, llm_cache, qa_agent, answer_cache
+    try:
+        pipeline, llm_cache = build_pipeline()
+        # Answers share the summarizer's rate-limited client and model
+        qa_agent = QuestionAnsweringAgent(pipeline.summarizer.client, pipeline.summarizer.model)
+        answer_cache = AnswerCache(qa_agent.model) if os.getenv("QA_CACHE_ENABLED", "true").lower() == "true" else None
+        logger.info("Clients and agents initialized successfully.")
+    except Exception as e:
+        logger.error(f"Fatal error during initialization: {e}", exc_info=True)
+        pipeline = llm_cache = qa_agent = answer_cache = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with startup_report.phase("clients_and_agents"):
+        _build_services()
+    if not pipeline:
+        logger.error("Azure OpenAI client not available. API will not function correctly.")
+    try:
+        if auto_migrate_enabled():
+            with startup_report.phase("schema_extensions"):
+                await ensure_extensions()
+        with startup_report.phase("db_pool"):
+            await init_db_pool()
+        if auto_migrate_enabled():
+            with startup_report.phase("schema_migrations"):
+                async with get_db_connection() as conn:
+                    await ensure_schema(conn)
+    except DatabaseUnavailableError as e:
+        # The pool is created lazily on the first request if the database comes up later
+        logger.error(f"{e.message}. Database-backed endpoints will retry on first use.")
+    if pipeline:
+        for _ in range(int(os.getenv("INGEST_INPROCESS_WORKERS", "1"))):
+            _worker_tasks.append(asyncio.create_task(run_worker(pipeline, _worker_stop)))
+    startup_report.finish()
+    logger.info("FastAPI application starting up.")
+
+    yield
+
+    _worker_stop.set()
+    if _worker_tasks:
+        # Files still being processed are reclaimed by another worker after the lock timeout
+        _, pending = await asyncio.wait(_worker_tasks, timeout=float(os.getenv("INGEST_WORKER_SHUTDOWN_SECONDS", "10")))
+        for task in pending:
+            task.cancel()
+    # Files of an interrupted streamed ingestion that were not saved yet have to be uploaded again
+    for task in list(_stream_tasks):
+        task.cancel()
+    shutdown_parser_pool()
+    await close_db_pool()
+    logger.info("FastAPI application shut down.")
+
 
 app = FastAPI(
     title="Intelligent Document Summarization API",
     description="API for document ingestion, summarization, and Q&A.",
+    lifespan=lifespan,
 )
 
-# Initialize clients and agents
-try:
-    openai_client = get_azure_openai_client()
-    completion_model = os.getenv("COMPLETION_DEPLOYMENT_NAME")
-    embedding_model = os.getenv("EMBEDDING_DEPLOYMENT_NAME")
-    
-    if not completion_model:
-        raise ValueError("COMPLETION_DEPLOYMENT_NAME must be set in the .env file.")
-
-    summarizer = SummarizationAgent(openai_client, completion_model)
-    entity_extractor = EntityExtractionAgent(openai_client, completion_model)
-    validator = ValidationAgent(openai_client, completion_model)
-    logger.info("Clients and agents initialized successfully.")
-except Exception as e:
-    logger.error(f"Fatal error during initialization: {e}", exc_info=True)
-    openai_client = None
-
-@app.on_event("startup")
-async def startup_event():
-    if not openai_client:
-        logger.error("Azure OpenAI client not available. API will not function correctly.")
-    logger.info("FastAPI application starting up.")
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so /document/1 and /document/2 share a series
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method, route=getattr(route, "path", "unmatched"), status=response.status_code,
+    )
+    return response
+
+@app.exception_handler(DatabaseUnavailableError)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailableError):
+    logger.error(f"Database unavailable while handling {request.url.path}: {exc.message}")
+    return JSONResponse(status_code=503, content={"detail": "Database connection is unavailable."})
 
 # --- API Endpoints ---
 
-@app.post("/ingest/", summary="Ingest and process documents")
+@app.post("/ingest/", summary="Queue documents for ingestion", status_code=202)
 async def ingest_documents(files: List[UploadFile] = File(...)):
-    if not openai_client:
-        raise HTTPException(status_code=503, detail="AI services are unavailable.")
+    """
+    Stores the uploaded files in the ingestion queue and returns immediately.
+    Progress can be followed on /jobs/{job_id}.
+    """
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="Ingestion is not available; the LLM client failed to initialize.")
+    try:
+        uploads = [(file.filename, file.content_type, await read_upload(file)) for file in files]
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=e.message)
+    async with get_db_connection() as conn:
+        job_id = await enqueue_job(conn, uploads)
+    logger.info(f"Queued {len(uploads)} file(s) as ingestion job {job_id}.")
+    return {
+        "message": "Files queued for processing",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}",
+    }
 
-    processed_docs = []
-    for file in files:
-        try:
-            logger.info(f"Processing file: {file.filename}")
-            
-            content = parse_document(file)
-            if not content.strip():
-                logger.warning(f"No content extracted from {file.filename}. Skipping.")
-                continue
-
-            # --- AGENT WORKFLOW ---
-            summary_data = summarizer.summarize(content)
-            entities_data = entity_extractor.extract(content)
-            
-            # --- VALIDATION STEP ---
-            summary_text = summary_data.get("summary", "")
-            is_valid = validator.validate_summary(content, summary_text)
-            doc_status = "processed" if is_valid else "needs_review"
-            
-            if not is_valid:
-                logger.warning(f"Summary for {file.filename} failed validation. Status set to 'needs_review'.")
-
-            # --- TEMPORARY WORKAROUND FOR MISSING EMBEDDING MODEL ---
-            logger.warning("WORKAROUND ACTIVE: Bypassing real embedding generation and using a dummy vector.")
-            embedding = [0.0] * 1536 
-
-            # --- DATABASE SAVING ---
-            conn = get_db_connection()
-            if not conn:
-                raise HTTPException(status_code=503, detail="Database connection could not be established.")
-            
+
+def _event_response(events, request: Request) -> StreamingResponse:
+    """
+    Streams dict events as newline-delimited JSON, or as server-sent events
+    when the request accepts text/event-stream.
+    """
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    async def _encode():
+        async for event in events:
+            data = json.dumps(jsonable_encoder(event))
+            yield f"event: {event['event']}\ndata: {data}\n\n" if sse else data + "\n"
+
+    return StreamingResponse(
+        _encode(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # Keep reverse proxies from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/ingest/stream", summary="Ingest documents and stream their progress")
+async def ingest_documents_stream(request: Request, files: List[UploadFile] = File(...)):
+    """
+    Processes the uploaded files right away and streams a progress event as
+    each stage finishes: "started", "parsed", "chunk" (k of n chunks analysed),
+    "summarized", "entities_extracted", "validated", "embedded" and "saved"
+    (or "duplicate", "skipped", "failed"), then a final "done".
+
+    Every file is saved as soon as its analysis is done, so results are
+    visible before the whole batch finishes and are kept if the client
+    disconnects; processing then continues in the background.
+
+    The response is newline-delimited JSON, or server-sent events when the
+    request accepts text/event-stream.
+    """
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="Ingestion is not available; the LLM client failed to initialize.")
+    try:
+        uploads = [(file.filename, file.content_type, await read_upload(file)) for file in files]
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=e.message)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def _ingest(item):
+        index, (filename, content_type, data) = item
+        with progress_listener(queue, file=filename, index=index):
+            emit_progress("started")
             try:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    sql_query = """
-                        INSERT INTO documents (filename, content, summary, entities, embedding, status)
-                        VALUES (%s, %s, %s, %s, %s, %s) RETURNING id;
-                    """
-                    values = (file.filename, content, summary_text, json.dumps(entities_data), embedding, doc_status)
-                    
-                    cur.execute(sql_query, values)
-                    
-                    result = cur.fetchone()
-                    doc_id = result['id'] if result else None
-                    conn.commit()
-                
-                if doc_id:
-                    processed_docs.append({"id": doc_id, "filename": file.filename})
-                    logger.info(f"Successfully ingested and saved document id: {doc_id}")
-                else:
-                    logger.error(f"Failed to retrieve document ID for {file.filename} after insertion.")
-                    
-            finally:
-                conn.close()
-
-        except (ParsingError, UnsupportedFileTypeError) as e:
-            logger.error(f"Document processing failed for {file.filename}: {e.message}")
-            raise HTTPException(status_code=422, detail=e.message)
-        except Exception as e:
-            logger.error(f"An unexpected error occurred processing {file.filename}: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"An internal server error occurred: {str(e)}")
-
-    return {"message": "Files processed successfully", "processed_documents": processed_docs}
+                saved = await ingest_document(pipeline, filename, content_type, data)
+            except Exception as e:
+                logger.error(f"Failed to ingest {filename}: {e}", exc_info=True)
+                DOCUMENTS.inc(outcome="failed")
+                emit_progress("failed", error=getattr(e, "message", None) or str(e))
+                raise
+            if saved is None:
+                DOCUMENTS.inc(outcome="skipped")
+                emit_progress("skipped", reason="No content could be extracted.")
+            else:
+                DOCUMENTS.inc(outcome="duplicate" if saved["deduplicated"] else saved["status"])
+            return saved
 
+    async def _run():
+        try:
+            results = await pipeline.run_batch(list(enumerate(uploads)), _ingest)
+            saved = [r for r in results if isinstance(r, dict)]
+            queue.put_nowait({"event": "done", "files": len(uploads), "saved": len(saved),
+                              "failed": sum(isinstance(r, Exception) for r in results),
+                              "document_ids": [r["id"] for r in saved]})
+        finally:
+            queue.put_nowait(None)
 
-@app.get("/documents/", summary="List processed documents")
-async def get_documents():
-    """Retrieves list of documents from the database."""
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=503, detail="Database connection is unavailable.")
+    task = asyncio.create_task(_run())
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+
+    async def _events():
+        while (event := await queue.get()) is not None:
+            yield event
+
+    logger.info(f"Streaming the ingestion of {len(uploads)} file(s).")
+    return _event_response(_events(), request)
+
+
+@app.get("/jobs/{job_id}", summary="Get the status of an ingestion job")
+async def get_job_status(job_id: str):
+    """Reports the overall status and progress of an ingestion job."""
+    try:
+        async with get_db_connection() as conn:
+            job = await get_job(conn, job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/jobs/{job_id}/files", summary="Get per-file progress of an ingestion job")
+async def get_job_file_status(job_id: str):
+    """Reports the status, resulting document id and error of every file in the job."""
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT id, filename, status FROM documents ORDER BY created_at DESC;")
-            docs = cur.fetchall()
-        return {"documents": docs}
-    finally:
-        if conn:
-            conn.close()
+        async with get_db_connection() as conn:
+            job = await get_job(conn, job_id)
+            files = await get_job_files(conn, job_id) if job else None
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return {"job_id": job_id, "status": job["status"], "files": files}
+
+
+def _encode_cursor(created_at: datetime, doc_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), doc_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(doc_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+@app.get("/documents/", summary="List processed documents")
+async def get_documents(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page."),
+    status: Optional[str] = None,
+    filename: Optional[str] = Query(None, description="Case-insensitive filename substring."),
+):
+    """
+    Retrieves a page of documents from the database, newest first. Pass the
+    returned `next_cursor` to get the following page. Responses carry an ETag,
+    so unchanged pages can be revalidated with If-None-Match.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    async with get_db_connection() as conn:
+        # Fetch one extra row to know whether there is a next page
+        docs = await list_documents(conn, limit + 1, after, status, filename)
+        total = await estimate_document_count(conn, status, filename)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_cursor(docs[-1]["created_at"], docs[-1]["id"])
+
+    body = json.dumps(
+        jsonable_encoder({"documents": docs, "next_cursor": next_cursor, "total_estimate": total}),
+        separators=(",", ":"),
+    ).encode("utf-8")
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/document/{doc_id}", summary="Get all data for a document")
 async def get_document_data(doc_id: int):
-    """Retrieves the summary and entities for a specific document."""
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=503, detail="Database connection is unavailable.")
+    """
+    Retrieves the summary, entities and processing timings for a specific
+    document, and the size of its text. The text itself is served by
+    /document/{doc_id}/content.
+    """
+    async with get_db_connection() as conn:
+        row = await conn.fetchrow(
+            "SELECT id, filename, summary, entities, status, timings, content_bytes FROM documents WHERE id = $1;", doc_id
+        )
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    data = dict(row)
+    # asyncpg returns JSON columns as strings
+    for key in ("entities", "timings"):
+        if isinstance(data.get(key), str):
+            data[key] = json.loads(data[key])
+    return data
+
+
+def _parse_byte_range(header: str, size: int) -> tuple[int, int]:
+    """Returns the [start, end) of a single "bytes=" Range header, or raises a 416."""
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT id, filename, summary, entities, status FROM documents WHERE id = %s;", (doc_id,))
-            data = cur.fetchone()
-        if not data:
-            raise HTTPException(status_code=404, detail="Document not found.")
-        return data
-    finally:
-        if conn:
-            conn.close()
+        unit, _, spec = header.partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError
+        first, _, last = spec.strip().partition("-")
+        if first:
+            start, end = int(first), int(last) + 1 if last else size
+        else:
+            start, end = max(0, size - int(last)), size
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Only a single byte range is supported.",
+                            headers={"Content-Range": f"bytes */{size}"})
+    if start >= size or end <= start:
+        raise HTTPException(status_code=416, detail="Range not satisfiable.", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size)
+
+
+@app.get("/document/{doc_id}/content", summary="Stream the extracted text of a document")
+async def get_document_content(doc_id: int, request: Request):
+    """
+    Streams the document's UTF-8 text, decompressing one stored segment at a
+    time. A `Range: bytes=start-end` header returns only that part (206), for
+    which only the segments covering it are read.
+    """
+    async with get_db_connection() as conn:
+        info = await get_content_info(conn, doc_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    headers = {"Accept-Ranges": "bytes"}
+    range_header = request.headers.get("range")
+    if info["size"] is None or not range_header:
+        if info["size"] is not None:
+            headers["Content-Length"] = str(info["size"])
+        return StreamingResponse(iter_content(doc_id, info), media_type="text/plain; charset=utf-8", headers=headers)
+    start, end = _parse_byte_range(range_header, info["size"])
+    headers.update({"Content-Range": f"bytes {start}-{end - 1}/{info['size']}", "Content-Length": str(end - start)})
+    return StreamingResponse(
+        iter_content(doc_id, info, start, end), status_code=206, media_type="text/plain; charset=utf-8", headers=headers,
+    )
 
 
 @app.put("/document/{doc_id}", summary="Update a document's summary")
@@ -161,16 +388,222 @@ async def update_summary(doc_id: int, update_data: dict):
     if summary is None:
         raise HTTPException(status_code=400, detail="No summary provided in request body.")
     
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=503, detail="Database connection is unavailable.")
+    async with get_db_connection() as conn:
+        # Also update the status to 'processed' since a human has intervened
+        await conn.execute("UPDATE documents SET summary = $1, status = 'processed' WHERE id = $2;", summary, doc_id)
+    logger.info(f"Updated summary for document id: {doc_id}")
+    return {"message": "Summary updated successfully."}
+
+
+@app.post("/document/{doc_id}/resummarize", summary="Re-analyse a document, reusing stored chunk results")
+async def resummarize_document(doc_id: int):
+    """
+    Runs the agents again over the stored content of a document and replaces
+    its summary, entities and status. Chunks that were analysed before are not
+    sent to the model again, so only the reduce and validation steps run unless
+    the model or prompt version changed.
+    """
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="AI services are unavailable.")
+    async with get_db_connection() as conn:
+        content = await load_content(conn, doc_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    if not content.strip():
+        raise HTTPException(status_code=409, detail="Document has no stored content.")
+
+    async with get_db_connection() as conn:
+        chunks = [row["content"] for row in await conn.fetch(
+            "SELECT content FROM document_chunks WHERE document_id = $1 ORDER BY chunk_index;", doc_id,
+        )]
+    with document_timings() as timings, stage("resummarize", document_id=doc_id):
+        # Validation compares the summary against the retrieval chunks. Their embeddings are
+        # reused only if stored for the current embedding model, and computed otherwise
+        embed_task = None
+        if chunks and isinstance(pipeline.validator, TieredValidationAgent):
+            embed_task = asyncio.create_task(embed_chunks(pipeline, chunks))
+        try:
+            result = await pipeline.process(content, sections=chunks if embed_task else None, section_embeddings=embed_task)
+        finally:
+            if embed_task:
+                embed_task.cancel()
+    async with get_db_connection() as conn:
+        entity_rows = await asyncio.to_thread(normalize_entities, result["entities"], chunks)
+        async with conn.transaction():
+            await conn.execute(
+                "UPDATE documents SET summary = $1, entities = $2, status = $3, timings = $4 WHERE id = $5;",
+                result["summary"], json.dumps(result["entities"]), result["status"], json.dumps(timings), doc_id,
+            )
+            await replace_document_entities(conn, doc_id, entity_rows)
+    logger.info(f"Re-summarized document id: {doc_id}")
+    return {"id": doc_id, "summary": result["summary"], "status": result["status"], "timings": timings}
+
+
+@app.get("/search/", summary="Semantic search over document chunks")
+async def search_documents(
+    q: str = Query(..., min_length=1, description="Natural-language query."),
+    top_k: int = Query(10, ge=1, le=100),
+    status: Optional[str] = None,
+    filename: Optional[str] = Query(None, description="Case-insensitive filename substring."),
+    document_id: Optional[int] = None,
+):
+    """Returns the chunks most similar to the query, using the pgvector HNSW index."""
+    if not pipeline:
+        raise HTTPException(status_code=503, detail="AI services are unavailable.")
+    [query_embedding] = await pipeline.embedder.embed([q])
+    async with get_db_connection() as conn:
+        results = await search_chunks(conn, query_embedding, top_k, status, filename, document_id)
+    return {"query": q, "results": results}
+
+
+@app.get("/entities/", summary="Autocomplete entity names")
+async def autocomplete_entity_names(
+    q: str = Query(..., min_length=2, max_length=200, description="The start of an entity name."),
+    type: Optional[str] = Query(None, description="Only entities of this type, e.g. organization."),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Suggests entities whose name starts with `q`, most frequently mentioned
+    first, followed by similar names when there are few prefix matches.
+    """
+    async with get_db_connection() as conn:
+        entities = await autocomplete_entities(
+            conn, canonicalize_entity(q), limit, canonicalize_type(type) if type else None,
+        )
+    return {"query": q, "entities": entities}
+
+
+@app.get("/entities/lookup", summary="Find entities by name")
+async def lookup_entities(
+    name: str = Query(..., min_length=1, max_length=500),
+    type: Optional[str] = Query(None, description="Only entities of this type, e.g. organization."),
+):
+    """Returns the entities with this name (compared case- and spacing-insensitively) and their document counts."""
+    async with get_db_connection() as conn:
+        entities = await find_entities(conn, canonicalize_entity(name), canonicalize_type(type) if type else None)
+    return {"name": name, "entities": entities}
+
+
+@app.get("/entities/{entity_id}/documents", summary="List the documents mentioning an entity")
+async def get_entity_documents(
+    entity_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page."),
+    status: Optional[str] = None,
+    filename: Optional[str] = Query(None, description="Case-insensitive filename substring."),
+):
+    """
+    Returns a page of the documents mentioning the entity, newest first, with
+    the number of chunks mentioning it and their indexes.
+    """
+    async with get_db_connection() as conn:
+        docs = await list_entity_documents(conn, entity_id, limit + 1, cursor, status, filename)
+    next_cursor = docs[limit - 1]["id"] if len(docs) > limit else None
+    return {"entity_id": entity_id, "documents": docs[:limit], "next_cursor": next_cursor}
+
+
+@app.get("/entities/{entity_id}/cooccurring", summary="Entities mentioned together with an entity")
+async def get_cooccurring_entities(entity_id: int, limit: int = Query(20, ge=1, le=100)):
+    """
+    Counts the documents each other entity shares with this one, over the
+    entity's ENTITY_COOCCURRENCE_SAMPLE (default 10000) most recent documents.
+    """
+    sample_size = int(os.getenv("ENTITY_COOCCURRENCE_SAMPLE", "10000"))
+    async with get_db_connection() as conn:
+        entities = await cooccurring_entities(conn, entity_id, limit, sample_size)
+    return {"entity_id": entity_id, "sample_size": sample_size, "entities": entities}
+
+
+@app.get("/document/{doc_id}/ask", summary="Ask a question about a document")
+async def ask_document(
+    request: Request,
+    doc_id: int,
+    q: str = Query(..., min_length=1, max_length=1000, description="The question."),
+    top_k: int = Query(5, ge=1, le=20, description="Number of chunks to answer from."),
+):
+    """
+    Answers a question from the document's chunks most relevant to it, so the
+    prompt stays the same size however long the document is. The answer is
+    streamed as "sources", "answer" and "done" events, or a final "error" event
+    (see /ingest/stream for the formats); repeated questions about an unchanged document are served
+    from the answer cache.
+    """
+    if not qa_agent:
+        raise HTTPException(status_code=503, detail="AI services are unavailable.")
+    async with get_db_connection() as conn:
+        version = await get_document_version(conn, doc_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    events = answer_question(
+        qa_agent, pipeline.embedder, answer_cache, q, top_k,
+        scope=f"document:{version['id']}", version=version["content_hash"], document_id=doc_id,
+    )
+    return _event_response(events, request)
+
+
+@app.get("/ask/", summary="Ask a question across all documents")
+async def ask_corpus(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=1000, description="The question."),
+    top_k: int = Query(8, ge=1, le=20, description="Number of chunks to answer from."),
+    status: Optional[str] = None,
+    filename: Optional[str] = Query(None, description="Case-insensitive filename substring."),
+):
+    """
+    Answers a question from the most relevant chunks of all documents,
+    optionally filtered like /search/. Streams the same events as
+    /document/{doc_id}/ask; cached answers are reused while the retrieved
+    chunks stay the same.
+    """
+    if not qa_agent:
+        raise HTTPException(status_code=503, detail="AI services are unavailable.")
+    events = answer_question(
+        qa_agent, pipeline.embedder, answer_cache, q, top_k,
+        scope=json.dumps({"status": status, "filename": filename}), status=status, filename=filename,
+    )
+    return _event_response(events, request)
+
+
+@app.get("/stats/", summary="Runtime statistics")
+async def get_stats():
+    """
+    Reports connection pool, LLM cache, rate limiter, validation tier, chunk and
+    embedding reuse and answer cache statistics, and the startup time of this process.
+    """
+    return {
+        "db_pool": get_pool_stats(),
+        "llm_cache": llm_cache.get_stats() if llm_cache else None,
+        "rate_limits": get_rate_limiter_stats(),
+        "validation": pipeline.validator.get_stats() if isinstance(getattr(pipeline, "validator", None), TieredValidationAgent) else None,
+        "chunk_reuse": pipeline.chunk_store.get_stats() if getattr(pipeline, "chunk_store", None) else None,
+        "embedding_reuse": pipeline.embedding_store.get_stats() if getattr(pipeline, "embedding_store", None) else None,
+        "answer_cache": answer_cache.get_stats() if answer_cache else None,
+        "startup": startup_report.as_dict(),
+    }
+
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Exposes stage timings, LLM usage, cache, pool, rate limiter and queue metrics in the Prometheus text format."""
     try:
-        with conn.cursor() as cur:
-            # Also update the status to 'processed' since a human has intervened
-            cur.execute("UPDATE documents SET summary = %s, status = 'processed' WHERE id = %s;", (summary, doc_id))
-            conn.commit()
-        logger.info(f"Updated summary for document id: {doc_id}")
-        return {"message": "Summary updated successfully."}
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        async with get_db_connection() as conn:
+            queue_counts = await get_queue_depth(conn)
+    except DatabaseUnavailableError:
+        queue_counts = None
+    validator = getattr(pipeline, "validator", None)
+    gauges = build_gauges(
+        pool_stats=get_pool_stats(),
+        cache_stats=llm_cache.get_stats() if llm_cache else None,
+        limiter_stats=get_rate_limiter_stats(),
+        validation_stats=validator.get_stats() if isinstance(validator, TieredValidationAgent) else None,
+        queue_counts=queue_counts,
+        startup=startup_report.as_dict(),
+    )
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+
+# Everything created at import time lives for the whole process. Moving it out of
+# the garbage collector's generations keeps the collector from writing to those
+# pages, so workers forked from a preloading server (gunicorn --preload) keep
+# sharing them with the parent instead of copying them.
+gc.freeze()
@@ -0,0 +1,79 @@
+import random
+
+from core.chunking import ChunkBuilder, count_tokens, group_by_token_budget, split_into_chunks
+
+_WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi omicron pi rho sigma".split()
+
+
+def _text(paragraphs: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    return "\n\n".join(
+        " ".join(
+            " ".join(rng.choices(_WORDS, k=rng.randint(5, 25))).capitalize() + "."
+            for _ in range(rng.randint(1, 6))
+        )
+        for _ in range(paragraphs)
+    )
+
+
+def test_chunks_never_exceed_max_tokens_including_separators():
+    text = _text(300)
+    for content_defined in (False, True):
+        chunks = split_into_chunks(text, max_tokens=120, overlap_tokens=30, content_defined=content_defined)
+        assert len(chunks) > 1
+        assert max(count_tokens(chunk) for chunk in chunks) <= 120
+
+
+def test_tiny_paragraphs_are_budgeted_with_their_separators():
+    # Units of one token each: without counting the separators a chunk would hold ~2x the budget
+    text = "\n\n".join("x" for _ in range(200))
+    chunks = split_into_chunks(text, max_tokens=50, overlap_tokens=0)
+    assert max(count_tokens(chunk) for chunk in chunks) <= 50
+
+
+def test_oversized_sentences_are_split():
+    text = " ".join(_WORDS * 200)
+    chunks = split_into_chunks(text, max_tokens=100, overlap_tokens=10)
+    assert len(chunks) > 1
+    assert max(count_tokens(chunk) for chunk in chunks) <= 100
+
+
+def test_consecutive_chunks_overlap():
+    # Paragraphs well under overlap_tokens, so the tail of every chunk can be carried over
+    text = "\n\n".join(f"Paragraph {i} is short." for i in range(200))
+    chunks = split_into_chunks(text, max_tokens=150, overlap_tokens=60)
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        first_unit = current.split("\n\n")[0]
+        assert first_unit in previous
+
+
+def test_incremental_feeding_matches_one_shot():
+    pages = [_text(20, seed) for seed in range(5)]
+    builder = ChunkBuilder(max_tokens=200, overlap_tokens=40, content_defined=True)
+    incremental = [chunk for page in pages for chunk in builder.add(page)] + builder.finish()
+    assert incremental == split_into_chunks("\n\n".join(pages), 200, 40, content_defined=True)
+
+
+def test_content_defined_chunks_survive_an_edit_elsewhere():
+    paragraphs = _text(400).split("\n\n")
+    edited = list(paragraphs)
+    edited[10] = "An entirely new paragraph replacing the old one."
+
+    original_chunks = split_into_chunks("\n\n".join(paragraphs), 200, 0, content_defined=True)
+    edited_chunks = split_into_chunks("\n\n".join(edited), 200, 0, content_defined=True)
+    reused = set(original_chunks) & set(edited_chunks)
+    # Only the chunks around the edit change
+    assert len(reused) >= len(original_chunks) - 3
+
+    fixed_original = split_into_chunks("\n\n".join(paragraphs), 200, 0)
+    fixed_edited = split_into_chunks("\n\n".join(["Short."] + edited[1:]), 200, 0)
+    assert len(set(fixed_original) & set(fixed_edited)) < len(reused)
+
+
+def test_group_by_token_budget_keeps_order_and_budget():
+    texts = [f"text {i} " * (i % 7 + 1) for i in range(50)]
+    groups = group_by_token_budget(texts, 40)
+    assert [text for group in groups for text in group] == texts
+    for group in groups:
+        assert len(group) == 1 or sum(count_tokens(text) for text in group) <= 40
@@ -0,0 +1,107 @@
+import json
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+_START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+class _FakeDocumentsConnection:
+    """Answers the queries of list_documents and estimate_document_count from in-memory rows."""
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.queries = []
+
+    async def fetch(self, sql: str, *args):
+        self.queries.append((sql, args))
+        rows = self.rows
+        status = re.search(r"status = \$(\d+)", sql)
+        if status:
+            rows = [r for r in rows if r["status"] == args[int(status.group(1)) - 1]]
+        keyset = re.search(r"\(created_at, id\) < \(\$(\d+), \$(\d+)\)", sql)
+        if keyset:
+            after = (args[int(keyset.group(1)) - 1], args[int(keyset.group(2)) - 1])
+            rows = [r for r in rows if (r["created_at"], r["id"]) < after]
+        rows = sorted(rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+        return rows[:args[0]]
+
+    async def fetchval(self, sql: str, *args):
+        if sql.startswith("EXPLAIN"):
+            return json.dumps([{"Plan": {"Plan Rows": 42}}])
+        return len(self.rows)
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    # Pairs of documents share a created_at, so the id has to break the ties
+    rows = [
+        {"id": i, "filename": f"doc{i}.pdf", "status": "processed" if i % 3 else "needs_review",
+         "created_at": _START + timedelta(minutes=i // 2)}
+        for i in range(1, 12)
+    ]
+    conn = _FakeDocumentsConnection(rows)
+
+    @asynccontextmanager
+    async def fake_connection():
+        yield conn
+
+    monkeypatch.setattr(main, "get_db_connection", fake_connection)
+    # Without the context manager the lifespan (clients, database, workers) doesn't run
+    return TestClient(main.app), conn
+
+
+def test_cursor_pages_through_every_document_once(documents):
+    client, conn = documents
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/documents/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["documents"]) <= 3
+        seen.extend(doc["id"] for doc in page["documents"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    expected = [r["id"] for r in sorted(conn.rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)]
+    assert seen == expected
+    assert page["total_estimate"] == len(conn.rows)
+
+
+def test_cursor_keeps_the_filters(documents):
+    client, conn = documents
+    first = client.get("/documents/", params={"limit": 2, "status": "needs_review"}).json()
+    second = client.get("/documents/", params={"limit": 2, "status": "needs_review",
+                                               "cursor": first["next_cursor"]}).json()
+    ids = [d["id"] for d in first["documents"] + second["documents"]]
+    assert ids == [9, 6, 3]
+    assert second["next_cursor"] is None
+    assert second["total_estimate"] == 42
+
+
+def test_invalid_cursor_is_a_400(documents):
+    client, _ = documents
+    assert client.get("/documents/", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_unchanged_page_revalidates_with_304(documents):
+    client, conn = documents
+    first = client.get("/documents/", params={"limit": 5})
+    etag = first.headers["etag"]
+
+    revalidated = client.get("/documents/", params={"limit": 5}, headers={"If-None-Match": f'"other", {etag}'})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+    assert revalidated.content == b""
+
+    conn.rows[-1]["status"] = "failed"
+    changed = client.get("/documents/", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
@@ -0,0 +1,32 @@
+from core.entities import normalize_entities
+
+
+def _indexes(entities, chunks):
+    return {row["canonical_text"]: row["chunk_indexes"] for row in normalize_entities(entities, chunks)}
+
+
+def test_mentions_are_whole_words_only():
+    chunks = ["The start of the art exhibition.", "Nothing here.", "Modern ART."]
+    assert _indexes([{"text": "Art", "type": "topic"}], chunks) == {"art": [0, 2]}
+
+
+def test_overlapping_and_prefix_names_are_all_found():
+    entities = [{"text": name, "type": "place"} for name in ("New York", "York", "New", "New York City")]
+    chunks = ["I moved to New York City.", "York is old.", "Something new.", "new yorkshire"]
+    assert _indexes(entities, chunks) == {
+        "new york": [0],
+        "york": [0, 1],
+        "new": [0, 2, 3],
+        "new york city": [0],
+    }
+
+
+def test_names_with_symbols_and_mention_counts():
+    rows = normalize_entities({"entities": [{"text": "C++", "type": "language"}, {"text": "Go", "type": None}]},
+                              ["We use c++ and C++17.", "c++, again"])
+    by_name = {row["canonical_text"]: row for row in rows}
+    assert by_name["c++"]["chunk_indexes"] == [0, 1]
+    assert by_name["c++"]["mentions"] == 2
+    # Named by the model but never found in a chunk: still counted once
+    assert by_name["go"]["chunk_indexes"] == [] and by_name["go"]["mentions"] == 1
+    assert by_name["go"]["type"] == "unknown"
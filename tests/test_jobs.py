@@ -0,0 +1,161 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from core import jobs
+from core.exceptions import LLMServiceError, ParsingError
+from core.pipeline import IngestionPipeline
+
+
+class _FakeQueueConnection:
+    """Records the statements run against the queue, with the transaction they ran in."""
+
+    def __init__(self, claimed: list = None):
+        self.claimed = claimed or []
+        self.statements = []
+        self.transactions = 0
+        self._depth = 0
+
+    @asynccontextmanager
+    async def _transaction(self):
+        self.transactions += 1
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+
+    def transaction(self):
+        return self._transaction()
+
+    async def execute(self, sql: str, *args):
+        self.statements.append((" ".join(sql.split()), args, self._depth > 0))
+
+    async def fetch(self, sql: str, *args):
+        self.statements.append((" ".join(sql.split()), args, self._depth > 0))
+        return self.claimed
+
+    def updates(self, fragment: str) -> list[tuple]:
+        return [args for sql, args, _ in self.statements if fragment in sql]
+
+
+def _row(file_id: int, attempts: int = 1) -> dict:
+    return {"id": file_id, "job_id": "job", "filename": f"file{file_id}.pdf", "content_type": "application/pdf",
+            "data": b"%PDF", "attempts": attempts}
+
+
+def test_claim_expires_exhausted_files_then_claims_in_one_transaction():
+    conn = _FakeQueueConnection(claimed=[_row(1), _row(2)])
+
+    claimed = asyncio.run(jobs.claim_files(conn, limit=5, lock_timeout=60.0, max_attempts=3))
+
+    assert [row["id"] for row in claimed] == [1, 2]
+    assert conn.transactions == 1
+    (expire_sql, expire_args, expire_in_tx), (claim_sql, claim_args, claim_in_tx) = conn.statements
+    assert "SET status = 'failed'" in expire_sql and expire_args == (3, 60.0)
+    assert "FOR UPDATE SKIP LOCKED" in claim_sql and "attempts = attempts + 1" in claim_sql
+    assert claim_args == (5, 60.0)
+    assert expire_in_tx and claim_in_tx
+
+
+def test_completion_and_failure_only_touch_the_claimed_attempt():
+    conn = _FakeQueueConnection()
+
+    async def run():
+        await jobs.complete_files(conn, [1, 2], [1, 2], [{"id": 10, "deduplicated": True}, None])
+        await jobs.fail_file(conn, 3, 2, "boom", retry=True)
+        await jobs.fail_file(conn, 4, 3, "boom", retry=False)
+
+    asyncio.run(run())
+    complete, retried, failed = conn.statements
+    assert complete[1] == ([1, 2], [1, 2], ["done", "skipped"], [10, None], [True, False])
+    assert "SET status = 'queued'" in retried[0] and retried[1] == (3, 2, "boom")
+    assert "SET status = 'failed'" in failed[0] and failed[1] == (4, 3, "boom")
+    # A file claimed again by another worker has a new attempt count and isn't overwritten
+    for sql, _, _ in conn.statements:
+        assert "attempts = " in sql and "status = 'processing'" in sql
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Runs _process_claimed with stubbed analysis and saving against a recording connection."""
+    conn = _FakeQueueConnection()
+    outcomes = {}
+    unsaveable = set()
+
+    async def analyze_document(pipeline, filename, content_type, data):
+        outcome = outcomes[filename]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def save_documents(conn, records):
+        if any(r["filename"] in unsaveable for r in records):
+            raise RuntimeError("constraint violation")
+        return [{"id": 100 + int(r["filename"][4:-4]), "filename": r["filename"], "deduplicated": False}
+                for r in records]
+
+    @asynccontextmanager
+    async def fake_connection():
+        yield conn
+
+    monkeypatch.setattr(jobs, "analyze_document", analyze_document)
+    monkeypatch.setattr(jobs, "save_documents", save_documents)
+    monkeypatch.setattr(jobs, "get_db_connection", fake_connection)
+
+    def run(claimed: list, max_attempts: int = 3):
+        pipeline = IngestionPipeline(None, None, None, concurrency=2)
+        asyncio.run(jobs._process_claimed(pipeline, claimed, max_attempts))
+        return conn
+
+    return run, outcomes, unsaveable
+
+
+def _record(filename: str) -> dict:
+    return {"filename": filename, "duplicate_of": None, "status": "processed"}
+
+
+def test_batch_completes_saved_files_and_retries_only_transient_failures(worker):
+    run, outcomes, _ = worker
+    outcomes.update({
+        "file1.pdf": _record("file1.pdf"),
+        "file2.pdf": None,
+        "file3.pdf": ParsingError("file3.pdf", "Not a PDF"),
+        "file4.pdf": LLMServiceError("Azure OpenAI request failed after 7 attempts"),
+        "file5.pdf": LLMServiceError("Azure OpenAI request failed after 7 attempts"),
+    })
+
+    conn = run([_row(1), _row(2), _row(3), _row(4, attempts=1), _row(5, attempts=3)])
+
+    [completed] = conn.updates("SET status = v.status")
+    assert completed[0] == [1, 2]
+    assert completed[2:4] == (["done", "skipped"], [101, None])
+    assert conn.updates("SET status = 'queued'") == [(4, 1, "Azure OpenAI request failed after 7 attempts")]
+    assert [args[0] for args in conn.updates("SET status = 'failed'")] == [3, 5]
+
+
+def test_a_failing_bulk_save_falls_back_to_one_transaction_per_document(worker):
+    run, outcomes, unsaveable = worker
+    outcomes.update({name: _record(name) for name in ("file1.pdf", "file2.pdf", "file3.pdf")})
+    unsaveable.add("file2.pdf")
+
+    conn = run([_row(1), _row(2), _row(3)])
+
+    # The batch transaction, then one per document
+    assert conn.transactions == 4
+    [completed] = conn.updates("SET status = v.status")
+    assert completed[0] == [1, 3] and completed[3] == [101, 103]
+    assert conn.updates("SET status = 'queued'") == [(2, 1, "constraint violation")]
+
+
+@pytest.mark.parametrize("counts, total, status", [
+    ({"queued": 3}, 3, "queued"),
+    ({"queued": 1, "done": 2}, 3, "running"),
+    ({"processing": 1, "queued": 2}, 3, "running"),
+    ({"done": 2, "skipped": 1}, 3, "completed"),
+    ({"done": 2, "failed": 1}, 3, "completed_with_errors"),
+    ({"failed": 3}, 3, "failed"),
+])
+def test_job_status(counts, total, status):
+    assert jobs._job_status(counts, total) == status
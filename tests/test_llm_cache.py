@@ -0,0 +1,126 @@
+import asyncio
+
+from core.llm_cache import CachedLLMClient
+
+
+class FakeCompletions:
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"response {self.calls}"
+
+
+class FakeClient:
+    def __init__(self, delay: float = 0.05):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions(delay)
+
+
+def _request(content: str = "hello") -> dict:
+    return {"model": "gpt", "messages": [{"role": "user", "content": content}]}
+
+
+def _cache(client: FakeClient) -> CachedLLMClient:
+    return CachedLLMClient(client, persistent=False)
+
+
+def test_identical_concurrent_requests_share_one_call():
+    async def run():
+        client = FakeClient()
+        cache = _cache(client)
+        responses = await asyncio.gather(*(cache.chat.completions.create(**_request()) for _ in range(5)))
+        return client, cache, responses
+
+    client, cache, responses = asyncio.run(run())
+    assert client.chat.completions.calls == 1
+    assert responses == ["response 1"] * 5
+    stats = cache.get_stats()
+    assert (stats["misses"], stats["coalesced"]) == (1, 4)
+    assert stats["hit_rate"] == 0.8
+
+
+def test_repeated_request_is_served_from_memory():
+    async def run():
+        client = FakeClient(delay=0)
+        cache = _cache(client)
+        first = await cache.chat.completions.create(**_request())
+        second = await cache.chat.completions.create(**_request())
+        other = await cache.chat.completions.create(**_request("other"))
+        return client, cache, (first, second, other)
+
+    client, cache, responses = asyncio.run(run())
+    assert responses == ("response 1", "response 1", "response 2")
+    assert cache.get_stats()["memory_hits"] == 1
+
+
+def test_waiter_makes_the_call_itself_when_the_owner_is_cancelled():
+    async def run():
+        client = FakeClient()
+        cache = _cache(client)
+        owner = asyncio.create_task(cache.chat.completions.create(**_request()))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.chat.completions.create(**_request()))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        return client, owner, await waiter
+
+    client, owner, response = asyncio.run(run())
+    assert owner.cancelled()
+    assert response == "response 2"
+    assert client.chat.completions.calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_owner():
+    async def run():
+        client = FakeClient()
+        cache = _cache(client)
+        owner = asyncio.create_task(cache.chat.completions.create(**_request()))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.chat.completions.create(**_request()))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        return client, waiter, await owner
+
+    client, waiter, response = asyncio.run(run())
+    assert waiter.cancelled()
+    assert response == "response 1"
+    assert client.chat.completions.calls == 1
+
+
+def test_failure_is_shared_with_waiters_and_not_cached():
+    class FailingCompletions(FakeCompletions):
+        async def create(self, **kwargs):
+            await super().create(**kwargs)
+            if self.calls == 1:
+                raise RuntimeError("model unavailable")
+            return "recovered"
+
+    async def run():
+        client = FakeClient()
+        client.chat.completions = FailingCompletions()
+        cache = _cache(client)
+        results = await asyncio.gather(
+            *(cache.chat.completions.create(**_request()) for _ in range(3)), return_exceptions=True
+        )
+        return results, await cache.chat.completions.create(**_request())
+
+    results, retried = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == "recovered"
+
+
+def test_streamed_requests_bypass_the_cache():
+    async def run():
+        client = FakeClient(delay=0)
+        cache = _cache(client)
+        for _ in range(2):
+            await cache.chat.completions.create(**_request(), stream=True)
+        return client, cache
+
+    client, cache = asyncio.run(run())
+    assert client.chat.completions.calls == 2
+    assert cache.get_stats()["misses"] == 0
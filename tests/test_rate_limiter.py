@@ -0,0 +1,153 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from core import rate_limiter as rate_limiter_module
+from core.exceptions import LLMServiceError
+from core.rate_limiter import RateLimiter
+
+_REQUEST = httpx.Request("POST", "http://fake-openai/chat/completions")
+
+
+def _error(error_type, status: int, headers: dict = None):
+    response = httpx.Response(status, headers=headers or {}, request=_REQUEST)
+    return error_type("failed", response=response, body=None)
+
+
+def _flaky(errors: list, result="ok"):
+    """Returns a call raising the given errors in turn, then returning `result`; counts the calls."""
+    calls = []
+
+    async def fn():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return fn, calls
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records the delays the limiter sleeps for, without waiting for the backoff ones."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args, **kwargs):
+        delays.append(delay)
+        await real_sleep(min(delay, 0.001), *args, **kwargs)
+
+    monkeypatch.setattr(rate_limiter_module.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def test_throttling_halves_the_window_and_waits_for_retry_after(sleeps):
+    limiter = RateLimiter("test", max_concurrency=16, base_delay=100)
+    fn, calls = _flaky([_error(openai.RateLimitError, 429, {"retry-after-ms": "250"})])
+
+    assert asyncio.run(limiter.call(fn, estimated_tokens=10)) == "ok"
+
+    assert len(calls) == 2
+    stats = limiter.get_stats()
+    assert stats["throttled"] == 1 and stats["retries"] == 1
+    # Halved from 16, then grown by 1/8 on the successful retry
+    assert stats["concurrency_limit"] == 8
+    assert stats["in_flight"] == 0
+    # The server's delay is used instead of the (up to 100s) backoff
+    assert pytest.approx(0.25) in sleeps
+
+
+def test_retry_after_seconds_header_is_read():
+    error = _error(openai.RateLimitError, 429, {"retry-after": "3"})
+    assert rate_limiter_module._retry_after_seconds(error) == 3.0
+    assert rate_limiter_module._retry_after_seconds(_error(openai.RateLimitError, 429, {"retry-after": "soon"})) is None
+    assert rate_limiter_module._retry_after_seconds(_error(openai.RateLimitError, 429)) is None
+
+
+def test_a_burst_of_429s_halves_the_window_once(sleeps):
+    limiter = RateLimiter("test", max_concurrency=16)
+
+    async def run():
+        fns = [_flaky([_error(openai.RateLimitError, 429, {"retry-after-ms": "1"})])[0] for _ in range(4)]
+        await asyncio.gather(*(limiter.call(fn, estimated_tokens=10) for fn in fns))
+
+    asyncio.run(run())
+    assert limiter.stats["throttled"] == 4
+    assert limiter.get_stats()["concurrency_limit"] == 8
+
+
+def test_window_never_drops_below_the_minimum(sleeps):
+    limiter = RateLimiter("test", max_concurrency=2, min_concurrency=1)
+    for _ in range(3):
+        limiter._last_decrease = 0.0
+        limiter._on_throttled(None)
+    assert limiter.get_stats()["concurrency_limit"] == 1
+
+
+def test_exhausted_retries_raise_and_release_the_slot(sleeps):
+    limiter = RateLimiter("test", max_retries=2)
+    fn, calls = _flaky([_error(openai.InternalServerError, 500) for _ in range(5)])
+
+    with pytest.raises(LLMServiceError):
+        asyncio.run(limiter.call(fn, estimated_tokens=10))
+
+    assert len(calls) == 3
+    assert limiter.stats["retries"] == 2 and limiter.stats["failures"] == 1
+    assert limiter.get_stats()["in_flight"] == 0
+    # Backoff with full jitter stays within base_delay * 2 ** attempt
+    assert len(sleeps) == 2 and all(0 <= d <= limiter.base_delay * 2 ** (i + 1) for i, d in enumerate(sleeps))
+
+
+def test_non_retryable_errors_are_not_retried(sleeps):
+    limiter = RateLimiter("test")
+    fn, calls = _flaky([_error(openai.BadRequestError, 400)])
+
+    with pytest.raises(LLMServiceError):
+        asyncio.run(limiter.call(fn, estimated_tokens=10))
+    assert len(calls) == 1 and limiter.stats["retries"] == 0
+    assert limiter.get_stats()["in_flight"] == 0
+
+
+def test_in_flight_calls_stay_within_the_window():
+    limiter = RateLimiter("test", max_concurrency=3)
+    running = peak = 0
+
+    async def fn():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.005)
+        running -= 1
+        return "ok"
+
+    async def run():
+        return await asyncio.gather(*(limiter.call(fn, estimated_tokens=1) for _ in range(12)))
+
+    assert asyncio.run(run()) == ["ok"] * 12
+    assert peak == 3
+
+
+def test_stream_holds_the_slot_and_settles_the_token_budget():
+    limiter = RateLimiter("test", tpm=10_000)
+
+    async def events():
+        yield SimpleNamespace(usage=None)
+        yield SimpleNamespace(usage=SimpleNamespace(total_tokens=300))
+
+    async def open_stream():
+        return events()
+
+    async def run():
+        in_flight = []
+        async for _ in limiter.stream(open_stream, estimated_tokens=100):
+            in_flight.append(limiter.get_stats()["in_flight"])
+        return in_flight
+
+    assert asyncio.run(run()) == [1, 1]
+    assert limiter.get_stats()["in_flight"] == 0
+    # 100 reserved up front, then 200 more once the stream reported 300 used
+    assert limiter._tpm.available == pytest.approx(10_000 - 300, abs=5)
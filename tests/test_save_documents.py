@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from core.content_store import compress_content
+from core.entities import normalize_entities
+from core.ingestion import save_documents
+from core.repository import DOCUMENT_COLUMNS
+
+
+class _FakeCopyConnection:
+    """Hands out document ids and records the COPYs and statements of a save."""
+
+    def __init__(self):
+        self.next_id = 500
+        self.copies = {}
+        self.statements = []
+
+    async def fetch(self, sql: str, *args):
+        self.statements.append(" ".join(sql.split()))
+        if "nextval" in sql:
+            ids = list(range(self.next_id, self.next_id + args[0]))
+            self.next_id += args[0]
+            return [{"id": i} for i in ids]
+        if "INSERT INTO entities" in sql:
+            return [{"id": 900 + i, "canonical_text": text, "type": entity_type}
+                    for i, (text, entity_type) in enumerate(zip(args[0], args[1]))]
+        raise AssertionError(f"Unexpected query: {sql}")
+
+    async def execute(self, sql: str, *args):
+        self.statements.append(" ".join(sql.split()))
+
+    async def copy_records_to_table(self, table: str, records, columns):
+        assert table not in self.copies, f"{table} was copied more than once"
+        self.copies[table] = (list(columns), list(records))
+
+
+def _record(filename: str, chunks: list[str], embeddings: list[list[float]], duplicate_of=None) -> dict:
+    content = " ".join(chunks)
+    size, segments = compress_content(content)
+    entities = {"entities": [{"text": "Acme", "type": "ORG"}]}
+    return {
+        "filename": filename, "summary": f"Summary of {filename}", "entities": entities, "status": "processed",
+        "content_hash": f"c-{filename}", "file_hash": f"f-{filename}", "timings": {"total": 1.0},
+        "content_bytes": size, "content_segments": segments, "chunks": chunks, "chunk_embeddings": embeddings,
+        "entity_rows": normalize_entities(entities, chunks), "duplicate_of": duplicate_of,
+    }
+
+
+def test_a_batch_is_written_with_one_copy_per_table():
+    conn = _FakeCopyConnection()
+    records = [
+        _record("a.pdf", ["Acme builds rockets.", "Nothing else."], [[1.0, 0.0], [0.0, 1.0]]),
+        _record("b.pdf", ["Acme again."], [[0.6, 0.8]]),
+        _record("copy-of-a.pdf", [], [], duplicate_of=7),
+    ]
+
+    results = asyncio.run(save_documents(conn, records))
+
+    assert [r["id"] for r in results] == [500, 501, 502]
+    assert [r["deduplicated"] for r in results] == [False, False, True]
+    assert set(conn.copies) == {"documents", "document_content_segments", "document_chunks", "document_entities"}
+
+    columns, rows = conn.copies["documents"]
+    assert columns == DOCUMENT_COLUMNS
+    assert [row[0] for row in rows] == [500, 501]
+    first = dict(zip(columns, rows[0]))
+    assert first["filename"] == "a.pdf" and json.loads(first["entities"]) == records[0]["entities"]
+    assert first["embedding"] == [1 / 2 ** 0.5, 1 / 2 ** 0.5]
+
+    _, chunk_rows = conn.copies["document_chunks"]
+    assert [(row[0], row[1]) for row in chunk_rows] == [(500, 0), (500, 1), (501, 0)]
+
+    _, entity_rows = conn.copies["document_entities"]
+    assert [(row[1], row[3]) for row in entity_rows] == [(500, [0]), (501, [0])]
+
+    # Duplicates reuse the stored results of their original in single statements
+    assert sum("INSERT INTO documents" in sql for sql in conn.statements) == 1
+    assert sum("INSERT INTO document_entities" in sql for sql in conn.statements) == 1
+
+
+def test_a_document_without_chunks_gets_no_embedding():
+    conn = _FakeCopyConnection()
+    asyncio.run(save_documents(conn, [_record("empty.pdf", [], [])]))
+
+    columns, [row] = conn.copies["documents"]
+    assert dict(zip(columns, row))["embedding"] is None
+    assert conn.copies["document_chunks"][1] == []
@@ -0,0 +1,135 @@
+"""
+Standalone ingestion worker. Consumes the queue filled by POST /ingest/ so
+ingestion can be scaled separately from the API.
+
+Usage:
+    python worker.py [--processes N] [--workers-per-process M] [--metrics-port P]
+
+With --metrics-port, process i serves Prometheus metrics on port P + i.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from core.db import init_db_pool, close_db_pool, get_db_connection, get_pool_stats
+from core.exceptions import DatabaseUnavailableError
+from core.ingestion import build_pipeline
+from core.jobs import get_queue_depth, run_worker
+from core.logger import get_logger
+from core.metrics import build_gauges, render_metrics
+from core.parser import shutdown_parser_pool
+from core.rate_limiter import get_rate_limiter_stats
+from core.schema import auto_migrate_enabled, ensure_extensions, ensure_schema
+from core.startup import StartupReport
+
+logger = get_logger(__name__)
+
+
+async def _start_metrics_server(port: int, pipeline, llm_cache, startup_report: StartupReport):
+    """Serves this process's metrics over plain HTTP for Prometheus to scrape."""
+    async def _handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            try:
+                async with get_db_connection() as conn:
+                    queue_counts = await get_queue_depth(conn)
+            except DatabaseUnavailableError:
+                queue_counts = None
+            validator = pipeline.validator
+            body = render_metrics(build_gauges(
+                pool_stats=get_pool_stats(),
+                cache_stats=llm_cache.get_stats() if llm_cache else None,
+                limiter_stats=get_rate_limiter_stats(),
+                validation_stats=validator.get_stats() if hasattr(validator, "get_stats") else None,
+                queue_counts=queue_counts,
+                startup=startup_report.as_dict(),
+            )).encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(_handle, port=port)
+    logger.info(f"Serving worker metrics on port {port}.")
+    return server
+
+
+async def _serve(workers: int, metrics_port: Optional[int], started: float):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    startup_report = StartupReport(started)
+    with startup_report.phase("clients_and_agents"):
+        pipeline, llm_cache = build_pipeline()
+    # Same migrations as the API, so the worker can be started first
+    if auto_migrate_enabled():
+        with startup_report.phase("schema_extensions"):
+            await ensure_extensions()
+    with startup_report.phase("db_pool"):
+        await init_db_pool()
+    if auto_migrate_enabled():
+        with startup_report.phase("schema_migrations"):
+            async with get_db_connection() as conn:
+                await ensure_schema(conn)
+    metrics_server = await _start_metrics_server(metrics_port, pipeline, llm_cache, startup_report) if metrics_port else None
+    startup_report.finish()
+    try:
+        await asyncio.gather(*(run_worker(pipeline, stop_event) for _ in range(workers)))
+    finally:
+        if metrics_server:
+            metrics_server.close()
+        shutdown_parser_pool()
+        await close_db_pool()
+
+
+def _run_process(workers: int, metrics_port: Optional[int] = None):
+    started = time.perf_counter()
+    load_dotenv()
+    asyncio.run(_serve(workers, metrics_port, started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run document ingestion workers.")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("--workers-per-process", type=int, default=1, help="Queue consumers per process.")
+    parser.add_argument("--metrics-port", type=int, help="First port to serve Prometheus metrics on.")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _run_process(args.workers_per_process, args.metrics_port)
+        return
+
+    processes = [
+        multiprocessing.Process(
+            target=_run_process,
+            args=(args.workers_per_process, args.metrics_port + i if args.metrics_port else None),
+            name=f"ingest-worker-{i}",
+        )
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {len(processes)} ingestion worker processes.")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Children receive SIGINT as well and stop after their current batch
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()